@@ -0,0 +1,84 @@
+"""
+Compares fetching many pages on the worker threads of task_queue with fetching them on the async_engine.
+Serves pages with a fixed latency from a local aiohttp server on its own thread and fetches them with
+http_client.iter_pages, once with TASKQUEUE/ENGINE set to threads and once set to async. Prints the wall time and how
+many threads the run started.
+Requires aiohttp. Run from the root of the repository: python -m benchmarks.bench_engines [pages] [latency in ms]
+:author: Jonathan Decker
+"""
+
+import asyncio
+import sys
+import threading
+import time
+
+from aiohttp import web
+
+from utils import async_engine
+from utils import http_client
+from utils import scrap_config as config
+from utils import task_queue
+
+PAGE = "x" * 5000
+
+
+def start_server(latency):
+    async def page(request):
+        await asyncio.sleep(latency)
+        return web.Response(text=PAGE)
+
+    async def start():
+        app = web.Application()
+        app.router.add_get("/page/{number}", page)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        return runner.addresses[0][1]
+
+    # the server gets its own loop, so it does not compete with the loop of the engine
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    port = asyncio.run_coroutine_threadsafe(start(), loop).result()
+    return f"http://127.0.0.1:{port}/page/"
+
+
+def measure(engine, urls):
+    config.blank_setter("TASKQUEUE", "ENGINE", engine)
+    # the watcher itself is not counted
+    threads_before = threading.active_count() + 1
+    peak_threads = [threads_before]
+    done = threading.Event()
+
+    def watch_threads():
+        while not done.wait(0.01):
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+
+    watcher = threading.Thread(target=watch_threads, daemon=True)
+    watcher.start()
+    start_time = time.perf_counter()
+    with task_queue.command_scope("benchmark " + engine):
+        pages = list(http_client.iter_pages(urls))
+    wall_time = time.perf_counter() - start_time
+    done.set()
+    watcher.join()
+
+    assert len(pages) == len(urls)
+    return wall_time, peak_threads[0] - threads_before
+
+
+def main(pages=2000, latency_ms=50):
+    # only the engines are measured, the local server is not rate limited
+    config.blank_setter("RATELIMIT", "127.0.0.1", "1000, 0")
+    base_url = start_server(latency_ms / 1000)
+    urls = [f"{base_url}{number}" for number in range(pages)]
+    print(f"{pages} pages with {latency_ms} ms latency, {config.get_max_workers()} worker threads, "
+          f"{config.get_async_max_connections()} async connections")
+    for engine in ("async", "threads"):
+        wall_time, new_threads = measure(engine, urls)
+        print(f"{engine:8} {wall_time:.1f} s wall, {new_threads} threads started")
+    async_engine.close()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,86 @@
+"""
+Measures crawling team pages with the pages parsed on the worker threads or on the process pool of task_queue.
+Serves synthetic toornament team information pages from a local http server, crawls them with
+toornament_stalker.build_team and prints the wall time and the CPU time spent in the crawling process.
+Run from the root of the repository: python -m benchmarks.bench_parse_processes [processes] [pages] [page KiB]
+Every run starts a new process pool, so run it once per value of TASKQUEUE/PARSE_PROCESSES to compare.
+:author: Jonathan Decker
+"""
+
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from stalker import toornament_stalker
+from utils import http_client
+from utils import scrap_config as config
+from utils import task_queue
+
+TEAM_HEADER = ('<div class="layout-section header"><div><div class="layout-block header"><div><div class="title">'
+               '<div><span>Team {number}</span></div></div></div></div></div></div>')
+PLAYER = '<div class="text secondary small summoner_player_id">Summoner ID: Player {number}-{player}</div>'
+# scripts, navigation and teasers the parser has to skip on a real page
+PADDING = '<ul class="nav"><li><a href="/teasers/{index}">Teaser {index}</a></li></ul><script>var x = {index};</script>'
+
+
+def build_page(number, size):
+    players = "".join(PLAYER.format(number=number, player=player) for player in range(7))
+    page = f"<html><body>{TEAM_HEADER.format(number=number)}{players}"
+    padding = []
+    index = 0
+    while len(page) + sum(map(len, padding)) < size:
+        padding.append(PADDING.format(index=index))
+        index += 1
+    return (page + "".join(padding) + "</body></html>").encode()
+
+
+def start_server(pages, size):
+    bodies = [build_page(number, size) for number in range(pages)]
+
+    class TeamHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            body = bodies[int(self.path.rsplit("/", 1)[1])]
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), TeamHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, f"http://127.0.0.1:{httpd.server_address[1]}/team/"
+
+
+def main(processes=1, pages=400, size_kib=60):
+    config.blank_setter("TASKQUEUE", "PARSE_PROCESSES", str(processes))
+    # only the parsing is measured, the local server is not rate limited
+    config.blank_setter("RATELIMIT", "127.0.0.1", "20, 0")
+    httpd, base_url = start_server(pages, size_kib * 1024)
+    urls = [f"{base_url}{number}" for number in range(pages)]
+    if task_queue.get_process_pool() is not None:
+        # spawning the workers is not part of a crawl
+        task_queue.submit_to_process(len, "warm up").result()
+
+    start_time = time.perf_counter()
+    start_cpu = time.process_time()
+    with task_queue.command_scope("benchmark"):
+        teams = http_client.crawl(urls, toornament_stalker.build_team)
+    wall_time = time.perf_counter() - start_time
+    cpu_time = time.process_time() - start_cpu
+    httpd.shutdown()
+
+    assert len(teams) == pages and teams[0].name == "Team 0"
+    print(f"PARSE_PROCESSES={processes}  {pages} pages of {size_kib} KiB  {wall_time:.1f} s wall, "
+          f"{cpu_time:.1f} s CPU in the crawling process")
+    if task_queue.get_process_pool() is not None:
+        task_queue.get_process_pool().shutdown()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,77 @@
+"""
+Compares a new connection per request with the pooled keep-alive session of http_client.
+Serves a 30 KB page from a local TLS server with a self signed certificate, or plain http if openssl is missing,
+and fetches it sequentially with requests.get and with http_client.get_session().
+Run from the root of the repository: python -m benchmarks.bench_pooled_session [requests]
+:author: Jonathan Decker
+"""
+
+import pathlib
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from utils import http_client
+
+PAGE = b"x" * 30000
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, with Nagle every keep-alive response would wait for a delayed ack
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(directory):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    scheme = "http"
+    if shutil.which("openssl"):
+        cert = pathlib.Path(directory) / "cert.pem"
+        key = pathlib.Path(directory) / "key.pem"
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj",
+                        "/CN=127.0.0.1", "-keyout", str(key), "-out", str(cert)], check=True, capture_output=True)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        httpd.socket = context.wrap_socket(httpd.socket, server_side=True)
+        scheme = "https"
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, f"{scheme}://127.0.0.1:{httpd.server_address[1]}/page"
+
+
+def measure(get, url, count):
+    start_time = time.perf_counter()
+    for _ in range(count):
+        get(url, verify=False).raise_for_status()
+    return (time.perf_counter() - start_time) / count
+
+
+def main(count=300):
+    warnings.filterwarnings("ignore", message="Unverified HTTPS request")
+    with tempfile.TemporaryDirectory() as directory:
+        httpd, url = start_server(directory)
+        session = http_client.get_session()
+        print(f"{count} sequential GETs of {len(PAGE)} bytes from {url}")
+        print(f"requests.get    {measure(requests.get, url, count) * 1000:.1f} ms/page")
+        print(f"pooled session  {measure(session.get, url, count) * 1000:.1f} ms/page")
+        httpd.shutdown()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
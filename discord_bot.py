@@ -7,16 +7,20 @@ import logging
 import asyncio
 import os
 import io
+import time
 from concurrent.futures import ThreadPoolExecutor
 
 from discord.ext import commands
 from discord import File
 from discord import Game
+from discord import Intents
 
 from utils import scrap_config as config
 from utils.status_list import get_status
+from utils import renderer
+from utils import webmanager
 
-from stalkmaster import call_stalk_master
+from stalkmaster import stream_stalk_master, cancel_stalks, start_watch_list
 
 """
 Requirements were updated, this fix should not be necessary anymore.
@@ -32,7 +36,10 @@ needs to be changed to ensure_future = getattr(asyncio, 'async')
 
 class MyBot(commands.Bot):
     def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs, command_prefix=".lol")
+        # current discord.py versions require the intents, commands need the content of messages
+        intents = Intents.default()
+        intents.message_content = True
+        super().__init__(*args, **kwargs, command_prefix=".lol", intents=intents)
 
 
 logger = logging.getLogger('scrap_logger')
@@ -100,19 +107,113 @@ def chunk_message(out_raw):
     :param out_raw: String, the message that needs to be chunked
     :return: List[String], a list of Strings each with a length of up to 2000 characters
     """
-    chunk_size = 2000
-    # out_list = [out_raw[i:i + chunk_size] for i in range(0, len(out_raw), chunk_size)]
-    out_split = out_raw.split("\n")
-    out_list = []
-    message = ""
-    for split in out_split:
-        if len(message + split) > chunk_size:
-            out_list.append(message)
-            message = ""
-        message += "\n" + split
-    out_list.append(message)
+    return list(renderer.iter_chunks([out_raw]))
 
-    return out_list
+
+def stalk_chunks(url, extended=False, listener=None, owner=None):
+    """
+    Runs a stalk and chunks its output for discord while it is rendered, see chunk_message
+    :param url: String, the url to stalk
+    :param extended: Boolean(False), if True player ranks are looked up
+    :param listener: function(None), passed to stream_stalk_master
+    :param owner: any(None), passed to stream_stalk_master
+    :return: List[String], a list of Strings each with a length of up to 2000 characters
+    """
+    return list(renderer.iter_chunks(stream_stalk_master(url, extended=extended, listener=listener, owner=owner)))
+
+
+def stalk_to_file(url, extended=False, owner=None):
+    """
+    Runs a stalk and writes its output without discord formatting into an in memory file while it is rendered
+    :param url: String, the url to stalk
+    :param extended: Boolean(False), if True player ranks are looked up
+    :param owner: any(None), passed to stream_stalk_master
+    :return: (String, io.StringIO), the first line of the output and the file at its start
+    """
+    mem_file = io.StringIO()
+    title = renderer.write_pieces(stream_stalk_master(url, extended=extended, discord_format=False, owner=owner),
+                                  mem_file)
+    mem_file.seek(0)
+    return title, mem_file
+
+
+def render_progress(item, extended=False):
+    """
+    Formats a partial result for discord chat
+    :param item: Team or TeamList, a partial result reported by a stalker
+    :param extended: Boolean(False), if True player ranks are included
+    :return: String, the formatted partial result
+    """
+    if extended:
+        return item.extended_str()
+    return str(item)
+
+
+async def send_progressive(ctx, url, extended=False):
+    """
+    Runs a stalk and posts each team or group as soon as it is ready. The first message is edited until it is full,
+    then a new message is started. Once the stalk is done the posted messages are edited to show the final output,
+    which is sorted and has the title and notes the partial results lack. Results served from the cache are sent in
+    one go.
+    :param ctx: Context, the context of the user command
+    :param url: String, the url to stalk
+    :param extended: Boolean(False), if True player ranks are looked up
+    :return: None, but the results were sent
+    """
+    loop = asyncio.get_event_loop()
+    progress = asyncio.Queue()
+    start_time = time.perf_counter()
+
+    def listener(item):
+        loop.call_soon_threadsafe(progress.put_nowait, item)
+
+    def sub_proc():
+        return stalk_chunks(url, extended=extended, listener=listener, owner=ctx.author.id)
+
+    stalk_future = loop.run_in_executor(ThreadPoolExecutor(), sub_proc)
+    header = f"Stalking {url} ..."
+    message = await ctx.send(header)
+    messages = [message]
+    content = header
+    posted = 0
+
+    while not (stalk_future.done() and progress.empty()):
+        get_item = asyncio.ensure_future(progress.get())
+        done, pending = await asyncio.wait([get_item, stalk_future], return_when=asyncio.FIRST_COMPLETED)
+        if get_item not in done:
+            get_item.cancel()
+            continue
+
+        # collect everything that arrived in the meantime so each message is edited once per batch
+        items = [get_item.result()]
+        while not progress.empty():
+            items.append(progress.get_nowait())
+        for item in items:
+            posted += 1
+            for chunk in chunk_message(render_progress(item, extended)):
+                if len(content) + 1 + len(chunk) > renderer.MESSAGE_SIZE:
+                    await message.edit(content=content)
+                    content = chunk
+                    message = await ctx.send(content)
+                    messages.append(message)
+                else:
+                    content += "\n" + chunk
+        await message.edit(content=content)
+        # give new results time to pile up instead of running into the discord rate limit for edits
+        await asyncio.sleep(1)
+
+    # the final output replaces the partial results, extra messages are sent or left over ones deleted
+    out_chunked = stalk_future.result()
+    for index, out in enumerate(out_chunked):
+        if index < len(messages):
+            await messages[index].edit(content=out)
+        else:
+            await ctx.send(out)
+    for left_over in messages[max(len(out_chunked), 1):]:
+        await left_over.delete()
+    if posted > 0:
+        run_time = time.perf_counter() - start_time
+        await ctx.send(f"Finished stalking {url}, posted {posted} results in {run_time:.0f} secs.")
 
 
 @bot.event
@@ -127,6 +228,8 @@ async def on_ready():
     logger.info('------')
 
     await update_client_presence(get_status())
+    start_watch_list()
+    webmanager.prelaunch_drivers()
 
 
 @bot.command(name='ping',
@@ -157,14 +260,17 @@ async def stalk(ctx, *args):
         await ctx.send("Usage is .lolstalk url")
         return
 
+    if config.get_progressive_output():
+        await send_progressive(ctx, arg_list[0])
+        return
+
     def sub_proc():
-        return call_stalk_master(arg_list[0])
+        return stalk_chunks(arg_list[0], owner=ctx.author.id)
 
-    # call taskmaster with args and is_scrape = True
-    out_raw = await loop.run_in_executor(ThreadPoolExecutor(), sub_proc)
+    # call taskmaster with args and is_scrape = True, the results are chunked while they are rendered
+    out_chunked = await loop.run_in_executor(ThreadPoolExecutor(), sub_proc)
 
-    # chunk und send results
-    out_chunked = chunk_message(out_raw)
+    # send results
     for out in out_chunked:
         await ctx.send(out)
 
@@ -183,13 +289,10 @@ async def stalk_file(ctx, *args):
         return
 
     def sub_proc():
-        return call_stalk_master(arg_list[0], discord_format=False)
-
-    # call taskmaster with args and is_scrape = True
-    out_raw = await loop.run_in_executor(ThreadPoolExecutor(), sub_proc)
-    title = out_raw.split('\n', 1)[0]
+        return stalk_to_file(arg_list[0], owner=ctx.author.id)
 
-    mem_file = io.StringIO(out_raw)
+    # call taskmaster with args and is_scrape = True, the results are written to the file while they are rendered
+    title, mem_file = await loop.run_in_executor(ThreadPoolExecutor(), sub_proc)
 
     # create Discord File object
     out_file = File(mem_file, filename=(title + ".txt"))
@@ -211,14 +314,17 @@ async def ext_stalk(ctx, *args):
         await ctx.send("Usage is .lolextstalk url")
         return
 
+    if config.get_progressive_output():
+        await send_progressive(ctx, arg_list[0], extended=True)
+        return
+
     def sub_proc():
-        return call_stalk_master(arg_list[0], extended=True)
+        return stalk_chunks(arg_list[0], extended=True, owner=ctx.author.id)
 
-    # call taskmaster with args and is_scrape = True
-    out_raw = await loop.run_in_executor(ThreadPoolExecutor(), sub_proc)
+    # call taskmaster with args and is_scrape = True, the results are chunked while they are rendered
+    out_chunked = await loop.run_in_executor(ThreadPoolExecutor(), sub_proc)
 
-    # chunk und send results
-    out_chunked = chunk_message(out_raw)
+    # send results
     for out in out_chunked:
         await ctx.send(out)
 
@@ -237,13 +343,10 @@ async def ext_stalk_file(ctx, *args):
         return
 
     def sub_proc():
-        return call_stalk_master(arg_list[0], extended=True, discord_format=False)
+        return stalk_to_file(arg_list[0], extended=True, owner=ctx.author.id)
 
-    # call taskmaster with args and is_scrape = True
-    out_raw = await loop.run_in_executor(ThreadPoolExecutor(), sub_proc)
-    title = out_raw.split('\n', 1)[0]
-
-    mem_file = io.StringIO(out_raw)
+    # call taskmaster with args and is_scrape = True, the results are written to the file while they are rendered
+    title, mem_file = await loop.run_in_executor(ThreadPoolExecutor(), sub_proc)
 
     # create Discord File object
     out_file = File(mem_file, filename=(title + ".txt"))
@@ -251,6 +354,19 @@ async def ext_stalk_file(ctx, *args):
     await ctx.send(f"Finished stalking {title}", file=out_file)
 
 
+@bot.command(name='cancel',
+             description="Cancels all of your running stalks, teams that were already found are still sent.",
+             brief="Cancels your running stalks.",
+             pass_context=True)
+async def cancel(ctx):
+    logger.info("received user command cancel")
+    cancelled = cancel_stalks(ctx.author.id)
+    if cancelled == 0:
+        await ctx.send("You have no running stalks")
+    else:
+        await ctx.send(f"Cancelled {cancelled} running stalk{'s' if cancelled > 1 else ''}")
+
+
 async def update_client_presence(status: str):
     """
     Updates the bots presence to the given status, always with playing at front
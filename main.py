@@ -8,16 +8,24 @@ Only used for testing for now.
 from utils import scrap_logger
 import time
 import logging
-start_time = time.perf_counter()
 
-# setup logger
-logger = scrap_logger.setup_logger(console_level=logging.INFO, log_file_level=logging.DEBUG)
-logger.debug("Start of program")
 
-# Run Discord Bot
-from discord_bot import run_bot
-run_bot()
+def main():
+    start_time = time.perf_counter()
 
-end_time = time.perf_counter()
-run_time = round(end_time - start_time, 2)
-logger.info(f"Finished execution in {run_time} secs")
+    # setup logger
+    logger = scrap_logger.setup_logger(console_level=logging.INFO, log_file_level=logging.DEBUG)
+    logger.debug("Start of program")
+
+    # Run Discord Bot
+    from discord_bot import run_bot
+    run_bot()
+
+    end_time = time.perf_counter()
+    run_time = round(end_time - start_time, 2)
+    logger.info(f"Finished execution in {run_time} secs")
+
+
+# the guard keeps the worker processes of the task_queue from starting the bot again
+if __name__ == "__main__":
+    main()
@@ -8,25 +8,34 @@ from dataclasses import dataclass
 from typing import List
 import logging
 from utils import scrap_config as config
-from utils import lookup_tables
+from utils import rank_parser
 
 logger = logging.getLogger('scrap_logger')
 # for the models dataclasses are used, this feature has been implemented in python 3.7
+# a big league keeps tens of thousands of models for the whole command, so they have __slots__ instead of a __dict__,
+# slotted fields can not have class level defaults, so classes with optional fields have their own __init__
 
 
 @dataclass
 class Rank:
     """
-    Saves a player rank as string and integer
+    Saves a player rank as rating and league points, see rank_parser, the text is only built for the output
     """
-    string = ""
-    rating = 0
+    __slots__ = ("rating", "lp")
+    rating: int
+    lp: int
 
-    def __init__(self, rank_string, rating):
-        self.string = rank_string
+    def __init__(self, rating=0, lp=0):
         self.rating = rating
+        self.lp = lp
+
+    @property
+    def string(self):
+        return rank_parser.rank_name(self.rating)
 
     def __str__(self):
+        if self.lp > 0:
+            return f"{self.string} {self.lp} LP"
         return self.string
 
 
@@ -35,27 +44,32 @@ class Player:
     """
     Saves information on a single league account
     """
+    __slots__ = ("summoner_name", "rank")
     summoner_name: str
     rank: Rank
-    opgg: str = ""
 
     def __init__(self, sum_name, rank=None):
         self.summoner_name = sum_name
         self.rank = rank
 
-    def __post_init__(self):
+    @property
+    def opgg(self):
+        """
+        Builds the link to the op.gg profile of the player when it is needed
+        :return: String, url of the profile in the region of the config
+        """
         region = config.get_region()
         base_url = "https://" + region + ".op.gg/summoner/userName="
-        self.opgg = base_url + self.summoner_name.replace(" ", "")
+        return base_url + self.summoner_name.replace(" ", "")
 
     def __str__(self):
-        if Rank is None:
+        if self.rank is None:
             return self.summoner_name
         else:
             return f"{self.summoner_name} *{str(self.rank)}*"
 
     def no_format_str(self):
-        if Rank is None:
+        if self.rank is None:
             return self.summoner_name
         else:
             return f"{self.summoner_name} {str(self.rank)}"
@@ -66,11 +80,36 @@ class Team:
     """
     Saves information for a team of league players
     """
+    __slots__ = ("name", "player_list", "average_rank", "max_rank", "median_rank", "top3_rank", "rank_deviation",
+                 "percentile")
     name: str
     player_list: List[Player]
-    multi_link: str = ""
-    average_rank: Rank = None
-    max_rank: Rank = None
+    average_rank: Rank
+    max_rank: Rank
+    # set for all teams of a stalk at once by player_lookup.calc_league_stats
+    median_rank: Rank
+    top3_rank: Rank
+    rank_deviation: float
+    percentile: float
+
+    def __init__(self, name, player_list, average_rank=None, max_rank=None, median_rank=None, top3_rank=None,
+                 rank_deviation=None, percentile=None):
+        self.name = name
+        self.player_list = player_list
+        self.average_rank = average_rank
+        self.max_rank = max_rank
+        self.median_rank = median_rank
+        self.top3_rank = top3_rank
+        self.rank_deviation = rank_deviation
+        self.percentile = percentile
+
+    @property
+    def multi_link(self):
+        """
+        The op.gg multi link for the players of the team, built when it is needed
+        :return: String, see build_opgg_multi_link
+        """
+        return self.build_opgg_multi_link()
 
     def build_opgg_multi_link(self):
         """
@@ -79,14 +118,14 @@ class Team:
         """
         region = config.get_region()
         base_url = f"https://{region}.op.gg/multi/query="
-        multi_link = base_url
-        for player in self.player_list:
-            multi_link += player.summoner_name.replace(" ", "")
-            multi_link += "%2C"
-        return multi_link
+        return base_url + "".join(player.summoner_name.replace(" ", "") + "%2C" for player in self.player_list)
 
-    def __post_init__(self):
-        self.multi_link = self.build_opgg_multi_link()
+    def average_rating(self):
+        """
+        Returns the rating of the average rank, used to sort teams
+        :return: int, 0 if the ranks were not looked up
+        """
+        return self.average_rank.rating if self.average_rank is not None else 0
 
     def __str__(self):
         if self.average_rank is None:
@@ -94,11 +133,39 @@ class Team:
         else:
             return f"__{self.name}__ Ø: {str(self.average_rank)} max: {str(self.max_rank)} | {self.multi_link}"
 
+    def stats_str(self):
+        """
+        Returns the rank statistics of the team in one line, the percentile is left out until the whole league is known
+        :return: String, empty if the statistics were not calculated or the team has no ranked players
+        """
+        if not self.has_stats():
+            return ""
+        stats = (f"median: {str(self.median_rank)} top 3: {str(self.top3_rank)} "
+                 f"deviation: {self.rank_deviation:.1f} divisions")
+        if self.percentile is None:
+            return stats
+        return f"{stats} percentile: {self.percentile:.0f}"
+
+    def has_stats(self):
+        return self.median_rank is not None and self.max_rank is not None and self.max_rank.rating > 0
+
+    def render(self, extended=False, discord_format=True):
+        """
+        Returns the output for the team in one of the four formats of the string methods
+        :param extended: Boolean(False), if True the ranks of the players are included
+        :param discord_format: Boolean(True), if True the output is formatted for discord chat
+        :return: String, the same as the matching string method
+        """
+        if extended:
+            return self.extended_str() if discord_format else self.ext_no_format_str()
+        return str(self) if discord_format else self.no_format_str()
+
     def extended_str(self):
-        out = str(self) + "\n"
-        for player in self.player_list:
-            out += str(player) + " | "
-        return out[:-3]
+        lines = [str(self)]
+        if self.has_stats():
+            lines.append(self.stats_str())
+        lines.append(" | ".join(str(player) for player in self.player_list))
+        return "\n".join(lines)
 
     def no_format_str(self):
         if self.average_rank is None:
@@ -107,10 +174,11 @@ class Team:
             return f"{self.name} Ø: {str(self.average_rank)} max: {str(self.max_rank)} | {self.multi_link}"
 
     def ext_no_format_str(self):
-        out = self.no_format_str() + "\n"
-        for player in self.player_list:
-            out += player.no_format_str() + " | "
-        return out[:-3]
+        lines = [self.no_format_str()]
+        if self.has_stats():
+            lines.append(self.stats_str())
+        lines.append(" | ".join(player.no_format_str() for player in self.player_list))
+        return "\n".join(lines)
 
 
 @dataclass
@@ -118,34 +186,38 @@ class TeamList:
     """
     Saves a list of teams and the name of the list
     """
+    __slots__ = ("name", "teams")
     name: str
     teams: List[Team]
 
+    def render_pieces(self, extended=False, discord_format=True):
+        """
+        Yields the output of the list one team at a time, so big lists can be chunked or written to a file without
+        building the whole string first
+        :param extended: Boolean(False), if True the teams are sorted by rank and the player ranks are included
+        :param discord_format: Boolean(True), if True the output is formatted for discord chat
+        :return: Iterator[String], joined they are the same as the matching string method
+        """
+        if discord_format:
+            yield f"__**{self.name}**__ \n"
+        else:
+            yield f"{self.name} \n\n" if extended else f"{self.name}\n\n"
+        teams = sorted(self.teams, key=Team.average_rating, reverse=True) if extended else self.teams
+        separator = "\n" if discord_format else "\n\n"
+        for team in teams:
+            yield team.render(extended, discord_format) + separator
+
     def __str__(self):
-        out = f"__**{self.name}**__ \n"
-        for team in self.teams:
-            out += str(team) + "\n"
-        return out
+        return "".join(self.render_pieces())
 
     def extended_str(self):
-        out = f"__**{self.name}**__ \n"
-        sorted_teams = sorted(self.teams, key=lambda team: lookup_tables.rank_lookup.get(str(team.average_rank).lower()), reverse=True)
-        for team in sorted_teams:
-            out += team.extended_str() + "\n"
-        return out
+        return "".join(self.render_pieces(extended=True))
 
     def no_format_str(self):
-        out = f"{self.name}\n\n"
-        for team in self.teams:
-            out += team.no_format_str() + "\n\n"
-        return out
+        return "".join(self.render_pieces(discord_format=False))
 
     def ext_no_format_str(self):
-        out = f"{self.name} \n\n"
-        sorted_teams = sorted(self.teams, key=lambda team: lookup_tables.rank_lookup.get(str(team.average_rank).lower()), reverse=True)
-        for team in sorted_teams:
-            out += team.ext_no_format_str() + "\n\n"
-        return out
+        return "".join(self.render_pieces(extended=True, discord_format=False))
 
 
 @dataclass
@@ -153,28 +225,27 @@ class TeamListList:
     """
     Saves a list of TeamList objects
     """
+    __slots__ = ("team_lists", )
     team_lists: List[TeamList]
 
-    def __str__(self):
-        out = ""
+    def render_pieces(self, extended=False, discord_format=True):
+        """
+        Yields the output of all lists one team at a time, see TeamList.render_pieces
+        :param extended: Boolean(False), if True the teams are sorted by rank and the player ranks are included
+        :param discord_format: Boolean(True), if True the output is formatted for discord chat
+        :return: Iterator[String], joined they are the same as the matching string method
+        """
         for team_list in self.team_lists:
-            out += str(team_list)
-        return out
+            yield from team_list.render_pieces(extended, discord_format)
+
+    def __str__(self):
+        return "".join(self.render_pieces())
 
     def extended_str(self):
-        out = ""
-        for team_list in self.team_lists:
-            out += team_list.extended_str()
-        return out
+        return "".join(self.render_pieces(extended=True))
 
     def no_format_str(self):
-        out = ""
-        for team_list in self.team_lists:
-            out += team_list.no_format_str()
-        return out
+        return "".join(self.render_pieces(discord_format=False))
 
     def ext_no_format_str(self):
-        out = ""
-        for team_list in self.team_lists:
-            out += team_list.ext_no_format_str()
-        return out
+        return "".join(self.render_pieces(extended=True, discord_format=False))
@@ -1,53 +1,113 @@
 """
-Handles Challangermode stalking
+Handles Challengermode stalking
 :author: Jonathan Decker
 """
-from utils.webmanager import open_session, quit_session
+from urllib.parse import unquote_plus, urljoin
+from utils.webmanager import driver_session, wait_until
+from utils import page_parser
+from utils import task_queue
 import logging
-import time
-import bs4
 from models import Player, Team, TeamList
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions
 
 logger = logging.getLogger('scrap_logger')
 
+# secs to wait for more participants after scrolling down, the end of the list is reached if none show up
+SCROLL_WAIT = 2
+# secs to wait for the linked summoners of a team, teams without linked summoners never show any
+TEAM_LINKS_WAIT = 3
+
+BASE_URL = "https://www.challengermode.com"
+
+# collects the links in the participant list and watches it for links the page adds while scrolling
+_WATCH_LINKS_SCRIPT = """
+const container = document.querySelector("div.cm-arena-wrap");
+window.stalkerLinks = [];
+const take = node => {
+    if (node.nodeType !== Node.ELEMENT_NODE) return;
+    if (node.matches("a[href]")) window.stalkerLinks.push(node.getAttribute("href"));
+    node.querySelectorAll("a[href]").forEach(link => window.stalkerLinks.push(link.getAttribute("href")));
+};
+take(container);
+new MutationObserver(mutations => mutations.forEach(mutation => mutation.addedNodes.forEach(take)))
+    .observe(container, {childList: true, subtree: true});
+return window.stalkerLinks.splice(0);
+"""
+
+# hands over the links added since the last call
+_TAKE_LINKS_SCRIPT = "return window.stalkerLinks.splice(0);"
+
 
 def stalk(url: str):
+    """
+    Stalks all teams signed up for a challengermode tournament. The participants are loaded by scrolling, the links
+    of the participants that were added since the last scroll are collected in the browser and only those are sent
+    back, so every participant is handled once however long the list gets. The team pages are visited one after
+    another with the same driver, so a big tournament does not block the shared workers waiting for drivers.
+    :param url: Str, a link to a tournament on challengermode
+    :return: TeamList, containing a Team obj for each signed up team
+    """
 
+    logger.debug("Beginning challengermode stalk for " + url)
     # edit url
     url = url.lower()
     url = url.replace("/show/", "/participants/")
 
-    # open a websession
-    driver = open_session(headless=True)
-    driver.get(url)
-
-    all_links = []
-    # scroll down one page until end of page
-    last_height = driver.execute_script("return document.body.scrollHeight")
-    while True:
-        # snapshot source and collect all hrefs from container
-        soup = bs4.BeautifulSoup(driver.page_source, features="html.parser")
-        team_conainter = soup.find('div', class_="cm-arena-wrap")
+    collector = LinkCollector()
+    # borrow a websession
+    with driver_session() as driver:
+        driver.get(url)
+        wait_until(driver, expected_conditions.presence_of_element_located((By.CLASS_NAME, "cm-arena-wrap")))
+        title = driver.title.strip()
+        collector.add(driver.execute_script(_WATCH_LINKS_SCRIPT))
+
+        # scroll down one page until end of page
+        last_height = driver.execute_script("return document.body.scrollHeight")
+        while True:
+            # Scroll down to bottom
+            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+
+            # Wait until the page grows, if it does not the end was reached
+            try:
+                last_height = wait_until(driver, lambda page: _grown_height(page, last_height), SCROLL_WAIT)
+            except TimeoutException:
+                break
+            finally:
+                collector.add(driver.execute_script(_TAKE_LINKS_SCRIPT))
+
+        team_links = [urljoin(BASE_URL, link) for link in collector.links if "/teams/" in link]
+        logger.info(f"Stalking {len(team_links)} teams for {title}")
+        teams = []
+        command = task_queue.current_command()
+        for index, team_link in enumerate(team_links):
+            try:
+                task_queue.check_cancelled()
+                team = _read_team(driver, team_link)
+            except task_queue.CommandCancelledError:
+                logger.warning(f"Skipped {len(team_links) - index} teams since {command.name} was cancelled")
+                command.incomplete = True
+                break
+            except TimeoutException as exc:
+                logger.error(f"Stalking the team {team_link} generated an exception: {exc}")
+                continue
+            teams.append(team)
+            task_queue.report_progress(team)
 
-        links = [link["href"] for link in team_conainter.find_all("a", href=True)]
-        all_links = all_links + links
-        all_links = list(dict.fromkeys(all_links))
-
-        # Scroll down to bottom
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-
-        # Wait to load page
-        time.sleep(0.5)
+    return TeamList(title, teams)
 
-        # Calculate new scroll height and compare with last scroll height
-        new_height = driver.execute_script("return document.body.scrollHeight")
-        if new_height == last_height:
-            break
-        last_height = new_height
 
-    # TODO finish challengermode stalker, still needs a good solution
+def stalk_team(url):
+    """
+    Stalk all players of a team on challengermode
+    :param url: Str, a link to the page of a team on challengermode
+    :return: Team, containing a Player obj for each player with a linked summoner name
+    """
 
-    return
+    logger.debug("Beginning challengermode team stalk for " + url)
+    with driver_session() as driver:
+        return _read_team(driver, url)
 
 
 def quick_stalk(url):
@@ -58,12 +118,16 @@ def quick_stalk(url):
     """
 
     logger.debug("Beginning challengermode quick stalk for " + url)
-    driver = open_session()
-    driver.get(url)
+    with driver_session() as driver:
+        driver.get(url)
 
-    time.sleep(3)
-    challenger_soup = bs4.BeautifulSoup(driver.page_source, features="html.parser")
-    quit_session(driver)
+        wait_until(driver, _match_loaded)
+        try:
+            wait_until(driver, _match_players_linked, TEAM_LINKS_WAIT)
+        except TimeoutException:
+            # caught inside the session, the driver is fine and goes back to the pool
+            logger.debug(f"Not every team links its summoners on {url}")
+        challenger_soup = page_parser.parse(driver.page_source)
 
     team_containers = challenger_soup.find_all('div', class_="col-6--sm")
     title = challenger_soup.select("#arena-wrap > div > div > div.p-b--medium > div:nth-child(1) > div.pos--rel.z--99.cm-text-shadow > div > div.dis--flx.flx-dir--col.ali-ite--center > div.ta--center > div > span > span")[0].text
@@ -75,14 +139,77 @@ def quick_stalk(url):
         team_name_raw = team_name_block.text
         team_name = team_name_raw.strip()
 
-        player_opggs_htmls = team_container.find_all('a', class_="link-white-dark")
-        player_opggs = []
-        for player_opggs_html in player_opggs_htmls:
-            player_opggs.append(player_opggs_html['href'])
-        players = []
-        for player_opgg in player_opggs:
-            rest, sum_name = player_opgg.split("=")
-            players.append(Player(sum_name.replace("+", " ")))
-        teams.append(Team(team_name, players))
+        teams.append(Team(team_name, _parse_players(team_container)))
 
     return TeamList(title, teams)
+
+
+class LinkCollector:
+    """
+    Keeps the links found while scrolling in the order they were found, each link once
+    """
+
+    def __init__(self):
+        # dicts keep their insertion order, so the keys are an ordered set
+        self._links = {}
+
+    def add(self, links):
+        """
+        Adds the given links, links that were found before are skipped
+        :param links: Iterable[Str], links in the order of the page
+        :return: List[Str], the links that were not found before
+        """
+        new_links = []
+        for link in links:
+            if link not in self._links:
+                self._links[link] = None
+                new_links.append(link)
+        return new_links
+
+    @property
+    def links(self):
+        return list(self._links)
+
+    def __len__(self):
+        return len(self._links)
+
+
+def _parse_players(container):
+    # players are linked to their op.gg page, the summoner name is the last query value
+    players = []
+    for player_opgg_html in container.find_all('a', class_="link-white-dark", href=True):
+        rest, sum_name = player_opgg_html['href'].rsplit("=", 1)
+        players.append(Player(unquote_plus(sum_name)))
+    return players
+
+
+def _read_team(driver, url):
+    driver.get(url)
+
+    wait_until(driver, expected_conditions.presence_of_element_located((By.TAG_NAME, "h1")))
+    try:
+        wait_until(driver, expected_conditions.presence_of_element_located((By.CSS_SELECTOR, "a.link-white-dark")),
+                   TEAM_LINKS_WAIT)
+    except TimeoutException:
+        # caught inside the session, the driver is fine and goes back to the pool
+        logger.debug(f"No linked summoners found for {url}")
+    team_soup = page_parser.parse(driver.page_source)
+
+    team_name = team_soup.find('h1').text.strip()
+    return Team(team_name, _parse_players(team_soup))
+
+
+def _grown_height(driver, last_height):
+    height = driver.execute_script("return document.body.scrollHeight")
+    return height if height > last_height else None
+
+
+def _match_loaded(driver):
+    # the teams are rendered by scripts after the page has loaded
+    return len(driver.find_elements(By.CSS_SELECTOR, "div.col-6--sm")) >= 2
+
+
+def _match_players_linked(driver):
+    # teams without linked summoners never show any, so this is only waited for shortly
+    team_containers = driver.find_elements(By.CSS_SELECTOR, "div.col-6--sm")
+    return all(container.find_elements(By.CSS_SELECTOR, "a.link-white-dark") for container in team_containers)
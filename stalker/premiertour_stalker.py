@@ -5,11 +5,10 @@ Handles scraping of primeleague.gg since premiertour rebranded to primeleague.
 """
 
 import logging
-import bs4
 from bs4.diagnose import diagnose
 from models import Team, TeamList, Player
-import requests
-from utils.task_queue import TaskGroup, SingleTask, submit_task_group
+from utils import http_client
+from utils import page_parser
 
 
 logger = logging.getLogger('scrap_logger')
@@ -37,13 +36,9 @@ def stalk(premiertour_link):
     # grab div class=section-content from it and extract all hrefs
     all_links = grab_team_links(edited_premiertour_link)
 
-    # open each link, collect summoner names
-    single_tasks = []
-    for link in all_links:
-        single_tasks.append(SingleTask(stalk_team, link))
-    task_group = TaskGroup(single_tasks, "stalk: " + tournament_name)
-
-    team_list = submit_task_group(task_group)
+    # open each link, collect summoner names, deleted teams are skipped
+    logger.info(f"Stalking {len(all_links)} teams for {tournament_name}")
+    team_list = http_client.crawl(all_links, parse_team, report=True)
 
     return TeamList(tournament_name, team_list)
 
@@ -55,8 +50,17 @@ def stalk_team(url):
     :return: Team, containing the players of the team
     """
     # request page information
-    page = requests.get(url)
-    soup = bs4.BeautifulSoup(page.text, features="html.parser")
+    page = http_client.get(url)
+    return parse_team(page.text)
+
+
+def parse_team(html):
+    """
+    Takes the html of a premiertour team page and returns a Team obj for the players of the team
+    :param html: String, the text of a premiertour team page
+    :return: Team, containing the players of the team or None if the team was deleted
+    """
+    soup = page_parser.parse(html, ['ul', 'h1'])
     player_container = soup.find('ul', class_="content-portrait-grid-l")
 
     # check if the team was deleted
@@ -93,8 +97,8 @@ def get_title(url):
     :return: String, the title of the tournament
     """
 
-    main_page = requests.get(url)
-    main_premiertour_soup = bs4.BeautifulSoup(main_page.text, features="html.parser")
+    main_page = http_client.get(url)
+    main_premiertour_soup = page_parser.parse(main_page.text, "h1")
     tournament_name = main_premiertour_soup.find("h1").text
     return tournament_name
 
@@ -105,9 +109,9 @@ def grab_team_links(url):
     :param url: String, valid link to the participants page of a premiertour tournament
     :return: List(String), list of urls to all teams with valid sign ups
     """
-    page = requests.get(url)
+    page = http_client.get(url)
     html_string = page.text
-    premiertour_soup = bs4.BeautifulSoup(html_string, features="html.parser")
+    premiertour_soup = page_parser.parse(html_string, "tr")
     team_container = premiertour_soup.find_all("tr")
 
     links = []
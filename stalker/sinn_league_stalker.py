@@ -3,77 +3,123 @@ Provides functions to collect information on all players in a SINN League Season
 
 :author: Jonathan Decker
 """
-from utils.webmanager import open_session, quit_session
+from utils.webmanager import driver_session, wait_until
 import logging
-import time
-import bs4
 from models import Player, Team, TeamList, TeamListList
 from utils import task_queue
 from selenium.common.exceptions import ElementClickInterceptedException
-import requests
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions
+from utils import http_client
+from utils import page_parser
 
 logger = logging.getLogger('scrap_logger')
 
 
 def stalk(url):
     """
-    Main function of the module, takes a url to a SINN League Season and returns a list of TeamList objects
+    Main function of the module, takes a url to a SINN League Season and returns a list of TeamList objects.
+    The group links are taken from the page as the server sends it, only if a division is missing there the page is
+    expanded in a browser.
     :param url: Str, url to the main page of a SINN League Season
     :return: List[TeamList], a list of TeamList objects with each TeamList representing a group
     """
-    # open web session
     logger.debug("Beginning sinn league season stalk for " + url)
-    driver = open_session()
-
-    driver.get(url)
-
-    # Select Gruppenphase Container
-    div_button_list = driver.find_elements_by_class_name("content-subsection-toggle")
-    # division 1 and 2 are expanded by default
-    count = 4
-    for div_button in reversed(div_button_list):
-        if count > 0:
-            try:
-                div_button.click()
-            except ElementClickInterceptedException:
-                button = driver.find_element_by_xpath("/html/body/div[1]/div/div[1]/div/button[2]")
-                button.click()
-                time.sleep(1)
-
-                div_button.click()
-        count += -1
-
-    soup = bs4.BeautifulSoup(driver.page_source, features="html.parser")
+    try:
+        links = find_group_links(http_client.get_text(url))
+    except task_queue.CommandCancelledError:
+        raise
+    except Exception as exc:
+        logger.warning(f"Fetching {url} failed, trying a browser instead: {exc}")
+        links = None
+    if links is None:
+        logger.info(f"Not all groups of {url} are in the page, expanding it in a browser")
+        links = find_group_links(expand_season_page(url), complete=False)
+
+    # create task Q over all group-links
+    single_tasks = []
+    for link in links:
+        # groups are reported as a whole instead of team by team
+        single_task = task_queue.SingleTask(stalk_group, link, False)
+        single_tasks.append(single_task)
+    task_group = task_queue.TaskGroup(single_tasks, "stalk: " + url)
+
+    logger.info("Stalking " + str(len(single_tasks)) + " groups in SINN League")
+    team_lists = task_queue.submit_task_group(task_group, ordered=True, report=True)
+
+    # return results
+    logger.info("Finished SINN League stalking")
+    return TeamListList(team_lists)
+
+
+def find_group_links(page_source, complete=True):
+    """
+    Extracts the links to all groups from the Gruppenphase section of a season page
+    :param page_source: Str, the html of the main page of a SINN League Season
+    :param complete: Boolean(True), if True None is returned unless every division in the section has group links
+    :return: List[Str], the group links in the order of the page, None if they are incomplete
+    """
+    soup = page_parser.parse(page_source, 'section', class_="boxed-section")
     box_container = soup.find_all('section', class_="boxed-section")
     gruppenphase = "Gruppenphase"
+    group_stage_container = None
     for box in box_container:
         title = box.find_all("h2")
         if len(title) > 0:
             if gruppenphase in title[0].text:
                 group_stage_container = box
+    if group_stage_container is None:
+        return None if complete else []
+
+    # extract all group-links, a division toggle that is not followed by a group link was collapsed
+    links = []
+    waiting_for_group = False
+    for tag in group_stage_container.find_all(lambda tag: _is_division_toggle(tag) or tag.has_attr("href")):
+        if _is_division_toggle(tag):
+            if waiting_for_group and complete:
+                return None
+            waiting_for_group = True
+        elif filter_links(tag["href"]):
+            links.append(tag["href"])
+            waiting_for_group = False
+    if complete and (waiting_for_group or len(links) == 0):
+        return None
+    return list(dict.fromkeys(links))
 
-    # extract all group-links
-    links = [link["href"] for link in group_stage_container.find_all("a", href=True)]
-    links = list(dict.fromkeys(links))
 
-    links = filter(filter_links, links)
+def expand_season_page(url):
+    """
+    Opens the season page in a browser and expands the collapsed divisions
+    :param url: Str, url to the main page of a SINN League Season
+    :return: Str, the html of the expanded page
+    """
+    # borrow a web session, it is given back once the page is expanded
+    with driver_session() as driver:
+        driver.get(url)
+
+        # Select Gruppenphase Container
+        div_button_list = wait_until(driver, expected_conditions.presence_of_all_elements_located(
+            (By.CLASS_NAME, "content-subsection-toggle")))
+        # division 1 and 2 are expanded by default
+        count = 4
+        for div_button in reversed(div_button_list):
+            if count > 0:
+                try:
+                    div_button.click()
+                except ElementClickInterceptedException:
+                    # close the cookie banner in front of the buttons
+                    banner_button = (By.XPATH, "/html/body/div[1]/div/div[1]/div/button[2]")
+                    driver.find_element(*banner_button).click()
+                    wait_until(driver, expected_conditions.invisibility_of_element_located(banner_button))
 
-    # close web session
-    quit_session(driver)
+                    div_button.click()
+            count += -1
 
-    # create task Q over all group-links
-    single_tasks = []
-    for link in links:
-        single_task = task_queue.SingleTask(stalk_group, link)
-        single_tasks.append(single_task)
-    task_group = task_queue.TaskGroup(single_tasks, "stalk: " + url)
+        return driver.page_source
 
-    logger.info("Stalking " + str(len(single_tasks)) + " groups in SINN League")
-    team_lists = task_queue.submit_task_group(task_group)
 
-    # return results
-    logger.info("Finished SINN League stalking")
-    return TeamListList(team_lists)
+def _is_division_toggle(tag):
+    return "content-subsection-toggle" in tag.get("class", [])
 
 
 def filter_links(link):
@@ -90,19 +136,20 @@ def filter_links(link):
     return False
 
 
-def stalk_group(url):
+def stalk_group(url, report_teams=True):
     """
     Returns a TeamList object for all teams in the group behind the given url.
     :param url: Str, a link to a group in a SINN League
+    :param report_teams: Boolean(True), if True every Team is passed to task_queue.report_progress once it is ready
     :return: TeamList, a TeamList object containing all teams of the group
     """
 
     logger.debug("Beginning sinn league group stalk for " + url)
     # open web session
-    page = requests.get(url)
+    page = http_client.get(url)
 
     # Select Rangliste Container and find division name
-    soup = bs4.BeautifulSoup(page.text, features="html.parser")
+    soup = page_parser.parse(page.text)
     list_container = soup.find('table', class_="table table-fixed-single table-responsive")
     # div_name = driver.find_element_by_xpath("//*[@id=\"container\"]/div/h1").text
     div_name = soup.select("#container > div > h1")[0].text
@@ -111,19 +158,11 @@ def stalk_group(url):
     links = [link["href"] for link in list_container.find_all("a", href=True)]
     links = list(dict.fromkeys(links))
 
-    # create task Q over all team-links
-    single_tasks = []
-    for link in links:
-        single_task = task_queue.SingleTask(stalk_team, link)
-        single_tasks.append(single_task)
-    task_group = task_queue.TaskGroup(single_tasks, "stalk: " + div_name)
-
-    teams = task_queue.submit_task_group(task_group)
+    # fetch and parse all team pages, deleted teams are skipped
+    logger.debug(f"Stalking {len(links)} teams for {div_name}")
+    teams = http_client.crawl(links, parse_team, report=report_teams)
 
     # return results
-    for team in teams:
-        if team is None:
-            teams.remove(team)
     return TeamList(div_name, teams)
 
 
@@ -136,10 +175,19 @@ def stalk_team(url):
 
     logger.debug("Beginning sinn league team stalk for " + url)
     # open web session
-    page = requests.get(url)
+    page = http_client.get(url)
+    return parse_team(page.text)
+
+
+def parse_team(html):
+    """
+    Returns a Team object for all players on the given SINN League team page
+    :param html: Str, the text of a team page on the SINN League page
+    :return: Team, a Team object containing all valid players from the Team or None if the team was deleted
+    """
 
     # Select Teammitglieder Container and find team name
-    soup = bs4.BeautifulSoup(page.text, features="html.parser")
+    soup = page_parser.parse(html, ['ul', 'div'], class_=["content-portrait-grid-l", "content-portrait-head"])
     player_container = soup.find('ul', class_="content-portrait-grid-l")
 
     # check if the team was deleted
@@ -3,10 +3,9 @@ Handles scraping of the toornament page.
 :author: Jonathan Decker
 """
 import logging
-import bs4
 from models import Team, TeamList, Player
-import requests
-from utils.task_queue import TaskGroup, SingleTask, submit_task_group
+from utils import http_client
+from utils import page_parser
 
 
 logger = logging.getLogger('scrap_logger')
@@ -28,8 +27,8 @@ def stalk(toornament_link):
     # find all teams and save the links
     participants_links = []
     base_url = "https://www.toornament.com"
-    page = requests.get(edited_toornament_link)
-    toornament_soup = bs4.BeautifulSoup(page.text, features="html.parser")
+    page = http_client.get(edited_toornament_link)
+    toornament_soup = page_parser.parse(page.text, 'div', class_=["layout-section", "size-1-of-4"])
     team_container = toornament_soup.find_all('div', class_="size-1-of-4")
 
     # multiple team page test
@@ -39,41 +38,41 @@ def stalk(toornament_link):
         count += 1
         #driver.get(str(driver.current_url)[:-1] + str(count))
         multipage_toornament = multipage_toornament[:-1] + str(count)
-        page = requests.get(multipage_toornament)
-        toornament_soup2 = bs4.BeautifulSoup(page.text, features="html.parser")
+        page = http_client.get(multipage_toornament)
+        toornament_soup2 = page_parser.parse(page.text, 'div', class_="size-1-of-4")
         if len(toornament_soup2.find_all('div', class_="size-1-of-4")) > 0:
             team_container.extend(toornament_soup2.find_all('div', class_="size-1-of-4"))
         else:
             break
 
     # extract toornament name
-    tournament_name = toornament_soup.select("#main-container > div.layout-section.header > div > section > div > div.information > div.name > h1")[0].text
+    tournament_name = toornament_soup.select("div.layout-section.header > div > section > div > div.information > div.name > h1")[0].text
 
     for team in team_container:
         a = team.find('a', href=True)
         participants_links.append(base_url + a['href'])
 
     # open each link, switch to information and collect the Summoner Names
-    single_tasks = []
-    for link in participants_links:
-        single_tasks.append(SingleTask(stalk_team, link))
-    task_group = TaskGroup(single_tasks, "stalk: " + tournament_name)
-
-    teams_players_tuples = submit_task_group(task_group)
-
-    # build Player, Team and TeamList objects
-    team_list = []
-    for team in teams_players_tuples:
-        sum_names = team[0]
-        team_name = team[1]
-        players = []
-        for sum_name in sum_names:
-            players.append(Player(sum_name))
-        team_list.append(Team(team_name, players))
+    info_links = [link + "info" for link in participants_links]
+    logger.info(f"Stalking {len(info_links)} teams for {tournament_name}")
+    team_list = http_client.crawl(info_links, build_team, report=True)
 
     return TeamList(tournament_name, team_list)
 
 
+def build_team(html):
+    """
+    Builds a Team obj from the information page of a team on toornament
+    :param html: Str, the text of the information page of a team
+    :return: Team, containing a Player obj for each summoner name
+    """
+    sum_names, team_name = parse_team(html)
+    players = []
+    for sum_name in sum_names:
+        players.append(Player(sum_name))
+    return Team(team_name, players)
+
+
 def stalk_team(url):
     """
     Use request to gather information on a team on toornament
@@ -83,10 +82,19 @@ def stalk_team(url):
 
     logger.debug("Beginning toornament team stalk for " + url)
     edited_url = url + "info"
-    page = requests.get(edited_url)
+    page = http_client.get(edited_url)
+    return parse_team(page.text)
+
+
+def parse_team(html):
+    """
+    Extracts the team name and player names from the information page of a team on toornament
+    :param html: Str, the text of the information page of a team
+    :return: (List[Str], Str), a tuple containing the list of player names and the team name
+    """
 
-    toornament_soup = bs4.BeautifulSoup(page.text, features="html.parser")
-    team_name = toornament_soup.select("#main-container > div.layout-section.header > div > div.layout-block.header > div > div.title > div > span")[0].text
+    toornament_soup = page_parser.parse(html, 'div', class_=["layout-section", "summoner_player_id"])
+    team_name = toornament_soup.select("div.layout-section.header > div > div.layout-block.header > div > div.title > div > span")[0].text
     name_container = toornament_soup.find_all('div', class_="text secondary small summoner_player_id")
 
     names = []
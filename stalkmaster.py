@@ -3,14 +3,25 @@ Handles interpreting commands and calling the respective stalker
 
 :author: Jonathan Decker
 """
+import contextlib
+import copy
+import itertools
 import logging
+import threading
+from urllib.parse import urlsplit, urlunsplit
 from stalker import challengermode_stalker, sinn_league_stalker, toornament_stalker, premiertour_stalker
-from utils import task_queue, player_lookup
+from utils import task_queue, player_lookup, prewarmer, rate_limiter, renderer
+from utils import scrap_config as config
+from utils.cache import TTLCache, SingleFlight
 from models import Team, TeamList, TeamListList
 
 
 logger = logging.getLogger('scrap_logger')
 
+_result_cache = None
+_result_cache_lock = threading.Lock()
+_single_flight = SingleFlight()
+
 
 class UnknownUrlError(Exception):
     """
@@ -27,52 +38,237 @@ def feature_not_available_right_now(*args):
     return "This feature is not available in the current version"
 
 
-def call_stalk_master(url, extended=False, discord_format=True) -> str:
+def call_stalk_master(url, extended=False, discord_format=True, listener=None, owner=None) -> str:
     """
     Oversees stalking of the given url and returns the results as string.
     :param url: String, a valid url for any stalker. If it can't be matched an error message will be returned.
     :param extended: Boolean(False), flag to set if player look ups should be run for the players found.
     :param discord_format: Boolean(True), flag to set if the returned string should be formatted for discord chat.
+    :param listener: function(None), called from a worker thread with every Team or TeamList as soon as it is ready.
+    :param owner: any(None), identifies who may cancel the stalk with cancel_stalks, for example a discord user id.
     :return:
     """
+    return "".join(stream_stalk_master(url, extended, discord_format, listener, owner))
+
+
+def stream_stalk_master(url, extended=False, discord_format=True, listener=None, owner=None):
+    """
+    Same as call_stalk_master but the output is returned in pieces, see renderer, so it can be chunked for discord or
+    written to a file without building the whole string. The stalk is done once this returns, the output is rendered
+    while iterating.
+    :param url: String, a valid url for any stalker. If it can't be matched an error message will be returned.
+    :param extended: Boolean(False), flag to set if player look ups should be run for the players found.
+    :param discord_format: Boolean(True), flag to set if the output should be formatted for discord chat.
+    :param listener: function(None), called from a worker thread with every Team or TeamList as soon as it is ready.
+    :param owner: any(None), identifies who may cancel the stalk with cancel_stalks, for example a discord user id.
+    :return: Iterator[String], joined they are the output of call_stalk_master
+    """
     # call url matcher to find out which stalker to use
     try:
         stalker = url_matcher(url)
         logger.debug(url + " will be handled by " + stalker.__name__)
     except UnknownUrlError:
         logger.warning("User submitted an invalid url: " + url)
-        return f"The given URL could not be matched with any available tool. The URL was: {url}"
+        return iter([f"The given URL could not be matched with any available tool. The URL was: {url}"])
 
-    # create task for stalker
-    single_task = [task_queue.SingleTask(stalker, url)]
-    task_group = task_queue.TaskGroup(single_task, stalker.__name__)
-
-    results = task_queue.submit_task_group(task_group)[0]
+    # all tasks of this command share the worker pool with other commands and are accounted together
+    with task_queue.command_scope(url, listener, owner, config.get_command_timeout()) as command:
+        results = stalk_url(url, stalker, extended)
 
     # prepare output
+    pieces = renderer.render_pieces(results, extended, discord_format)
+    if command.incomplete:
+        note = "\nThe stalk was cancelled or ran out of time, these results are incomplete."
+        pieces = itertools.chain(pieces, [note])
+    return pieces
+
+
+def cancel_stalks(owner):
+    """
+    Cancels all running stalks of the given owner
+    :param owner: any, the owner passed to call_stalk_master
+    :return: int, the number of cancelled stalks
+    """
+    commands = [command for command in task_queue.active_commands() if command.owner == owner]
+    for command in commands:
+        command.cancel()
+    return len(commands)
+
+
+def refresh_watched_url(url):
+    """
+    Stalks a url from the watch list in the background, the players found are prewarmed like after any basic stalk
+    :param url: String, a valid url for any stalker
+    :return: None
+    """
+    stalker = url_matcher(url)
+    with task_queue.command_scope(url, owner=prewarmer.OWNER, timeout=config.get_command_timeout()):
+        run_stalker(url, stalker, False)
+
+
+def start_watch_list():
+    """
+    Starts refreshing the tournaments on the watch list, see prewarmer.start_watch_list
+    :return: None
+    """
+    prewarmer.start_watch_list(refresh_watched_url)
+
+
+def collect_sum_names(results):
+    """
+    Collects the summoner names of all players in a stalk result
+    :param results: TeamListList, TeamList or Team, the result of a stalker
+    :return: List[String], the summoner names in order of their teams
+    """
+    if isinstance(results, TeamListList):
+        teams = [team for team_list in results.team_lists for team in team_list.teams]
+    elif isinstance(results, TeamList):
+        teams = results.teams
+    elif isinstance(results, Team):
+        teams = [results]
+    else:
+        teams = []
+    return [player.summoner_name for team in teams for player in team.player_list]
+
+
+def get_result_cache():
+    """
+    Returns the cache for whole stalk results and creates it from the config on first use
+    :return: TTLCache, maps the result_key of a stalk to its result
+    """
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            max_size, ttl = config.get_result_cache_settings()
+            _result_cache = TTLCache(max_size, ttl, "result")
+        return _result_cache
+
+
+def normalize_url(url):
+    """
+    Normalizes a url so different spellings of the same page share one cache entry
+    :param url: String, a valid url
+    :return: String, the url with lower case scheme and host, without fragment and trailing slash
+    """
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/")
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
+
+def result_key(url, extended):
+    """
+    Builds the key of a stalk result, extended results hold ranks of the region set in the config, so it is part of
+    their key
+    :param url: String, a valid url
+    :param extended: Boolean, if True the result has player ranks
+    :return: tuple, the key for the result cache and for sharing running stalks
+    """
     if extended:
-        if isinstance(results, TeamListList):
-            player_lookup.add_list_team_list_ranks(results)
-        elif isinstance(results, TeamList):
-            player_lookup.add_team_list_ranks(results)
-        elif isinstance(results, Team):
-            player_lookup.add_team_ranks(results)
-
-        if isinstance(results, str):
-            out = results
-        else:
-            if discord_format:
-                out = results.extended_str()
-            else:
-                out = results.ext_no_format_str()
+        return normalize_url(url), True, (config.get_region() or "").lower()
+    return normalize_url(url), False
+
+
+def stalk_url(url, stalker, extended):
+    """
+    Returns the stalk result for the url from the cache or runs the stalker, identical stalks running at the same
+    time are only done once
+    :param url: String, a valid url for the given stalker
+    :param stalker: function, the stalker returned by url_matcher
+    :param extended: Boolean, if True the result has player ranks
+    :return: TeamListList, TeamList, Team or String, the result of the stalker, must not be modified
+    """
+    key = result_key(url, extended)
+    results = get_result_cache().get(key)
+    if results is not None:
+        logger.info(f"Serving {url} from the result cache")
+        return results
+
+    command = task_queue.current_command()
+    while True:
+        try:
+            results, incomplete, cancelled_early = _single_flight.do(key, _run_shared_stalker, url, stalker, extended,
+                                                                     check=task_queue.check_cancelled)
+        except task_queue.CommandCancelledError:
+            # cancelled while waiting for the same stalk of another command
+            command.incomplete = True
+            return f"Stalking {url} was cancelled before any results were found."
+        if command is None:
+            return results
+        # the owner of the shared stalk cancelled it, the commands that waited for it run the stalk again
+        if cancelled_early and not command.cancelled:
+            logger.info(f"The stalk of {url} this command waited for was cancelled, stalking it again")
+            continue
+        if incomplete:
+            command.incomplete = True
+        return results
+
 
+def _run_shared_stalker(url, stalker, extended):
+    # commands waiting for the same stalk need to know how it ended, not only its results
+    results = run_stalker(url, stalker, extended)
+    command = task_queue.current_command()
+    if command is None:
+        return results, False, False
+    return results, command.incomplete, command.cancelled_early
+
+
+def run_stalker(url, stalker, extended):
+    """
+    Runs the stalker for the url, adds player ranks if extended is set and caches the result.
+    The players of a basic stalk are queued for prewarming.
+    :param url: String, a valid url for the given stalker
+    :param stalker: function, the stalker returned by url_matcher
+    :param extended: Boolean, if True player ranks are looked up
+    :return: TeamListList, TeamList, Team or String, the result of the stalker
+    """
+    result_cache = get_result_cache()
+    key = result_key(url, extended)
+    results = result_cache.get(key)
+    if results is not None:
+        return results
+
+    # an extended stalk can start from a copy of a cached basic stalk and only look up the ranks
+    results = result_cache.get(result_key(url, False)) if extended else None
+    if results is not None:
+        results = copy.deepcopy(results)
     else:
-        if discord_format:
-            out = str(results)
-        else:
-            out = results.no_format_str()
+        # create task for stalker, an extended stalk only reports teams once they have ranks
+        single_task = [task_queue.SingleTask(stalker, url)]
+        task_group = task_queue.TaskGroup(single_task, stalker.__name__)
+
+        with task_queue.progress_paused() if extended else contextlib.nullcontext():
+            results = task_queue.submit_task_group(task_group)
+        if len(results) == 0:
+            return f"Stalking {url} did not return any results."
+        results = results[0]
+
+    # look up player ranks
+    command = task_queue.current_command()
+    if extended:
+        try:
+            if isinstance(results, TeamListList):
+                player_lookup.add_list_team_list_ranks(results)
+            elif isinstance(results, TeamList):
+                player_lookup.add_team_list_ranks(results)
+            elif isinstance(results, Team):
+                player_lookup.add_team_ranks(results)
+        except task_queue.CommandCancelledError:
+            command.incomplete = True
+        logger.info(str(player_lookup.get_rank_cache()))
+        logger.info(str(player_lookup.get_negative_cache()))
+        for source_stats in player_lookup.get_source_stats():
+            logger.info(source_stats)
+    # requests and time waited per host since the bot started
+    for limiter_stats in rate_limiter.get_stats():
+        logger.info(limiter_stats)
 
-    return out
+    # partial results of a cancelled command are not cached
+    if command is None or not command.incomplete:
+        result_cache.put(key, results)
+        if not extended:
+            # users often follow up with an extended stalk, so the ranks are looked up in the background
+            prewarmer.prewarm(collect_sum_names(results))
+    return results
 
 
 def url_matcher(url):
@@ -135,7 +331,7 @@ def url_matcher(url):
     logger.debug(url + " has been detected as " + website + " and " + website_type)
 
     stalker_lookup = {"challengermode": {"match": challengermode_stalker.quick_stalk,
-                                         "tournament": feature_not_implemented_yet},
+                                         "tournament": challengermode_stalker.stalk},
                       "toornament": {"tournament": toornament_stalker.stalk},
                       "summoners-inn": {"season": sinn_league_stalker.stalk,
                                         "group": sinn_league_stalker.stalk_group,
@@ -0,0 +1,133 @@
+"""
+Contains unit tests for the async crawl engine against a local aiohttp server
+
+:author: Jonathan Decker
+"""
+
+import asyncio
+import collections
+import threading
+import time
+
+import pytest
+
+from utils import async_engine
+from utils import http_client
+from utils import rate_limiter
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+
+
+# requests the local server has seen per path and the most requests it had to answer at once
+seen = collections.Counter()
+concurrency = {"now": 0, "max": 0}
+
+
+@pytest.fixture(scope="module")
+def server():
+    async def slow(request):
+        await asyncio.sleep(1)
+        return web.Response(text="slow")
+
+    async def page(request):
+        return web.Response(text="page")
+
+    async def numbered(request):
+        # later pages answer first
+        number = int(request.match_info["number"])
+        await asyncio.sleep((5 - number) * 0.05)
+        return web.Response(text=f"page {number}")
+
+    async def flaky(request):
+        seen[request.path] += 1
+        if seen[request.path] == 1:
+            return web.Response(status=503, headers={"Retry-After": "0"})
+        return web.Response(text="recovered")
+
+    async def hold(request):
+        concurrency["now"] += 1
+        concurrency["max"] = max(concurrency["max"], concurrency["now"])
+        await asyncio.sleep(0.3)
+        concurrency["now"] -= 1
+        return web.Response(text="held")
+
+    async def start():
+        app = web.Application()
+        app.router.add_get("/slow", slow)
+        app.router.add_get("/page", page)
+        app.router.add_get("/numbered/{number}", numbered)
+        app.router.add_get("/flaky", flaky)
+        app.router.add_get("/hold/{number}", hold)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        return runner, runner.addresses[0][1]
+
+    runner, port = async_engine.run(start())
+    yield f"http://127.0.0.1:{port}"
+    async_engine.run(runner.cleanup())
+
+
+def test_cancelled_trial_call_does_not_keep_the_breaker_open(server):
+    breaker = http_client.get_breaker(server)
+    for _ in range(breaker.failure_threshold):
+        breaker.before_call()
+        breaker.record_failure()
+    # let the reset timeout pass
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout
+
+    async def cancel_trial():
+        trial = asyncio.ensure_future(async_engine.fetch_text(server + "/slow"))
+        await asyncio.sleep(0.2)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+    async_engine.run(cancel_trial())
+
+    assert not breaker.trial_running
+    assert async_engine.run(async_engine.fetch_text(server + "/page")) == "page"
+    assert breaker.opened_at is None
+
+
+def test_request_timeout_keeps_the_socket_timeouts_of_the_session():
+    session_timeout = aiohttp.ClientTimeout(sock_connect=5, sock_read=30)
+
+    timeout = async_engine.request_timeout(session_timeout, 900)
+
+    assert (timeout.total, timeout.sock_connect, timeout.sock_read) == (900, 5, 30)
+    assert async_engine.request_timeout(session_timeout, None) is session_timeout
+    assert async_engine.request_timeout(aiohttp.ClientTimeout(total=10), 900).total == 10
+
+
+def test_iter_pages_yields_pages_with_their_index_as_they_arrive(server):
+    urls = [f"{server}/numbered/{number}" for number in range(5)]
+
+    pages = list(async_engine.iter_pages(urls))
+
+    assert [index for index, page in pages] == [4, 3, 2, 1, 0]
+    assert all(page == f"page {index}" for index, page in pages)
+
+
+def test_retryable_response_is_fetched_again(server):
+    assert async_engine.run(async_engine.fetch_text(server + "/flaky")) == "recovered"
+    assert seen["/flaky"] == 2
+
+
+def test_threads_and_coroutines_share_the_requests_in_flight(server, monkeypatch):
+    limiter = rate_limiter.get_limiter(server)
+    # only the cap on requests in flight is tested
+    monkeypatch.setattr(limiter, "requests_per_second", 0)
+    urls = [f"{server}/hold/{number}" for number in range(limiter.max_in_flight)]
+    threads = [threading.Thread(target=http_client.get_text, args=(url, )) for url in urls]
+    for thread in threads:
+        thread.start()
+    pages = list(async_engine.iter_pages(urls))
+    for thread in threads:
+        thread.join(10)
+
+    assert len(pages) == len(urls)
+    assert concurrency["max"] <= limiter.max_in_flight
+    assert limiter.in_flight == 0
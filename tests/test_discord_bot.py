@@ -0,0 +1,64 @@
+"""
+Contains unit tests for posting stalk results progressively to discord
+
+:author: Jonathan Decker
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("discord")
+import discord_bot
+
+
+class FakeMessage:
+    def __init__(self, channel, content):
+        self.channel = channel
+        self.content = content
+
+    async def edit(self, content):
+        self.content = content
+
+    async def delete(self):
+        self.channel.messages.remove(self)
+
+
+class FakeContext:
+    def __init__(self):
+        self.author = SimpleNamespace(id=1)
+        self.messages = []
+
+    async def send(self, content):
+        message = FakeMessage(self, content)
+        self.messages.append(message)
+        return message
+
+
+def test_progressive_output_ends_with_the_final_render(monkeypatch):
+    def fake_stalk_chunks(url, extended=False, listener=None, owner=None):
+        # teams arrive in completion order and the final render is sorted with a title and a note
+        for team in ("Team B", "Team A"):
+            listener(team)
+        return ["Title\nTeam A\nTeam B\nThe results are incomplete."]
+
+    monkeypatch.setattr(discord_bot, "stalk_chunks", fake_stalk_chunks)
+    ctx = FakeContext()
+    asyncio.run(discord_bot.send_progressive(ctx, "https://example.org/tournament"))
+
+    assert [message.content for message in ctx.messages[:-1]] == ["Title\nTeam A\nTeam B\nThe results are incomplete."]
+    assert ctx.messages[-1].content.startswith("Finished stalking https://example.org/tournament, posted 2 results")
+
+
+def test_progressive_output_deletes_messages_the_final_render_does_not_need(monkeypatch):
+    def fake_stalk_chunks(url, extended=False, listener=None, owner=None):
+        for team in range(3):
+            listener("x" * 1500)
+        return ["short"]
+
+    monkeypatch.setattr(discord_bot, "stalk_chunks", fake_stalk_chunks)
+    ctx = FakeContext()
+    asyncio.run(discord_bot.send_progressive(ctx, "https://example.org/tournament"))
+
+    assert [message.content for message in ctx.messages[:-1]] == ["short"]
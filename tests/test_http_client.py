@@ -0,0 +1,84 @@
+"""
+Contains unit tests for the pooled session in http_client
+
+:author: Jonathan Decker
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils import http_client
+from utils import scrap_config as config
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # the client ports of all requests, one port per connection
+    ports = []
+
+    def do_GET(self):
+        self.ports.append(self.client_address[1])
+        body = b"page"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_requests_reuse_one_pooled_connection(server):
+    http_client.close_session()
+    PageHandler.ports.clear()
+
+    pages = [http_client.get_text(f"{server}/page/{number}") for number in range(5)]
+
+    assert pages == ["page"] * 5
+    assert len(PageHandler.ports) == 5 and len(set(PageHandler.ports)) == 1
+
+
+def test_session_is_shared_until_it_is_closed():
+    session = http_client.get_session()
+    adapter = session.get_adapter("https://euw.op.gg")
+
+    assert http_client.get_session() is session
+    assert adapter._pool_maxsize == config.get_max_workers()
+    assert "gzip" in session.headers["Accept-Encoding"]
+    http_client.close_session()
+    assert http_client.get_session() is not session
+
+
+@pytest.fixture
+def process_pool(monkeypatch):
+    from utils import task_queue
+
+    monkeypatch.setattr(config, "get_parse_processes", lambda: 2)
+    yield task_queue.get_process_pool()
+    task_queue.get_process_pool().shutdown()
+    task_queue._process_pool = None
+
+
+def test_crawl_parses_pages_in_processes_in_url_order(monkeypatch, process_pool):
+    urls = [f"https://example.org/team/{number}" for number in range(4)]
+    # pages arrive out of order and one of them can not be parsed
+    pages = [(2, "30"), (0, "10"), (3, "not a number"), (1, "20")]
+    monkeypatch.setattr(http_client, "iter_pages", lambda crawled_urls: iter(pages))
+    reported = []
+    monkeypatch.setattr(http_client.task_queue, "report_progress", reported.append)
+
+    assert process_pool is not None
+    assert http_client.crawl(urls, int, report=True) == [10, 20, 30]
+    assert sorted(reported) == [10, 20, 30]
@@ -6,6 +6,8 @@ Contains integration tests for the main features
 
 import os
 
+import pytest
+
 os.chdir("..")
 from utils import scrap_config as config
 
@@ -15,6 +17,10 @@ timezone = "CET"
 config.set_region(region)
 config.set_timezone(timezone)
 
+# tests that drive a browser through live tournament pages only run with STALKER_NETWORK_TESTS=1
+network_test = pytest.mark.skipif(os.environ.get("STALKER_NETWORK_TESTS") != "1",
+                                  reason="drives a browser through live pages, set STALKER_NETWORK_TESTS=1 to run it")
+
 
 def test_config():
 
@@ -40,16 +46,15 @@ def test_toornaments_stalker():
             assert player.rank is not None
 
 
+@network_test
 def test_challengermode_stalker():
-    pass
-
-    # this feature is not ready yet
-
-    #team_list = stalk_challengermode("https://www.challengermode.com/Tournaments/Show/30ddf5f5-5e59-e911-b49d-28187814ffef")
+    from stalker.challengermode_stalker import stalk
+    from models import TeamList
+    team_list = stalk("https://www.challengermode.com/Tournaments/Show/30ddf5f5-5e59-e911-b49d-28187814ffef")
 
-    # assert type(str(team_list)) == str
-    # assert len(team_list.teams) > 0
-    # assert isinstance(team_list, TeamList)
+    assert type(str(team_list)) == str
+    assert len(team_list.teams) > 0
+    assert isinstance(team_list, TeamList)
 
 
 def test_sinn_league_stalker():
@@ -0,0 +1,25 @@
+"""
+Contains unit tests for the models
+
+:author: Jonathan Decker
+"""
+
+import copy
+
+from models import Player, Rank, Team, TeamList
+from utils import scrap_config as config
+
+
+def test_slotted_models_build_links_when_needed(monkeypatch):
+    monkeypatch.setattr(config, "get_region", lambda: "euw")
+    team = Team("Team", [Player("Some Body", Rank(15)), Player("Other")])
+
+    assert not hasattr(team, "__dict__") and not hasattr(team.player_list[0], "__dict__")
+    assert team.player_list[0].opgg == "https://euw.op.gg/summoner/userName=SomeBody"
+    assert team.multi_link == "https://euw.op.gg/multi/query=SomeBody%2COther%2C"
+    assert str(team.player_list[0]) == "Some Body *Gold 2*"
+    # players whose rank lookup failed are shown without a rank
+    assert str(team.player_list[1]) == team.player_list[1].no_format_str() == "Other"
+
+    team_list = TeamList("List", [team])
+    assert copy.deepcopy(team_list) == team_list
@@ -0,0 +1,22 @@
+"""
+Contains unit tests for the limited parsing in page_parser
+
+:author: Jonathan Decker
+"""
+
+from utils import page_parser
+
+PAGE = ('<html><head><script>var x = 1;</script></head><body><div class="layout-section header"><h1>Title</h1></div>'
+        '<div class="text secondary small summoner_player_id">Summoner ID: Player</div><p>skipped</p></body></html>')
+
+
+def test_parse_keeps_elements_with_one_of_many_classes():
+    soup = page_parser.parse(PAGE, "div", class_=["layout-section", "summoner_player_id"])
+    assert soup.select("div.layout-section.header > h1")[0].text == "Title"
+    assert len(soup.find_all("div", class_="text secondary small summoner_player_id")) == 1
+    assert soup.find("p") is None and soup.find("script") is None
+
+
+def test_parse_without_filter_keeps_everything():
+    soup = page_parser.parse(PAGE)
+    assert soup.find("p").text == "skipped"
@@ -0,0 +1,154 @@
+"""
+Contains unit tests for collecting the participant links of a challengermode tournament
+
+:author: Jonathan Decker
+"""
+
+from selenium.common.exceptions import NoSuchElementException
+
+from stalker import challengermode_stalker
+from stalker.challengermode_stalker import LinkCollector
+from utils import webmanager
+
+
+class TeamPageDriver:
+    """
+    Shows a team page that has a name but no linked summoners
+    """
+
+    page_source = "<html><body><h1> Lonely Team </h1></body></html>"
+
+    def __init__(self):
+        self.window_handles = ["main"]
+        self.switch_to = self
+        self.quit_called = False
+
+    def window(self, handle):
+        pass
+
+    def delete_all_cookies(self):
+        pass
+
+    def execute_script(self, script):
+        pass
+
+    def get(self, url):
+        pass
+
+    def find_element(self, by, value):
+        if value == "h1":
+            return "the team name"
+        raise NoSuchElementException(value)
+
+    def quit(self):
+        self.quit_called = True
+
+
+class TeamContainer:
+    def __init__(self, links):
+        self.links = links
+
+    def find_elements(self, by, value):
+        return self.links
+
+
+class MatchPageDriver(TeamPageDriver):
+    """
+    Shows a match whose second team has no linked summoners
+    """
+
+    page_source = ('<html><body><div id="arena-wrap"><div><div><div class="p-b--medium"><div>'
+                   '<div class="pos--rel z--99 cm-text-shadow"><div><div class="dis--flx flx-dir--col ali-ite--center">'
+                   '<div class="ta--center"><div><span><span> Final </span></span></div></div></div></div></div>'
+                   '</div></div></div></div></div>'
+                   '<div class="col-6--sm"><a class="link-white">Linked</a>'
+                   '<a class="link-white-dark" href="https://euw.op.gg/summoner/userName=Some+Body">x</a></div>'
+                   '<div class="col-6--sm"><a class="link-white">Lonely</a></div></body></html>')
+
+    def find_elements(self, by, value):
+        return [TeamContainer(["a link"]), TeamContainer([])]
+
+
+class TournamentDriver(TeamPageDriver):
+    """
+    Shows a tournament with two teams, only the first one links its summoners
+    """
+
+    title = " Cup "
+    team_pages = {"/teams/a": '<h1>A</h1><a class="link-white-dark" href="https://euw.op.gg/summoner/userName=One">x</a>',
+                  "/teams/b": "<h1>B</h1>"}
+
+    def __init__(self):
+        super().__init__()
+        self.page_source = ""
+        self.visited = []
+
+    def get(self, url):
+        self.visited.append(url)
+        path = url.replace(challengermode_stalker.BASE_URL, "")
+        self.page_source = f"<html><body>{self.team_pages.get(path, '')}</body></html>"
+
+    def execute_script(self, script):
+        if script == challengermode_stalker._WATCH_LINKS_SCRIPT:
+            return ["/teams/a", "/users/x", "/teams/b"]
+        if script == challengermode_stalker._TAKE_LINKS_SCRIPT:
+            return []
+        return 100
+
+    def find_element(self, by, value):
+        if value in ("cm-arena-wrap", "h1") or value == "a.link-white-dark" and "link-white-dark" in self.page_source:
+            return "an element"
+        raise NoSuchElementException(value)
+
+
+def test_link_collector_keeps_each_link_once_in_page_order():
+    collector = LinkCollector()
+
+    assert collector.add(["/teams/a", "/users/x", "/teams/b"]) == ["/teams/a", "/users/x", "/teams/b"]
+    # a scroll that re-renders known participants only hands over the unseen ones
+    assert collector.add(["/teams/b", "/teams/c", "/teams/a", "/teams/c"]) == ["/teams/c"]
+
+    assert collector.links == ["/teams/a", "/users/x", "/teams/b", "/teams/c"]
+    assert len(collector) == 4
+
+
+def test_team_without_linked_summoners_keeps_the_driver(monkeypatch):
+    pool = webmanager.DriverPool(1, 10, launch=TeamPageDriver)
+    monkeypatch.setattr(webmanager, "get_driver_pool", lambda: pool)
+    monkeypatch.setattr(challengermode_stalker, "TEAM_LINKS_WAIT", 0.2)
+
+    team = challengermode_stalker.stalk_team("https://www.challengermode.com/teams/lonely")
+
+    assert team.name == "Lonely Team" and team.player_list == []
+    assert pool.launches == 1 and pool.recycles == 0
+    assert not pool.checkout().quit_called
+
+
+def test_match_with_a_team_without_linked_summoners_keeps_the_driver(monkeypatch):
+    pool = webmanager.DriverPool(1, 10, launch=MatchPageDriver)
+    monkeypatch.setattr(webmanager, "get_driver_pool", lambda: pool)
+    monkeypatch.setattr(challengermode_stalker, "TEAM_LINKS_WAIT", 0.2)
+
+    team_list = challengermode_stalker.quick_stalk("https://www.challengermode.com/challenges/view/final")
+
+    assert team_list.name == "Final"
+    assert [(team.name, [player.summoner_name for player in team.player_list]) for team in team_list.teams] == \
+        [("Linked", ["Some Body"]), ("Lonely", [])]
+    assert pool.launches == 1 and pool.recycles == 0
+
+
+def test_tournament_teams_are_stalked_with_the_borrowed_driver(monkeypatch):
+    pool = webmanager.DriverPool(2, 10, launch=TournamentDriver)
+    monkeypatch.setattr(webmanager, "get_driver_pool", lambda: pool)
+    monkeypatch.setattr(challengermode_stalker, "TEAM_LINKS_WAIT", 0.2)
+    monkeypatch.setattr(challengermode_stalker, "SCROLL_WAIT", 0.2)
+
+    team_list = challengermode_stalker.stalk("https://www.challengermode.com/tournaments/show/cup")
+
+    assert team_list.name == "Cup"
+    assert [(team.name, [player.summoner_name for player in team.player_list]) for team in team_list.teams] == \
+        [("A", ["One"]), ("B", [])]
+    # one driver visits the participant list and every team page
+    driver = pool.checkout()
+    assert pool.launches == 1
+    assert driver.visited[1:3] == ["https://www.challengermode.com/teams/a", "https://www.challengermode.com/teams/b"]
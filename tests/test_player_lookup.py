@@ -0,0 +1,219 @@
+"""
+Contains unit tests for the batched rank lookup in player_lookup
+
+:author: Jonathan Decker
+"""
+
+from types import SimpleNamespace
+
+from utils import player_lookup
+from utils import rank_parser
+from utils import scrap_config as config
+from utils.cache import TTLCache, NegativeCache
+
+
+def multi_page(rows):
+    html = ""
+    for name, elo in rows:
+        tier = f'<div class="TierRank">{elo}</div>' if elo else ""
+        html += f'<div class="MultiSearchResultRow"><a class="SummonerName">{name}</a>{tier}</div>'
+    return f"<html><body>{html}</body></html>"
+
+
+def test_lookup_elos_uses_multi_search_and_falls_back(monkeypatch):
+    requested = []
+
+    def fake_get(url):
+        requested.append(url)
+        return SimpleNamespace(text=multi_page([("Player One", "Gold 2"), ("PlayerTwo", None)]))
+
+    def fake_lookup_elo(sum_name):
+        requested.append(sum_name)
+        return rank_parser.parse_rank("Silver 1")
+
+    monkeypatch.setattr(config, "get_region", lambda: "euw")
+    monkeypatch.setattr(config, "get_multi_search_size", lambda: 5)
+    monkeypatch.setattr(player_lookup.http_client, "get", fake_get)
+    monkeypatch.setattr(player_lookup, "lookup_elo", fake_lookup_elo)
+    monkeypatch.setattr(player_lookup, "_rank_cache", TTLCache(100, 60, "test"))
+    monkeypatch.setattr(player_lookup, "_negative_cache", NegativeCache(60, 100, 0.01, "test"))
+
+    elos = player_lookup.lookup_elos(["Player One", "PlayerTwo", "Missing"])
+
+    assert {sum_name: rank_parser.elo_name(elo) for sum_name, elo in elos.items()} == \
+        {"Player One": "Gold 2", "PlayerTwo": "Unranked", "Missing": "Silver 1"}
+    # one multi search and one single lookup for the player missing on it
+    assert requested[1:] == ["Missing"]
+    assert "Player%20One" not in requested[0] and "PlayerOne%2CPlayerTwo%2CMissing" in requested[0]
+
+    # the second lookup is served from the caches, unranked players only from the negative cache
+    player_lookup.lookup_elos(["Player One", "PlayerTwo", "Missing"])
+    assert len(requested) == 2
+    assert "euw.op.gg" in requested[0]
+    assert player_lookup.get_rank_cache().get(player_lookup.rank_cache_key("euw", "PlayerTwo")) is None
+
+
+def test_failed_lookup_only_drops_that_player(monkeypatch):
+    def fake_lookup_elo(sum_name):
+        if sum_name == "Broken":
+            raise ConnectionError("every source failed")
+        return rank_parser.parse_rank("Silver 1")
+
+    monkeypatch.setattr(config, "get_region", lambda: "euw")
+    monkeypatch.setattr(config, "get_multi_search_size", lambda: 5)
+    monkeypatch.setattr(player_lookup.http_client, "get", lambda url: SimpleNamespace(text=multi_page([])))
+    monkeypatch.setattr(player_lookup, "lookup_elo", fake_lookup_elo)
+    monkeypatch.setattr(player_lookup, "_rank_cache", TTLCache(100, 60, "test"))
+    monkeypatch.setattr(player_lookup, "_negative_cache", NegativeCache(60, 100, 0.01, "test"))
+
+    elos = player_lookup.lookup_elos(["First", "Broken", "Last"])
+
+    assert {sum_name: rank_parser.elo_name(elo) for sum_name, elo in elos.items()} == \
+        {"First": "Silver 1", "Last": "Silver 1"}
+    assert player_lookup.get_cached_elo(player_lookup.rank_cache_key("euw", "Broken")) is None
+
+
+def test_parse_opgg_multi_keys_match_the_rank_cache():
+    elos = player_lookup.parse_opgg_multi(multi_page([("Some Body", "Diamond 4")]), "EUW")
+    assert elos == {player_lookup.rank_cache_key("EUW", "somebody"): rank_parser.parse_rank("Diamond 4")}
+    assert config.get_multi_search_size() > 0
+
+
+def test_slow_source_is_hedged_and_failed_source_is_replaced(monkeypatch):
+    import asyncio
+    import time
+
+    delays = {"opgg": 1.0, "lolprofile": 0.0, "leagueofgraphs": None}
+    ranks = {"opgg": "Gold 1", "lolprofile": "Silver 2", "leagueofgraphs": "Bronze 3"}
+
+    async def fake_fetch_text(url, command=None):
+        source = next(name for name in delays if name in url.replace(".", ""))
+        if delays[source] is None:
+            raise ConnectionError("blocked")
+        await asyncio.sleep(delays[source])
+        return f'<span class="tier">{ranks[source]}</span><div class="TierRank">{ranks[source]}</div>'
+
+    monkeypatch.setattr(player_lookup.async_engine, "fetch_text", fake_fetch_text)
+    monkeypatch.setattr(config, "get_hedge_settings", lambda: (90, 0.1))
+    sources = [player_lookup.RankSource(name, priority) for priority, name in enumerate(delays)]
+
+    silver_2 = rank_parser.parse_rank("Silver 2")
+    start_time = time.monotonic()
+    assert player_lookup.async_engine.run(player_lookup._hedged_lookup("Somebody", sources, None)) == silver_2
+    assert time.monotonic() - start_time < 0.9
+    assert sources[0].hedges == 1 and sources[1].wins == 1
+
+    # a failing primary is replaced without waiting for the hedge delay
+    blocked_first = [sources[2], sources[1]]
+    assert player_lookup.async_engine.run(player_lookup._hedged_lookup("Somebody", blocked_first, None)) == silver_2
+    assert sources[2].failures == 1 and sources[2].error_rate > 0
+    assert sources[2].sort_key() > sources[1].sort_key()
+
+
+def test_add_ranks_looks_up_every_player_once(monkeypatch):
+    from models import Player, Team
+
+    looked_up = []
+
+    def fake_lookup_elos(sum_names):
+        looked_up.extend(sum_names)
+        return {sum_name: rank_parser.parse_rank("gold 1") for sum_name in sum_names}
+
+    monkeypatch.setattr(player_lookup, "lookup_elos", fake_lookup_elos)
+    monkeypatch.setattr(config, "get_region", lambda: "euw")
+    teams = [Team("A", [Player("Sub Stitute"), Player("One")]),
+             Team("B", [Player("substitute"), Player("Two")]),
+             Team("C", [])]
+    done = []
+    player_lookup.add_ranks(teams, done.append)
+
+    assert sorted(looked_up) == ["One", "Sub Stitute", "Two"]
+    assert [team.name for team in sorted(done, key=lambda team: team.name)] == ["A", "B", "C"]
+    assert all(player.rank.rating > 0 for team in teams for player in team.player_list)
+
+
+def test_page_without_rank_does_not_win_the_race(monkeypatch):
+    import asyncio
+
+    pages = {"opgg": (0.2, '<div class="TierRank">Gold 1</div>'), "lolprofile": (0.0, "<span>changed markup</span>")}
+
+    async def fake_fetch_text(url, command=None):
+        delay, page = next(pages[name] for name in pages if name in url.replace(".", ""))
+        await asyncio.sleep(delay)
+        return page
+
+    monkeypatch.setattr(player_lookup.async_engine, "fetch_text", fake_fetch_text)
+    monkeypatch.setattr(config, "get_hedge_settings", lambda: (90, 0.05))
+    monkeypatch.setattr(config, "get_region", lambda: "euw")
+    sources = [player_lookup.RankSource(name, priority) for priority, name in enumerate(pages)]
+
+    assert player_lookup.async_engine.run(player_lookup._hedged_lookup("Somebody", sources, None)) == \
+        rank_parser.parse_rank("Gold 1")
+    assert sources[0].wins == 1
+
+    # a name no source shows a rank for is reported unranked but not cached
+    monkeypatch.setattr(player_lookup, "lookup_elo", lambda sum_name: None)
+    monkeypatch.setattr(player_lookup.http_client, "get", lambda url: SimpleNamespace(text=multi_page([])))
+    monkeypatch.setattr(player_lookup, "_rank_cache", TTLCache(100, 60, "test"))
+    monkeypatch.setattr(player_lookup, "_negative_cache", NegativeCache(60, 100, 0.01, "test"))
+
+    assert player_lookup.lookup_elos(["Nobody"]) == {"Nobody": rank_parser.UNRANKED}
+    assert player_lookup.get_cached_elo(player_lookup.rank_cache_key("euw", "Nobody")) is None
+
+
+def test_reported_teams_have_stats_and_the_percentile_follows(monkeypatch):
+    from models import Player, Team
+
+    ranks = {"Strong": "diamond 1", "Weak": "silver 4"}
+    monkeypatch.setattr(player_lookup, "lookup_elos",
+                        lambda sum_names: {sum_name: rank_parser.parse_rank(ranks[sum_name]) for sum_name in sum_names})
+    monkeypatch.setattr(config, "get_region", lambda: "euw")
+    monkeypatch.setattr(config, "get_multi_search_size", lambda: 1)
+    teams = [Team("A", [Player("Strong")]), Team("B", [Player("Weak")])]
+    reported = {}
+    player_lookup.add_ranks(teams, lambda team: reported.setdefault(team.name, team.stats_str()))
+
+    assert reported["A"].startswith("median: Diamond 1") and "percentile" not in reported["A"]
+    assert teams[0].stats_str().endswith("percentile: 100") and teams[1].stats_str().endswith("percentile: 50")
+
+
+def test_name_no_source_shows_is_cached_as_unranked(monkeypatch):
+    import asyncio
+
+    requested = []
+    pages = {"opgg": "<div>no such summoner</div>", "lolprofile": "<span>no such summoner</span>"}
+
+    async def fake_fetch_text(url, command=None):
+        requested.append(url)
+        page = next(pages[name] for name in pages if name in url.replace(".", ""))
+        if page is None:
+            raise ConnectionError("blocked")
+        return page
+
+    monkeypatch.setattr(player_lookup.async_engine, "fetch_text", fake_fetch_text)
+    monkeypatch.setattr(config, "get_hedge_settings", lambda: (90, 0.05))
+    monkeypatch.setattr(config, "get_region", lambda: "euw")
+    monkeypatch.setattr(config, "get_multi_search_size", lambda: 5)
+    monkeypatch.setattr(player_lookup.http_client, "get",
+                        lambda url: requested.append(url) or SimpleNamespace(text=multi_page([])))
+    monkeypatch.setattr(player_lookup, "_rank_sources",
+                        [player_lookup.RankSource(name, priority) for priority, name in enumerate(pages)])
+    monkeypatch.setattr(player_lookup, "_rank_cache", TTLCache(100, 60, "test"))
+    monkeypatch.setattr(player_lookup, "_negative_cache", NegativeCache(60, 100, 0.01, "test"))
+
+    assert player_lookup.lookup_elos(["Typo Name"]) == {"Typo Name": rank_parser.UNRANKED}
+    assert len(requested) == 3
+    # the next stalk skips the name
+    assert player_lookup.lookup_elos(["Typo Name"]) == {"Typo Name": rank_parser.UNRANKED}
+    assert len(requested) == 3
+
+    # only a secondary source showed no rank while the primary failed, the name is not cached
+    pages["opgg"] = None
+    assert player_lookup.lookup_elos(["Other Name"]) == {"Other Name": rank_parser.UNRANKED}
+    assert player_lookup.get_cached_elo(player_lookup.rank_cache_key("euw", "Other Name")) is None
+
+    # the primary source showing no rank is enough
+    pages["opgg"], pages["lolprofile"] = "<div>no such summoner</div>", None
+    sources = list(reversed(player_lookup._rank_sources))
+    assert player_lookup.async_engine.run(player_lookup._hedged_lookup("Third Name", sources, None)) == \
+        rank_parser.UNRANKED
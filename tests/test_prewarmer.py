@@ -0,0 +1,33 @@
+"""
+Contains unit tests for the background rank prewarmer
+
+:author: Jonathan Decker
+"""
+
+import datetime
+
+import pytz
+
+from utils import prewarmer
+from utils import scrap_config as config
+
+
+def test_off_peak_hours_wrap_around_midnight(monkeypatch):
+    monkeypatch.setattr(config, "get_timezone", lambda: "UTC")
+    monkeypatch.setattr(config, "get_off_peak_hours", lambda: (23, 2))
+
+    def at(hour):
+        return datetime.datetime(2020, 1, 1, hour, 30, tzinfo=pytz.utc)
+
+    assert prewarmer.is_off_peak(at(23))
+    assert prewarmer.is_off_peak(at(1))
+    assert not prewarmer.is_off_peak(at(2))
+    assert not prewarmer.is_off_peak(at(12))
+
+
+def test_prewarm_does_nothing_when_disabled(monkeypatch):
+    monkeypatch.setattr(config, "get_prewarm_enabled", lambda: False)
+
+    prewarmer.prewarm(["Player One", "PlayerTwo"])
+
+    assert prewarmer._names.empty()
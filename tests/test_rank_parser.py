@@ -0,0 +1,39 @@
+"""
+Contains unit tests for rank_parser
+
+:author: Jonathan Decker
+"""
+
+import pytest
+
+from utils import rank_parser
+
+
+@pytest.mark.parametrize("text, name", [("Gold 2", "Gold 2"),
+                                        ("gold ii", "Gold 2"),
+                                        ("\n   GOLD  II\n ", "Gold 2"),
+                                        ("Bronze 2", "Bronze 2"),
+                                        ("Emerald 4 45 LP", "Emerald 4 45 LP"),
+                                        ("Emerald", "Emerald 4"),
+                                        ("Grandmaster 412 LP", "Grandmaster 412 LP"),
+                                        ("Challenger\n1,234 LP", "Challenger 1234 LP"),
+                                        ("Master", "Master"),
+                                        ("Unranked", "Unranked"),
+                                        ("Level 30", "Unranked"),
+                                        ("123", "Unranked")])
+def test_parse_rank(text, name):
+    assert rank_parser.elo_name(rank_parser.parse_rank(text)) == name
+
+
+def test_ratings_are_ordered_and_stored_elos_are_parsed_again():
+    ratings = [rank_parser.split_elo(rank_parser.parse_rank(text))[0]
+               for text in ["Unranked", "Iron 4", "Bronze 2", "Platinum 1", "Emerald 4", "Diamond 1", "Master",
+                            "Grandmaster", "Challenger"]]
+    assert ratings == sorted(ratings) and len(set(ratings)) == len(ratings)
+    assert ratings[-1] == rank_parser.MAX_RATING
+
+    elo = rank_parser.parse_rank("Diamond 3 75 LP")
+    assert rank_parser.parse_stored_elo(str(elo)) == elo and rank_parser.parse_stored_elo(elo) == elo
+    # rank texts stored by older versions
+    assert rank_parser.parse_stored_elo("Diamond 3 75 LP") == elo
+    assert rank_parser.split_elo(elo) == (rank_parser.split_elo(rank_parser.parse_rank("diamond iii"))[0], 75)
@@ -0,0 +1,49 @@
+"""
+Contains unit tests for the league statistics in rank_stats
+
+:author: Jonathan Decker
+"""
+
+import random
+
+import pytest
+
+from utils import rank_stats
+
+
+def test_stats_of_a_small_league():
+    stats = rank_stats.calc_stats([[15, 0, 13, 20, 12], [8, 9], [0, 0], []])
+
+    assert stats[0].mean == 15
+    assert stats[0].median == 14
+    assert stats[0].max == 20
+    assert stats[0].top3 == 16
+    assert stats[0].deviation == pytest.approx(3.082, abs=0.001)
+    assert stats[0].percentile == 100
+    assert stats[1].median == 8.5
+    assert stats[1].percentile == 50
+    assert stats[2].percentile is None
+    assert stats[3] == rank_stats.TeamStats(0, 0, 0, 0, 0, None)
+
+
+def test_python_fallback_matches_numpy(monkeypatch):
+    pytest.importorskip("numpy")
+    generator = random.Random(1)
+    rows = [[generator.choice([0, generator.randint(1, 28)]) for _ in range(generator.randint(0, 7))]
+            for _ in range(300)]
+
+    expected = rank_stats.calc_stats(rows)
+    monkeypatch.setattr(rank_stats, "numpy", None)
+    stats = rank_stats.calc_stats(rows)
+
+    for team_stats, expected_stats in zip(stats, expected):
+        assert team_stats.percentile == expected_stats.percentile
+        assert team_stats[:5] == pytest.approx(expected_stats[:5])
+
+
+def test_single_team_stats_match_the_league_stats():
+    stats = rank_stats.calc_team_stats([15, 0, 13, 20, 12])
+
+    assert stats[:5] == pytest.approx(rank_stats.calc_stats([[15, 0, 13, 20, 12], [8, 9]])[0][:5])
+    assert stats.percentile is None
+    assert rank_stats.calc_team_stats([]) == rank_stats.TeamStats(0, 0, 0, 0, 0, None)
@@ -0,0 +1,90 @@
+"""
+Contains unit tests for the per host limits in rate_limiter and the Retry-After handling of http_client
+
+:author: Jonathan Decker
+"""
+
+import email.utils
+import pathlib
+import subprocess
+import sys
+import threading
+import time
+
+from utils import http_client
+from utils import rate_limiter
+
+
+class FakeClock:
+    # time passes only when the limiter sleeps or the test advances it
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, secs):
+        self.now += secs
+
+
+def test_token_bucket_refills_at_the_configured_rate(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    limiter = rate_limiter.HostLimiter("example.org", 5, 2)
+
+    # the bucket starts full with one second worth of requests
+    assert limiter.take_token() == 0 and limiter.take_token() == 0
+    assert limiter.take_token() == 0.5
+    clock.sleep(0.25)
+    assert limiter.take_token() == 0.25
+    clock.sleep(0.25)
+    assert limiter.take_token() == 0
+
+    # the bucket never holds more than its capacity
+    clock.sleep(60)
+    waits = []
+    for _ in range(4):
+        waits.append(limiter.acquire())
+        limiter.release()
+    assert waits == [0, 0, 0.5, 0.5]
+    assert limiter.requests == 4 and limiter.wait_time == 1.0
+
+
+def test_requests_in_flight_are_capped():
+    limiter = rate_limiter.HostLimiter("example.org", 2, 0)
+    limiter.acquire()
+    limiter.acquire()
+    third = threading.Thread(target=limiter.acquire)
+    third.start()
+    third.join(0.2)
+
+    assert third.is_alive() and limiter.in_flight == 2
+    limiter.release()
+    third.join(5)
+    assert not third.is_alive() and limiter.in_flight == 2
+
+
+def test_rules_cover_subdomains():
+    rules = ["op.gg", "*.op.gg", "euw.op.gg", "toornament.com"]
+    assert rate_limiter.match_rule("euw.op.gg", rules) == "euw.op.gg"
+    assert rate_limiter.match_rule("na.op.gg", rules) == "*.op.gg"
+    assert rate_limiter.match_rule("www.toornament.com", rules) == "toornament.com"
+    assert rate_limiter.match_rule("notop.gg", rules) is None
+
+
+def test_retry_after_is_read_as_secs_or_http_date():
+    in_a_minute = email.utils.formatdate(time.time() + 60, usegmt=True)
+
+    assert http_client.parse_retry_after("120") == 120
+    assert 55 < http_client.parse_retry_after(in_a_minute) <= 60
+    assert http_client.parse_retry_after("soon") is None and http_client.parse_retry_after(None) is None
+    assert http_client.RetryableResponseError(429, "https://example.org", "3").retry_after == 3
+
+
+def test_rate_limiter_can_be_imported_first():
+    # callers import the limiter on its own, an import cycle through task_queue and async_engine would break that
+    subprocess.run([sys.executable, "-c", "import utils.rate_limiter"], check=True,
+                   cwd=pathlib.Path(rate_limiter.__file__).parent.parent)
@@ -0,0 +1,44 @@
+"""
+Contains unit tests for the streaming output in renderer
+
+:author: Jonathan Decker
+"""
+
+import io
+
+from models import Player, Rank, Team, TeamList, TeamListList
+from utils import renderer
+from utils import scrap_config as config
+
+
+def build_league(monkeypatch):
+    monkeypatch.setattr(config, "get_region", lambda: "euw")
+    team_lists = [TeamList(f"Division {division}",
+                           [Team(f"Team {division}-{team}", [Player(f"Player {team}-{player}", Rank(team % 31))
+                                                             for player in range(5)], Rank(team % 31), Rank(30))
+                            for team in range(40)])
+                  for division in range(3)]
+    return TeamListList(team_lists)
+
+
+def test_chunks_fit_into_messages_and_keep_every_line(monkeypatch):
+    league = build_league(monkeypatch)
+
+    for extended in (False, True):
+        text = league.extended_str() if extended else str(league)
+        chunks = list(renderer.iter_chunks(renderer.render_pieces(league, extended)))
+        assert all(0 < len(chunk) <= renderer.MESSAGE_SIZE for chunk in chunks)
+        assert "\n".join(chunks) == text
+
+    long_line = "x" * 4500
+    assert [len(chunk) for chunk in renderer.iter_chunks(["head\n", long_line, "\ntail"])] == [4, 2000, 2000, 505]
+
+
+def test_file_output_matches_the_string_methods(monkeypatch):
+    league = build_league(monkeypatch)
+    mem_file = io.StringIO()
+
+    title = renderer.write_pieces(renderer.render_pieces(league, True, False), mem_file)
+
+    assert title == "Division 0 "
+    assert mem_file.getvalue() == league.ext_no_format_str()
@@ -0,0 +1,44 @@
+"""
+Contains unit tests for finding the groups of a SINN League season without a browser
+
+:author: Jonathan Decker
+"""
+
+from stalker import sinn_league_stalker
+
+
+def season_page(divisions):
+    html = ""
+    for division, groups in enumerate(divisions):
+        links = "".join(f'<a href="https://www.summoners-inn.de/de/leagues/lol/1/group/{division}{group}">G</a>'
+                        for group in groups)
+        html += f'<div class="content-subsection-toggle">Division {division}</div><div>{links}</div>'
+    return (f'<html><body><section class="boxed-section"><h2>Playoffs</h2><a href="/de/leagues/x">P</a></section>'
+            f'<section class="boxed-section"><h2>Gruppenphase</h2>{html}</section></body></html>')
+
+
+def test_group_links_are_taken_from_the_server_rendered_page(monkeypatch):
+    page = season_page([[1, 2], [1], [1, 2, 3]])
+    monkeypatch.setattr(sinn_league_stalker, "expand_season_page", lambda url: pytest_fail(url))
+
+    links = sinn_league_stalker.find_group_links(page)
+
+    assert len(links) == 6 and links[0].endswith("/group/01")
+
+
+def test_collapsed_division_needs_the_browser(monkeypatch):
+    collapsed = season_page([[1, 2], [], [1]])
+    expanded = season_page([[1, 2], [1, 2], [1]])
+    stalked = []
+
+    monkeypatch.setattr(sinn_league_stalker.http_client, "get_text", lambda url: collapsed)
+    monkeypatch.setattr(sinn_league_stalker, "expand_season_page", lambda url: expanded)
+    monkeypatch.setattr(sinn_league_stalker, "stalk_group", lambda link, report_teams: stalked.append(link) or link)
+
+    assert sinn_league_stalker.find_group_links(collapsed) is None
+    sinn_league_stalker.stalk("https://www.summoners-inn.de/de/leagues/lol/1")
+    assert len(stalked) == 5
+
+
+def pytest_fail(url):
+    raise AssertionError(f"{url} should not need a browser")
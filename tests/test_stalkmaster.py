@@ -0,0 +1,114 @@
+"""
+Contains unit tests for sharing running stalks between commands in stalkmaster
+
+:author: Jonathan Decker
+"""
+
+import threading
+import time
+
+import stalkmaster
+from utils import task_queue
+
+
+def start_stalk(url, owner, results, timeout=None):
+    def run():
+        with task_queue.command_scope(url, owner=owner, timeout=timeout) as command:
+            results[owner] = (stalkmaster.stalk_url(url, None, False), command)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def fake_run_stalker(release):
+    owners = []
+
+    def run_stalker(url, stalker, extended):
+        command = task_queue.current_command()
+        owners.append(command.owner)
+        while not release.is_set() and not command.cancelled:
+            time.sleep(0.01)
+        if command.cancelled:
+            command.incomplete = True
+            return "partial"
+        return "complete"
+    return run_stalker, owners
+
+
+def wait_for_followers(count):
+    while stalkmaster._single_flight.shared < count:
+        time.sleep(0.01)
+
+
+def test_follower_learns_that_the_shared_results_are_incomplete(monkeypatch):
+    run_stalker, owners = fake_run_stalker(threading.Event())
+    monkeypatch.setattr(stalkmaster, "run_stalker", run_stalker)
+    shared = stalkmaster._single_flight.shared
+    results = {}
+
+    leader = start_stalk("https://example.org/deadline", "leader", results, timeout=0.5)
+    while not owners:
+        time.sleep(0.01)
+    follower = start_stalk("https://example.org/deadline", "follower", results)
+    wait_for_followers(shared + 1)
+    leader.join(5)
+    follower.join(5)
+
+    assert owners == ["leader"]
+    assert results["follower"][0] == "partial" and results["follower"][1].incomplete
+
+
+def test_followers_stalk_again_when_the_leader_is_cancelled(monkeypatch):
+    release = threading.Event()
+    run_stalker, owners = fake_run_stalker(release)
+    monkeypatch.setattr(stalkmaster, "run_stalker", run_stalker)
+    shared = stalkmaster._single_flight.shared
+    results = {}
+
+    leader = start_stalk("https://example.org/cancel", "leader", results)
+    while not owners:
+        time.sleep(0.01)
+    follower = start_stalk("https://example.org/cancel", "follower", results)
+    wait_for_followers(shared + 1)
+    stalkmaster.cancel_stalks("leader")
+    leader.join(5)
+    while len(owners) < 2:
+        time.sleep(0.01)
+    release.set()
+    follower.join(5)
+
+    assert owners == ["leader", "follower"]
+    assert results["leader"][0] == "partial"
+    assert results["follower"][0] == "complete" and not results["follower"][1].incomplete
+
+
+def test_extended_results_are_cached_per_region(monkeypatch):
+    from utils import scrap_config as config
+
+    monkeypatch.setattr(config, "get_region", lambda: "EUW")
+    basic_key = stalkmaster.result_key("HTTPS://Example.org/league/", False)
+    euw_key = stalkmaster.result_key("https://example.org/league", True)
+    monkeypatch.setattr(config, "get_region", lambda: "NA")
+
+    assert stalkmaster.result_key("https://example.org/league", False) == basic_key
+    assert stalkmaster.result_key("https://example.org/league", True) != euw_key
+
+
+def test_run_stalker_logs_the_requests_per_host(monkeypatch, caplog):
+    from models import Team
+    from utils import rate_limiter
+    from utils.cache import TTLCache
+
+    def stalker(url):
+        with rate_limiter.limit(url):
+            return Team("Team", [])
+
+    monkeypatch.setattr(stalkmaster, "_result_cache", TTLCache(10, 60, "test"))
+    monkeypatch.setattr(stalkmaster.prewarmer, "prewarm", lambda sum_names: None)
+    caplog.set_level("INFO", logger="scrap_logger")
+
+    with task_queue.command_scope("stalk"):
+        stalkmaster.run_stalker("https://limited.example.org/team", stalker, False)
+
+    assert any(record.getMessage().startswith("limited.example.org: 1 requests") for record in caplog.records)
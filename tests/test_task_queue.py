@@ -0,0 +1,134 @@
+"""
+Contains unit tests for the shared worker pool in task_queue
+
+:author: Jonathan Decker
+"""
+
+from utils import task_queue
+
+
+def nested_sum(depth, width):
+    if depth == 0:
+        return 1
+    single_tasks = [task_queue.SingleTask(nested_sum, depth - 1, width) for _ in range(width)]
+    return sum(task_queue.submit_task_group(task_queue.TaskGroup(single_tasks)))
+
+
+def failing_task():
+    raise ValueError("expected failure")
+
+
+def test_nested_task_groups_do_not_deadlock():
+    # far more waiting parents than workers, would hang without callers running their own tasks
+    task_queue.configure_executor(2)
+    try:
+        assert nested_sum(4, 4) == 4 ** 4
+    finally:
+        task_queue.configure_executor(20)
+
+
+def test_command_accounting():
+    with task_queue.command_scope("test command") as command:
+        assert task_queue.current_command() is command
+        assert command in task_queue.active_commands()
+        single_tasks = [task_queue.SingleTask(nested_sum, 1, 3), task_queue.SingleTask(failing_task)]
+        results = task_queue.submit_task_group(task_queue.TaskGroup(single_tasks))
+
+    assert results == [3]
+    assert command.submitted == 5
+    assert command.finished == 5
+    assert command.failed == 1
+    assert task_queue.current_command() is None
+    assert command not in task_queue.active_commands()
+
+
+def test_iter_task_group_yields_index_with_result():
+    import time
+
+    def sleep_and_return(secs):
+        time.sleep(secs)
+        return secs
+
+    single_tasks = [task_queue.SingleTask(sleep_and_return, secs) for secs in (0.2, 0.0, 0.1)]
+    results = dict(task_queue.iter_task_group(task_queue.TaskGroup(single_tasks)))
+
+    assert results == {0: 0.2, 1: 0.0, 2: 0.1}
+
+
+def test_retry_policy_retries_until_success():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("temporary failure")
+        return "ok"
+
+    single_task = task_queue.SingleTask(flaky, retry=task_queue.RetryPolicy(max_attempts=3, base_delay=0.01))
+    assert task_queue.submit_task_group(task_queue.TaskGroup([single_task])) == ["ok"]
+    assert len(attempts) == 3
+
+
+def test_retry_policy_gives_up_on_long_retry_after():
+    policy = task_queue.RetryPolicy(base_delay=0.01, max_delay=1)
+    assert policy.delay(1, retry_after=0.5) >= 0.5
+    assert policy.delay(1, retry_after=5) is None
+
+
+def test_circuit_breaker_opens_and_recovers():
+    import time
+    import pytest
+
+    breaker = task_queue.CircuitBreaker("test host", failure_threshold=2, reset_timeout=0.05)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    with pytest.raises(task_queue.CircuitOpenError):
+        breaker.before_call()
+
+    time.sleep(0.1)
+    breaker.before_call()
+    with pytest.raises(task_queue.CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    breaker.before_call()
+    assert breaker.rejected == 2
+
+
+def test_deadline_returns_partial_results():
+    import time
+
+    def slow_task(secs):
+        end = time.monotonic() + secs
+        while time.monotonic() < end:
+            task_queue.check_cancelled()
+            time.sleep(0.01)
+        return secs
+
+    with task_queue.command_scope("test deadline", timeout=0.3) as command:
+        single_tasks = [task_queue.SingleTask(slow_task, 0.01)] + [task_queue.SingleTask(slow_task, 2)
+                                                                  for _ in range(3)]
+        start_time = time.monotonic()
+        results = task_queue.submit_task_group(task_queue.TaskGroup(single_tasks))
+
+    # the slow tasks stop at the deadline instead of being waited for
+    assert time.monotonic() - start_time < 2
+    assert results == [0.01]
+    assert command.cancelled
+    assert command.incomplete
+
+
+def test_pages_are_parsed_on_the_threads_by_default(monkeypatch):
+    from utils import scrap_config as config
+
+    # a config without the option parses on the threads like the template
+    monkeypatch.setattr(config, "config", config.configparser.ConfigParser(interpolation=None))
+    monkeypatch.setattr(config.os, "cpu_count", lambda: 4)
+    assert config.get_parse_processes() == 1
+    assert task_queue.get_process_pool() is None
+
+    # auto is one process per core
+    config.config.read_dict({"TASKQUEUE": {"PARSE_PROCESSES": "auto"}})
+    assert config.get_parse_processes() == 4
+    monkeypatch.setattr(config.os, "cpu_count", lambda: 1)
+    assert task_queue.get_process_pool() is None
@@ -0,0 +1,131 @@
+"""
+Contains unit tests for the caches in utils.cache
+
+:author: Jonathan Decker
+"""
+
+import time
+
+from utils.cache import TTLCache, SQLiteStore
+
+
+def test_lru_eviction():
+    cache = TTLCache(2, 60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+    assert cache.hits == 3
+    assert cache.misses == 1
+
+
+def test_ttl_expiration():
+    cache = TTLCache(10, 0.05)
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.1)
+
+    assert cache.get("a") is None
+    assert cache.expirations == 1
+
+
+def test_sqlite_store_survives_restart(tmp_path):
+    db_file = str(tmp_path / "cache.db")
+    cache = TTLCache(10, 60, store=SQLiteStore(db_file, "ranks"))
+    cache.put("euw/faker", "challenger")
+    cache.store.close()
+
+    restarted = TTLCache(10, 60, store=SQLiteStore(db_file, "ranks"))
+    assert restarted.get("euw/faker") == "challenger"
+    assert restarted.get("euw/unknown") is None
+
+
+def test_single_flight_shares_running_call():
+    import threading
+    from utils.cache import SingleFlight
+
+    single_flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def crawl(url):
+        calls.append(url)
+        started.set()
+        release.wait(5)
+        return url.upper()
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(single_flight.do("key", crawl, "url")))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(single_flight.do("key", crawl, "url")))
+                 for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    while single_flight.shared < 3:
+        time.sleep(0.01)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert calls == ["url"]
+    assert results == ["URL"] * 4
+
+
+def test_bloom_filter_stays_near_its_error_rate():
+    from utils.cache import BloomFilter
+
+    bloom_filter = BloomFilter(10000, 0.01)
+    for index in range(10000):
+        bloom_filter.add(f"euw/player{index}")
+
+    assert all(f"euw/player{index}" in bloom_filter for index in range(10000))
+    false_positives = sum(f"euw/other{index}" in bloom_filter for index in range(10000))
+    assert false_positives < 200
+    assert bloom_filter.memory < 16 * 1024
+
+
+def test_negative_cache_forgets_keys_after_ttl(monkeypatch):
+    from utils import cache
+
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    negative_cache = cache.NegativeCache(ttl=100, capacity=1000, error_rate=0.01)
+    negative_cache.add("euw/unranked")
+    now[0] += 60
+    assert "euw/unranked" in negative_cache
+    now[0] += 60
+    assert "euw/unranked" not in negative_cache
+
+
+def test_single_flight_follower_stops_waiting_when_checked():
+    import threading
+    import pytest
+    from utils.cache import SingleFlight
+
+    single_flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def crawl():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    leader = threading.Thread(target=lambda: single_flight.do("key", crawl))
+    leader.start()
+    started.wait(5)
+
+    def give_up():
+        raise TimeoutError("the follower stopped waiting")
+
+    with pytest.raises(TimeoutError):
+        single_flight.do("key", crawl, check=give_up)
+    release.set()
+    leader.join(5)
@@ -0,0 +1,85 @@
+"""
+Contains unit tests for the web driver pool in webmanager
+
+:author: Jonathan Decker
+"""
+
+import threading
+import time
+
+import pytest
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from utils import webmanager
+
+
+class FakeDriver:
+    def __init__(self):
+        self.window_handles = ["main"]
+        self.switch_to = self
+        self.cookies = True
+        self.crashed = False
+        self.quit_called = False
+
+    def window(self, handle):
+        pass
+
+    def delete_all_cookies(self):
+        if self.crashed:
+            raise WebDriverException("browser is gone")
+        self.cookies = False
+
+    def execute_script(self, script):
+        pass
+
+    def get(self, url):
+        pass
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_drivers_are_reused_reset_and_recycled():
+    pool = webmanager.DriverPool(2, 3, launch=FakeDriver)
+
+    driver = pool.checkout()
+    pool.checkin(driver)
+    assert pool.checkout() is driver and not driver.cookies
+
+    # the third use is the last one
+    pool.checkin(driver)
+    assert pool.checkout() is driver
+    pool.checkin(driver)
+    assert driver.quit_called and pool.recycles == 1
+
+    crashed = pool.checkout()
+    crashed.crashed = True
+    pool.checkin(crashed)
+    assert crashed.quit_called and pool.checkout() is not crashed
+    assert pool.launches == 3 and pool.checkouts == 5
+
+
+def test_checkout_waits_for_a_returned_driver_when_the_pool_is_full():
+    pool = webmanager.DriverPool(1, 10, launch=FakeDriver)
+    driver = pool.checkout()
+    borrowed = []
+
+    waiting = threading.Thread(target=lambda: borrowed.append(pool.checkout()))
+    waiting.start()
+    waiting.join(0.2)
+    assert borrowed == []
+
+    pool.checkin(driver)
+    waiting.join(5)
+    assert borrowed == [driver] and pool.launches == 1
+    assert max(pool.wait_times) >= 0.2
+
+
+def test_wait_until_returns_once_the_condition_is_met():
+    ready_at = time.monotonic() + 0.3
+    start_time = time.monotonic()
+    assert webmanager.wait_until(FakeDriver(), lambda driver: time.monotonic() >= ready_at and "ready", 5) == "ready"
+    assert time.monotonic() - start_time < 1
+
+    with pytest.raises(TimeoutException):
+        webmanager.wait_until(FakeDriver(), lambda driver: False, 0.2)
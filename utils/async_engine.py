@@ -0,0 +1,260 @@
+"""
+Offers an asyncio based crawl engine as an alternative to fetching every page on its own worker thread.
+The engine runs one event loop on a background thread, page fetches are coroutines sharing one aiohttp session, so
+thousands of parallel fetches cost coroutines instead of threads.
+Synchronous code can use iter_pages to fetch a list of urls on the engine, SingleTasks with a coroutine function are
+run on the engine by task_queue and async callers can await gather_task_group.
+Requires aiohttp, if it is not installed http_client falls back to the worker threads.
+:author: Jonathan Decker
+"""
+
+import asyncio
+import atexit
+import logging
+import queue
+import threading
+import time
+from urllib.parse import urlsplit
+
+from utils import http_client
+from utils import rate_limiter
+from utils import scrap_config as config
+from utils import task_queue
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger('scrap_logger')
+
+_loop = None
+_loop_lock = threading.Lock()
+_session = None
+
+
+def available():
+    """
+    Checks if the async engine can be used
+    :return: Boolean, True if aiohttp is installed
+    """
+    return aiohttp is not None
+
+
+def get_loop():
+    """
+    Returns the event loop of the engine and starts it on a daemon thread on first use
+    :return: asyncio.AbstractEventLoop, the running loop of the engine
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name="async_engine", daemon=True)
+            thread.start()
+            atexit.register(close)
+            logger.debug("Started async crawl engine")
+        return _loop
+
+
+def close():
+    """
+    Closes the aiohttp session and stops the event loop of the engine, the next fetch starts them again
+    :return: None
+    """
+    global _loop, _session
+    with _loop_lock:
+        loop, session = _loop, _session
+        _loop, _session = None, None
+    if loop is None:
+        return
+    if session is not None:
+        try:
+            asyncio.run_coroutine_threadsafe(session.close(), loop).result(5)
+        except Exception as exc:
+            logger.warning(f"Closing the session of the async crawl engine failed: {exc!r}")
+    loop.call_soon_threadsafe(loop.stop)
+    logger.debug("Stopped async crawl engine")
+
+
+def run(coro):
+    """
+    Runs a coroutine on the engine and blocks until it is done, must not be called from the engine thread
+    :param coro: coroutine, any coroutine
+    :return: the result of the coroutine
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result()
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        connect_timeout, read_timeout = config.get_http_timeouts()
+        timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        connector = aiohttp.TCPConnector(limit=config.get_async_max_connections())
+        _session = aiohttp.ClientSession(timeout=timeout, connector=connector)
+    return _session
+
+
+async def _acquire_slot(limiter):
+    # the slots are shared with the worker threads, so coroutines wait for a release instead of a semaphore
+    loop = asyncio.get_running_loop()
+    waiter = limiter.take_slot(loop)
+    while waiter is not None:
+        await waiter
+        waiter = limiter.take_slot(loop)
+
+
+async def fetch_text(url, command=None):
+    """
+    Fetches a page while respecting the limits of its host, the request slots and the token bucket are shared with the
+    worker threads.
+    Retries and circuit breakers work the same way as for http_client.get.
+    :param url: String, a valid url
+    :param command: Command(None), the task_queue Command the time spent waiting on the limiter is accounted to
+    :return: String, the decoded body of the response
+    """
+    policy = http_client.get_retry_policy()
+    attempt = 1
+    while True:
+        try:
+            return await _fetch_once(url, command)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError, http_client.RetryableResponseError) as exc:
+            delay = policy.delay(attempt, getattr(exc, "retry_after", None))
+            if attempt >= policy.max_attempts or delay is None:
+                raise
+            logger.debug(f"Attempt {attempt} to fetch {url} failed with {exc!r}, retrying in {delay:.2f} secs")
+            if command is not None:
+                command.add_retry()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def _check_cancelled(command):
+    if command is not None and command.cancelled:
+        raise task_queue.CommandCancelledError(f"{command.name} was cancelled")
+
+
+async def _fetch_once(url, command):
+    _check_cancelled(command)
+    limiter = rate_limiter.get_limiter(url)
+    start_time = time.perf_counter()
+    await _acquire_slot(limiter)
+    try:
+        if limiter.requests_per_second > 0:
+            delay = limiter.take_token()
+            while delay > 0:
+                await asyncio.sleep(delay)
+                delay = limiter.take_token()
+        waited = time.perf_counter() - start_time
+        limiter.record_wait(waited)
+        if command is not None:
+            command.add_limiter_wait(waited)
+
+        # a request must not outlive the deadline of its command
+        _check_cancelled(command)
+        remaining = command.remaining() if command is not None else None
+        session = _get_session()
+        breaker = http_client.get_breaker(url)
+        breaker.before_call()
+        try:
+            async with session.get(url, timeout=request_timeout(session.timeout, remaining)) as response:
+                status = response.status
+                retry_after = response.headers.get("Retry-After")
+                if not http_client.is_retryable(status):
+                    text = await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            breaker.record_failure()
+            raise
+        except BaseException:
+            # cancelled, for example by a hedged lookup that got its answer elsewhere
+            breaker.record_abort()
+            raise
+    finally:
+        limiter.release()
+    if http_client.is_retryable(status):
+        breaker.record_failure()
+        raise http_client.RetryableResponseError(status, url, retry_after)
+    breaker.record_success()
+    return text
+
+
+def request_timeout(session_timeout, remaining):
+    """
+    Caps the total time of a request at the time left for its command, the other timeouts of the session stay set
+    :param session_timeout: aiohttp.ClientTimeout, the timeouts of the session
+    :param remaining: float, secs until the deadline of the command, None if there is none
+    :return: aiohttp.ClientTimeout, the timeouts for the request
+    """
+    if remaining is None:
+        return session_timeout
+    total = max(remaining, 0.1)
+    if session_timeout.total is not None:
+        total = min(total, session_timeout.total)
+    return aiohttp.ClientTimeout(total=total, connect=session_timeout.connect,
+                                 sock_connect=session_timeout.sock_connect, sock_read=session_timeout.sock_read)
+
+
+async def _fetch_into(url, index, results, command):
+    try:
+        results.put((index, await fetch_text(url, command)))
+    except task_queue.CommandCancelledError:
+        command.incomplete = True
+        results.put((index, None))
+    except Exception as exc:
+        logger.error(f"Fetching {url} on the async engine generated an exception: {exc}")
+        results.put((index, None))
+
+
+def iter_pages(urls):
+    """
+    Fetches all urls on the engine and yields the pages as soon as each one has arrived
+    :param urls: List[String], valid urls
+    :return: Generator[(int, String)], the index of the url and its page, failed fetches are logged and skipped, if the
+    command is cancelled the remaining pages are skipped
+    """
+    loop = get_loop()
+    results = queue.SimpleQueue()
+    # coroutines on the engine thread do not see the context of the caller, so the command is passed along
+    command = task_queue.current_command()
+    for index, url in enumerate(urls):
+        asyncio.run_coroutine_threadsafe(_fetch_into(url, index, results, command), loop)
+    hosts = {urlsplit(url).hostname for url in urls}
+    logger.debug(f"{len(urls)} pages have been submitted to the async engine for {', '.join(map(str, hosts))}")
+
+    remaining_pages = len(urls)
+    while remaining_pages > 0:
+        try:
+            index, page = results.get(timeout=task_queue.wait_timeout(command))
+        except queue.Empty:
+            # once the command is cancelled running fetches get the same grace period as worker threads
+            if command.cancelled and task_queue.wait_timeout(command) == 0:
+                logger.warning(f"Stopped waiting for {remaining_pages} pages since {command.name} was cancelled")
+                command.incomplete = True
+                return
+            continue
+        remaining_pages += -1
+        if page is not None:
+            yield index, page
+
+
+async def gather_task_group(tg):
+    """
+    Runs a TaskGroup of coroutine functions on the running loop with at most TASKQUEUE/MAX_WORKERS at a time
+    :param tg: TaskGroup, a TaskGroup whose SingleTasks have coroutine functions
+    :return: List, the results in the order of the tasks, tasks that raised an exception are logged and skipped
+    """
+    semaphore = asyncio.Semaphore(config.get_max_workers())
+
+    async def run_task(task):
+        async with semaphore:
+            return await task.func_pos0[0](*task.args)
+
+    outcomes = await asyncio.gather(*[run_task(task) for task in tg.tasks], return_exceptions=True)
+    results = []
+    for task, outcome in zip(tg.tasks, outcomes):
+        if isinstance(outcome, Exception):
+            logger.error('%r generated an exception: %s' % (task, outcome))
+        else:
+            results.append(outcome)
+    return results
@@ -0,0 +1,286 @@
+"""
+Provides caches for results that are expensive to scrape.
+TTLCache keeps up to max_size entries in memory, evicts the least recently used entry first and treats entries older
+than ttl secs as missing. Optionally it writes through to a SQLiteStore so entries survive a restart of the bot.
+SingleFlight lets concurrent callers asking for the same result wait for one call instead of each doing the work.
+NegativeCache remembers keys without a result in BloomFilters, so millions of keys only cost a few MiB.
+:author: Jonathan Decker
+"""
+
+import collections
+import concurrent.futures
+import hashlib
+import logging
+import math
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger('scrap_logger')
+
+
+class SQLiteStore:
+    """
+    Persists string values with the time they were stored in a SQLite table
+    """
+
+    def __init__(self, file, table):
+        self.file = file
+        self.table = table
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(file, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(f"CREATE TABLE IF NOT EXISTS {table} "
+                                     f"(key TEXT PRIMARY KEY, value TEXT, stored REAL)")
+
+    def get(self, key):
+        """
+        Returns the stored value for the key
+        :param key: String, the key of the entry
+        :return: (String, float), the value and the time it was stored or None if the key is unknown
+        """
+        with self._lock:
+            row = self._connection.execute(f"SELECT value, stored FROM {self.table} WHERE key = ?",
+                                           (key, )).fetchone()
+        return row
+
+    def put(self, key, value, stored):
+        with self._lock, self._connection:
+            self._connection.execute(f"INSERT OR REPLACE INTO {self.table} (key, value, stored) VALUES (?, ?, ?)",
+                                     (key, value, stored))
+
+    def delete_older_than(self, stored):
+        """
+        Removes all entries stored before the given time
+        :param stored: float, a unix timestamp
+        :return: int, the number of deleted entries
+        """
+        with self._lock, self._connection:
+            cursor = self._connection.execute(f"DELETE FROM {self.table} WHERE stored < ?", (stored, ))
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class TTLCache:
+    """
+    Thread safe LRU cache whose entries expire after ttl secs, keys must be strings if a store is used
+    """
+
+    def __init__(self, max_size, ttl, name="", store: SQLiteStore = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.name = name
+        self.store = store
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        if store is not None:
+            removed = store.delete_older_than(time.time() - ttl)
+            logger.debug(f"Removed {removed} expired entries from the {name} store")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __str__(self):
+        return (f"{self.name} cache: {len(self._entries)}/{self.max_size} entries, {self.hits} hits, "
+                f"{self.misses} misses, {self.evictions} evictions, {self.expirations} expirations")
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value for the key and marks it as recently used
+        :param key: hashable, the key of the entry
+        :param default: returned if the key is not cached or has expired
+        :return: the cached value or default
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        if self.store is not None:
+            row = self.store.get(key)
+            if row is not None and now - row[1] <= self.ttl:
+                with self._lock:
+                    self._insert(key, row[0], row[1])
+                    self.hits += 1
+                return row[0]
+
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def put(self, key, value):
+        """
+        Caches the value for the key, evicts the least recently used entry if the cache is full
+        :param key: hashable, the key of the entry
+        :param value: any value, must be a string if a store is used
+        :return: None
+        """
+        now = time.time()
+        with self._lock:
+            self._insert(key, value, now)
+        if self.store is not None:
+            self.store.put(key, value, now)
+
+    def _insert(self, key, value, stored):
+        self._entries[key] = (value, stored)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SingleFlight:
+    """
+    Makes sure only one call per key runs at a time, concurrent callers with the same key wait for its result
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key, func, *args, check=None):
+        """
+        Calls func with args unless a call for the same key is already running, then waits for that call instead
+        :param key: hashable, identifies calls that would produce the same result
+        :param func: function, the function to call
+        :param args: the arguments for func
+        :param check: function(None), called about every half second while waiting for a running call, an exception
+        raised by it stops the waiting, for example once the waiting command was cancelled
+        :return: the result of func, exceptions are raised for every waiting caller
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = concurrent.futures.Future()
+                self._calls[key] = future
+            else:
+                self.shared += 1
+
+        if not leader:
+            logger.debug(f"Waiting for the running call for {key}")
+            while check is not None:
+                done, pending = concurrent.futures.wait([future], timeout=0.5)
+                if done:
+                    break
+                check()
+            return future.result()
+
+        try:
+            result = func(*args)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class BloomFilter:
+    """
+    Compact set of strings that never forgets an added key but may claim to contain a key that was never added.
+    The chance of such a false positive stays at error_rate as long as at most capacity keys are added.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.memory = len(self._bits)
+        self.count = 0
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def _positions(self, key):
+        # double hashing, all positions are derived from one 128 bit digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + index * second) % self.size for index in range(self.hash_count)]
+
+
+class NegativeCache:
+    """
+    Thread safe cache for keys that are known to have no result, for example unranked or unknown summoners.
+    Keys are kept in two generations of BloomFilters, each generation covers ttl / 2 secs, so a key is forgotten
+    at most ttl secs after it was added. The memory use is bounded by the capacity of the generations, a generation
+    that is full is retired early.
+    """
+
+    def __init__(self, ttl, capacity, error_rate, name=""):
+        self.ttl = ttl
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.name = name
+        self._lock = threading.Lock()
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous = BloomFilter(capacity, error_rate)
+        self._generation = int(time.time() // (ttl / 2))
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self):
+        memory = (self._current.memory + self._previous.memory) // 1024
+        return (f"{self.name} negative cache: {self._current.count + self._previous.count} keys in {memory} KiB, "
+                f"{self.hits} hits, {self.misses} misses")
+
+    def __contains__(self, key):
+        with self._lock:
+            self._rotate()
+            found = key in self._current or key in self._previous
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return found
+
+    def add(self, key):
+        with self._lock:
+            self._rotate()
+            self._current.add(key)
+
+    def _rotate(self):
+        # generations start at fixed multiples of ttl / 2, so no key outlives ttl
+        generation = int(time.time() // (self.ttl / 2))
+        if generation > self._generation + 1:
+            self._previous = BloomFilter(self.capacity, self.error_rate)
+            self._current = BloomFilter(self.capacity, self.error_rate)
+        elif generation == self._generation + 1 or self._current.count >= self.capacity:
+            self._previous = self._current
+            self._current = BloomFilter(self.capacity, self.error_rate)
+        self._generation = generation
+
+    def clear(self):
+        with self._lock:
+            self._current = BloomFilter(self.capacity, self.error_rate)
+            self._previous = BloomFilter(self.capacity, self.error_rate)
@@ -0,0 +1,268 @@
+"""
+Handles all outbound http requests of the stalkers and player lookups.
+Every request goes through the rate limiter of its host and uses one shared requests.Session, so connections are
+kept alive and reused instead of doing a new TCP and TLS handshake for every page.
+Use iter_pages to fetch many pages at once, depending on the config they are fetched by the worker threads of the
+task_queue or as coroutines on the async_engine.
+:author: Jonathan Decker
+"""
+
+import datetime
+import email.utils
+import logging
+import queue
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils import async_engine
+from utils import rate_limiter
+from utils import scrap_config as config
+from utils import task_queue
+
+logger = logging.getLogger('scrap_logger')
+
+_session = None
+_session_lock = threading.Lock()
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class RetryableResponseError(requests.HTTPError):
+    """
+    Raised for responses that are worth another try, like 429 or any server error
+    """
+
+    def __init__(self, status_code, url, retry_after=None, response=None):
+        super().__init__(f"{status_code} response from {url}", response=response)
+        self.status_code = status_code
+        self.retry_after = parse_retry_after(retry_after)
+
+
+def parse_retry_after(value):
+    """
+    Parses the value of a Retry-After header
+    :param value: String, either a number of secs or a http date, may be None
+    :return: float, the delay in secs or None if no valid value was given
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_date - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+def is_retryable(status_code):
+    """
+    Checks if a response with the given status code should be retried
+    :param status_code: int, the http status code
+    :return: Boolean, True for 429 and all server errors
+    """
+    return status_code == 429 or status_code >= 500
+
+
+def get_retry_policy():
+    """
+    Returns the retry policy for requests, connection errors, timeouts and retryable responses are retried
+    :return: RetryPolicy, configured by the HTTP section of the config
+    """
+    max_attempts, base_delay, max_delay = config.get_http_retry_settings()
+    return task_queue.RetryPolicy(max_attempts, base_delay, max_delay,
+                                  (requests.ConnectionError, requests.Timeout, RetryableResponseError))
+
+
+def get_breaker(url):
+    """
+    Returns the circuit breaker of the host of the given url, hosts are grouped the same way as for rate limiting
+    :param url: String, any valid url
+    :return: CircuitBreaker, shared by all requests to the same host
+    """
+    key = rate_limiter.get_limiter(url).name
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            failure_threshold, reset_timeout = config.get_circuit_breaker_settings()
+            breaker = task_queue.CircuitBreaker(key, failure_threshold, reset_timeout)
+            _breakers[key] = breaker
+    return breaker
+
+
+def create_session():
+    """
+    Creates a session with a connection pool per host that is big enough for every worker of the task queue
+    :return: requests.Session, ready to be shared between threads
+    """
+    pool_size = config.get_max_workers()
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=config.get_pooled_hosts(), pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+    logger.debug(f"Created http session with {pool_size} connections per host")
+    return session
+
+
+def get_session():
+    """
+    Returns the shared session and creates it on first use
+    :return: requests.Session, used for all requests
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+
+def close_session():
+    """
+    Closes all pooled connections, the next request creates a new session
+    :return: None
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get(url, **kwargs):
+    """
+    Sends a GET request once the rate limiter of the host allows it. Failed requests are retried with backoff, while
+    the circuit breaker of the host is open requests fail fast with a CircuitOpenError. Requests for a cancelled
+    command raise a CommandCancelledError and the timeouts never reach past the deadline of the command.
+    :param url: String, a valid url
+    :param kwargs: passed on to requests.Session.get, timeout defaults to the timeouts set in the config
+    :return: requests.Response, the response of the server
+    """
+    kwargs.setdefault("timeout", config.get_http_timeouts())
+    return get_retry_policy().call(_get_once, url, kwargs)
+
+
+def _get_once(url, kwargs):
+    task_queue.check_cancelled()
+    command = task_queue.current_command()
+    remaining = command.remaining() if command is not None else None
+    if remaining is not None:
+        # a request must not outlive the deadline of its command
+        timeouts = kwargs["timeout"] if isinstance(kwargs["timeout"], tuple) else (kwargs["timeout"], ) * 2
+        kwargs = dict(kwargs, timeout=tuple(min(timeout or remaining, max(remaining, 0.1)) for timeout in timeouts))
+    breaker = get_breaker(url)
+    breaker.before_call()
+    session = get_session()
+    try:
+        with rate_limiter.limit(url):
+            page = session.get(url, **kwargs)
+    except requests.RequestException:
+        breaker.record_failure()
+        raise
+    except BaseException:
+        breaker.record_abort()
+        raise
+    if is_retryable(page.status_code):
+        breaker.record_failure()
+        raise RetryableResponseError(page.status_code, url, page.headers.get("Retry-After"), page)
+    breaker.record_success()
+    return page
+
+
+def get_text(url):
+    """
+    Fetches a page and returns its decoded body
+    :param url: String, a valid url
+    :return: String, the text of the page
+    """
+    return get(url).text
+
+
+def iter_pages(urls):
+    """
+    Fetches all urls on the crawl engine set in the config and yields the pages as soon as each one has arrived
+    :param urls: List[String], valid urls
+    :return: Generator[(int, String)], the index of the url and its page, failed fetches are logged and skipped
+    """
+    if config.get_engine() == "async" and async_engine.available():
+        return async_engine.iter_pages(urls)
+    single_tasks = [task_queue.SingleTask(get_text, url) for url in urls]
+    return task_queue.iter_task_group(task_queue.TaskGroup(single_tasks))
+
+
+def crawl(urls, parse, report=False):
+    """
+    Fetches all urls with iter_pages and parses each page as soon as it has arrived. Pages are parsed on the process
+    pool of the task_queue if TASKQUEUE/PARSE_PROCESSES allows more than one process, so big crawls are not limited to
+    one core.
+    :param urls: List[String], valid urls
+    :param parse: function, takes the text of a page and returns the parsed object or None if the page is skipped,
+    must be a module level function if pages are parsed on the process pool
+    :param report: Boolean(False), if True every parsed object is passed to task_queue.report_progress
+    :return: List, the parsed objects in the order of the urls, pages that failed to parse are logged and skipped
+    """
+    if task_queue.get_process_pool() is None:
+        parsed = _parse_pages(urls, parse)
+    else:
+        parsed = _parse_pages_in_processes(urls, parse)
+
+    indexed_results = []
+    for index, result in parsed:
+        if result is None:
+            continue
+        if report:
+            task_queue.report_progress(result)
+        indexed_results.append((index, result))
+
+    # restore the order of the urls
+    indexed_results.sort(key=lambda indexed_result: indexed_result[0])
+    return [result for index, result in indexed_results]
+
+
+def _parse_pages(urls, parse):
+    for index, page in iter_pages(urls):
+        try:
+            yield index, parse(page)
+        except Exception as exc:
+            logger.error(f"Parsing {urls[index]} with {parse.__name__} generated an exception: {exc}")
+
+
+def _parse_pages_in_processes(urls, parse):
+    # parsed pages are collected in a queue so they are handed out while other pages are still being fetched
+    parsed = queue.SimpleQueue()
+    future_to_index = {}
+    handed_out = 0
+    for index, page in iter_pages(urls):
+        future = task_queue.submit_to_process(parse, page)
+        future_to_index[future] = index
+        future.add_done_callback(parsed.put)
+        while not parsed.empty():
+            handed_out += 1
+            yield from _parse_result(urls, parse, future_to_index, parsed.get())
+
+    command = task_queue.current_command()
+    while handed_out < len(future_to_index):
+        try:
+            future = parsed.get(timeout=task_queue.wait_timeout(command))
+        except queue.Empty:
+            if command.cancelled and task_queue.wait_timeout(command) == 0:
+                logger.warning(f"Stopped waiting for {len(future_to_index) - handed_out} parsed pages "
+                               f"since {command.name} was cancelled")
+                for pending in future_to_index:
+                    pending.cancel()
+                command.incomplete = True
+                return
+            continue
+        handed_out += 1
+        yield from _parse_result(urls, parse, future_to_index, future)
+
+
+def _parse_result(urls, parse, future_to_index, future):
+    index = future_to_index[future]
+    try:
+        yield index, future.result()
+    except Exception as exc:
+        logger.error(f"Parsing {urls[index]} with {parse.__name__} generated an exception: {exc}")
@@ -0,0 +1,69 @@
+"""
+Parses scraped pages with BeautifulSoup.
+The parser is set in the PARSER section of the config, lxml is used if it is installed and html.parser otherwise.
+Most pages only need one or two containers, so parse can be limited to the elements that are needed:
+
+soup = page_parser.parse(page.text, "div", class_="TierRank")
+
+Only the matching elements and everything inside of them end up in the soup, which saves most of the parsing time
+on big pages. Selectors starting at elements outside of the kept ones do not match anymore.
+:author: Jonathan Decker
+"""
+
+import logging
+import bs4
+
+from utils import scrap_config as config
+
+try:
+    import lxml
+except ImportError:
+    lxml = None
+
+logger = logging.getLogger('scrap_logger')
+
+_warned = False
+
+
+def get_features():
+    """
+    Returns the parser to use, falls back to html.parser if lxml is set but not installed
+    :return: String, a parser name BeautifulSoup accepts as features
+    """
+    global _warned
+    backend = config.get_parser_backend()
+    if backend == "lxml" and lxml is None:
+        if not _warned:
+            logger.warning("lxml is not installed, pages are parsed with html.parser")
+            _warned = True
+        return "html.parser"
+    return backend
+
+
+def parse(html, name=None, **attrs):
+    """
+    Parses the given page, if a name or attributes are given only the matching elements are parsed
+    :param html: String, the text of a page
+    :param name: String or List[String](None), tag names of the elements to keep
+    :param attrs: attributes the elements to keep must have, like for BeautifulSoup.find, class_ may be a list
+    :return: BeautifulSoup, the parsed page
+    """
+    if "class_" in attrs:
+        attrs["class_"] = _class_matcher(attrs["class_"])
+    parse_only = bs4.SoupStrainer(name, **attrs) if name is not None or attrs else None
+    return bs4.BeautifulSoup(html, features=get_features(), parse_only=parse_only)
+
+
+def _class_matcher(classes):
+    # while parsing the strainer sees the raw class attribute, so single classes have to be matched like find does
+    if isinstance(classes, str):
+        classes = [classes]
+    wanted = set(classes)
+
+    def match(value):
+        if value is None:
+            return False
+        if not isinstance(value, str):
+            value = " ".join(value)
+        return value in wanted or not wanted.isdisjoint(value.split())
+    return match
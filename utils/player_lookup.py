@@ -4,17 +4,309 @@ Provides functions to look up player rankings online and calculate average team
 :author: Jonathan Decker
 """
 
+import asyncio
+import collections
+import functools
 import logging
-import bs4
+import threading
+import time
 from models import Player, Team, TeamList, Rank, TeamListList
+from utils import async_engine
 from utils import task_queue
-import requests
+from utils import http_client
+from utils import page_parser
+from utils import rank_parser
+from utils import rank_stats
 from utils import scrap_config as config
+from utils.cache import TTLCache, SQLiteStore, NegativeCache
 
-from utils.lookup_tables import rank_lookup, rating_lookup
 
 logger = logging.getLogger('scrap_logger')
 
+# url template, replacement for spaces in names, tag and class of the soloQ ranking on every supported profile page
+RANK_PAGES = {
+    "opgg": ("https://{region}.op.gg/summoner/userName={name}", "+", "div", "TierRank"),
+    "lolprofile": ("https://lolprofile.net/summoner/{region}/{name}", "%20", "span", "tier"),
+    "leagueofgraphs": ("https://www.leagueofgraphs.com/summoner/{region}/{name}", "+", "span", "leagueTier"),
+    "mobalytics": ("https://lol.mobalytics.gg/summoner/{region}/{name}", "%20", "p",
+                   "profilestyles__TierInfoLabel-y97g0w-19 jCyjuF"),
+}
+# if the primary source shows no rank the player is unranked, even if the other sources failed
+PRIMARY_SOURCE = "opgg"
+
+# ranks are never modified, so teams share one Rank per rating
+_RATING_RANKS = [Rank(rating) for rating in range(rank_parser.MAX_RATING + 1)]
+
+_rank_cache = None
+_negative_cache = None
+_rank_cache_lock = threading.Lock()
+_rank_sources = None
+_rank_sources_lock = threading.Lock()
+
+
+class RankSource:
+    """
+    A website player ranks are scraped from, tracks its latency and errors so the healthiest source is asked first
+    """
+
+    def __init__(self, name, priority):
+        self.name = name
+        self.priority = priority
+        self._latencies = collections.deque(maxlen=100)
+        self._lock = threading.Lock()
+        # exponentially weighted share of failed requests, recent requests count the most
+        self.error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.hedges = 0
+        self.wins = 0
+
+    def __str__(self):
+        median = self.latency_percentile(50)
+        median_str = f"{median:.2f} secs" if median is not None else "unknown"
+        return (f"{self.name}: {self.requests} requests, {self.failures} failures, {self.wins} answers used, "
+                f"hedged {self.hedges} times, median latency {median_str}, error rate {self.error_rate:.2f}")
+
+    def record_success(self, latency):
+        with self._lock:
+            self.requests += 1
+            self._latencies.append(latency)
+            self.error_rate *= 0.8
+
+    def record_failure(self):
+        with self._lock:
+            self.requests += 1
+            self.failures += 1
+            self.error_rate = self.error_rate * 0.8 + 0.2
+
+    def latency_percentile(self, percentile):
+        """
+        Returns the given percentile of the latencies of the last 100 successful requests
+        :param percentile: float, between 0 and 100
+        :return: float, the latency in secs or None if there are less than 5 samples
+        """
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < 5:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * percentile / 100))]
+
+    def hedge_delay(self):
+        """
+        Returns how long to wait for this source before asking the next one as well
+        :return: float, the configured latency percentile or the default delay while there are too few samples
+        """
+        percentile, default_delay = config.get_hedge_settings()
+        delay = self.latency_percentile(percentile)
+        return delay if delay is not None else default_delay
+
+    def sort_key(self):
+        # unhealthy sources go last, the others are ordered by their usual latency and then by the config
+        median = self.latency_percentile(50)
+        if median is None:
+            median = config.get_hedge_settings()[1]
+        return self.error_rate >= 0.5, median, self.priority
+
+
+def get_rank_cache():
+    """
+    Returns the cache for scraped player ranks and creates it from the config on first use
+    :return: TTLCache, maps region and summoner name to the scraped rank string
+    """
+    global _rank_cache
+    with _rank_cache_lock:
+        if _rank_cache is None:
+            max_size, ttl, db_file = config.get_rank_cache_settings()
+            store = SQLiteStore(db_file, "ranks") if db_file else None
+            _rank_cache = TTLCache(max_size, ttl, "rank", store)
+        return _rank_cache
+
+
+def get_negative_cache():
+    """
+    Returns the cache for unranked and unknown players and creates it from the config on first use
+    :return: NegativeCache, contains the rank_cache_key of every player that was recently found to be unranked
+    """
+    global _negative_cache
+    with _rank_cache_lock:
+        if _negative_cache is None:
+            ttl, capacity, error_rate = config.get_negative_cache_settings()
+            _negative_cache = NegativeCache(ttl, capacity, error_rate, "rank")
+        return _negative_cache
+
+
+def get_cached_elo(key):
+    """
+    Returns the cached rank of a player from the rank cache or the negative cache
+    :param key: String, the rank_cache_key of the player
+    :return: int, the elo of the player as parsed by rank_parser or None if the player is not cached
+    """
+    elo = get_rank_cache().get(key)
+    if elo is None and key in get_negative_cache():
+        return rank_parser.UNRANKED
+    # ranks loaded from the store are text, rank strings stored by older versions are parsed as well
+    if elo is not None:
+        elo = rank_parser.parse_stored_elo(elo)
+    return elo
+
+
+def cache_elo(key, elo):
+    """
+    Caches a scraped rank, unranked and unknown players go to the negative cache which forgets them sooner
+    :param key: String, the rank_cache_key of the player
+    :param elo: int, the elo of the player as parsed by rank_parser
+    :return: None
+    """
+    rating, lp = rank_parser.split_elo(elo)
+    if rating == rank_parser.UNRANKED:
+        get_negative_cache().add(key)
+    else:
+        get_rank_cache().put(key, elo)
+
+
+def rank_cache_key(region, sum_name):
+    """
+    Builds the cache key for a player, op.gg ignores case and spaces in summoner names so the cache does as well
+    :param region: String, the region of the account
+    :param sum_name: String, the summoner name of the account
+    :return: String, the cache key
+    """
+    return region.lower() + "/" + sum_name.replace(" ", "").lower()
+
+
+def get_rank_sources():
+    """
+    Returns the websites ranks are looked up on, created from PLAYERLOOKUP/SOURCES on first use
+    :return: List[RankSource], in the order of the config
+    """
+    global _rank_sources
+    with _rank_sources_lock:
+        if _rank_sources is None:
+            names = [name for name in config.get_rank_sources() if name in RANK_PAGES] or ["opgg"]
+            _rank_sources = [RankSource(name, priority) for priority, name in enumerate(names)]
+        return _rank_sources
+
+
+def get_source_stats():
+    """
+    Returns a summary of all rank sources
+    :return: List[String], one line per source
+    """
+    return [str(source) for source in get_rank_sources()]
+
+
+def lookup_elo(sum_name):
+    """
+    Looks up the rank of a player on the healthiest rank source. If the source takes longer than it usually does, the
+    next source is asked as well and the first page that shows a rank wins. A page without a rank, from an unranked
+    player or an outdated selector, does not count as an answer and the next source is asked. Without aiohttp the
+    sources are only tried one after another.
+    :param sum_name: Str, the summoner name of a league game account
+    :return: int, the elo of the player as parsed by rank_parser, UNRANKED if every source or the primary source
+    answered without a rank, None if some sources showed no rank and the others failed
+    """
+    sources = sorted(get_rank_sources(), key=RankSource.sort_key)
+    if async_engine.available():
+        return async_engine.run(_hedged_lookup(sum_name, sources, task_queue.current_command()))
+
+    last_error = None
+    missed_by = set()
+    for source in sources:
+        start_time = time.perf_counter()
+        try:
+            elo = stalk_player(source.name, sum_name)
+        except task_queue.CommandCancelledError:
+            raise
+        except Exception as exc:
+            source.record_failure()
+            logger.debug(f"Looking up {sum_name} on {source.name} failed: {exc}")
+            last_error = exc
+            continue
+        source.record_success(time.perf_counter() - start_time)
+        if elo is None:
+            missed_by.add(source.name)
+            continue
+        source.wins += 1
+        return elo
+    return _no_rank_shown(missed_by, last_error)
+
+
+def _no_rank_shown(missed_by, last_error):
+    # the name is unranked or unknown once all sources agree, otherwise a failed source might have shown a rank
+    if missed_by and (last_error is None or PRIMARY_SOURCE in missed_by):
+        return rank_parser.UNRANKED
+    if missed_by:
+        return None
+    raise last_error
+
+
+async def _hedged_lookup(sum_name, sources, command):
+    loop = asyncio.get_running_loop()
+    waiting = list(sources)
+    running = {}
+    last_error = None
+    missed_by = set()
+    replace_failed = False
+    try:
+        while waiting or running:
+            # a failed source is replaced right away
+            if not running or replace_failed and waiting:
+                source = waiting.pop(0)
+                running[asyncio.ensure_future(_fetch_elo(source, sum_name, command))] = (source, loop.time())
+            replace_failed = False
+
+            # once the newest request takes longer than usual for its source the next source is asked as well
+            timeout = None
+            if waiting:
+                source, started = list(running.values())[-1]
+                timeout = max(0.0, started + source.hedge_delay() - loop.time())
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                source.hedges += 1
+                next_source = waiting.pop(0)
+                logger.debug(f"{source.name} is slow for {sum_name}, asking {next_source.name} as well")
+                running[asyncio.ensure_future(_fetch_elo(next_source, sum_name, command))] = (next_source,
+                                                                                             loop.time())
+                continue
+
+            for task in done:
+                source, started = running.pop(task)
+                try:
+                    elo = task.result()
+                except task_queue.CommandCancelledError:
+                    raise
+                except Exception as exc:
+                    logger.debug(f"Looking up {sum_name} on {source.name} failed: {exc}")
+                    last_error = exc
+                    replace_failed = True
+                    continue
+                if elo is None:
+                    # the page shows no rank, another source may still show one
+                    missed_by.add(source.name)
+                    replace_failed = True
+                    continue
+                source.wins += 1
+                return elo
+        return _no_rank_shown(missed_by, last_error)
+    finally:
+        # the slower requests are not needed anymore
+        for task in running:
+            task.cancel()
+
+
+async def _fetch_elo(source, sum_name, command):
+    start_time = time.perf_counter()
+    try:
+        text = await async_engine.fetch_text(rank_page_url(source.name, sum_name), command)
+        elo = parse_rank_page(source.name, text)
+    except (asyncio.CancelledError, task_queue.CommandCancelledError):
+        raise
+    except Exception:
+        source.record_failure()
+        raise
+    source.record_success(time.perf_counter() - start_time)
+    return elo
+
 
 def calc_average_max_rank(team):
     """
@@ -40,59 +332,157 @@ def calc_average_max_rank(team):
     else:
         average = round(rank_sum / count)
         max_rank = max(list_ratings)
-    team.average_rank = Rank(rating_lookup.get(average), average)
-    team.max_rank = Rank(rating_lookup.get(max_rank), max_rank)
+    team.average_rank = Rank(average)
+    team.max_rank = Rank(max_rank)
     return team
 
 
+def calc_league_stats(teams):
+    """
+    Calculates the rank statistics of all given teams at once with rank_stats and sets them for every team, the
+    percentile of a team is its place among the given teams
+    :param teams: List[Team], Team objects containing lists of players with set ranks
+    :return: List[Team], the same objects with all rank statistics set
+    """
+
+    rating_rows = [_team_ratings(team) for team in teams]
+    for team, stats in zip(teams, rank_stats.calc_stats(rating_rows)):
+        _set_team_stats(team, stats)
+    return teams
+
+
+def _team_ratings(team):
+    return [player.rank.rating if player.rank is not None else 0 for player in team.player_list]
+
+
+def _set_team_stats(team, stats):
+    team.average_rank = _RATING_RANKS[round(stats.mean)]
+    team.max_rank = _RATING_RANKS[round(stats.max)]
+    team.median_rank = _RATING_RANKS[round(stats.median)]
+    team.top3_rank = _RATING_RANKS[round(stats.top3)]
+    team.rank_deviation = stats.deviation
+    team.percentile = stats.percentile
+
+
 def add_list_team_list_ranks(team_list_list: TeamListList):
     """
-    Calls add_team_lists_ranks for every given team_list
-    :param team_lists: List[TeamList], a list of TeamList objects
+    Looks up the ranks of all players in the given team lists with add_ranks, so players that appear in several
+    groups are only looked up once
+    :param team_list_list: TeamListList, contains a list of TeamList objects
     :return: None, but the Team and Player objects inside were modified
     """
 
     logger.debug("Beginning rank stalking for a list of team lists")
-    single_tasks = []
-    for team_list in team_list_list.team_lists:
-        single_tasks.append(task_queue.SingleTask(add_team_list_ranks, team_list))
+    # team lists are reported as a whole instead of team by team
+    team_lists = team_list_list.team_lists
+    remaining_teams = [len(team_list.teams) for team_list in team_lists]
+    list_of_team = {}
+    for list_index, team_list in enumerate(team_lists):
+        for team in team_list.teams:
+            list_of_team[id(team)] = list_index
+
+    def report_team_list(team):
+        list_index = list_of_team[id(team)]
+        remaining_teams[list_index] += -1
+        if remaining_teams[list_index] == 0:
+            task_queue.report_progress(team_lists[list_index])
 
-    task_group = task_queue.TaskGroup(single_tasks, "add ranks to team lists")
-    task_queue.submit_task_group(task_group)
+    add_ranks([team for team_list in team_lists for team in team_list.teams], report_team_list)
 
 
-def add_team_list_ranks(team_list: TeamList):
+def add_team_list_ranks(team_list: TeamList, report_teams=True):
     """
-    Calls add_team_ranks for every Team in the TeamList
+    Looks up the ranks of all players in the TeamList with add_ranks
     :param team_list: TeamList, a TeamList object containing a list of Teams
-    :return: None, but the Team and player objects inside were modified
+    :param report_teams: Boolean(True), if True every Team is passed to task_queue.report_progress once it is ready
+    :return: TeamList, the same object, the Team and player objects inside were modified
     """
 
     logger.debug("Beginning rank stalking for the team list " + team_list.name)
-    teams = team_list.teams
-    single_tasks = []
-    for team in teams:
-        single_tasks.append(task_queue.SingleTask(add_team_ranks, team))
-
-    task_group = task_queue.TaskGroup(single_tasks, "add ranks to team list")
-    task_queue.submit_task_group(task_group)
+    add_ranks(team_list.teams, task_queue.report_progress if report_teams else None)
+    return team_list
 
 
 def add_team_ranks(team: Team):
     """
-    Calls add_player_rank and calc_average_max_rank on the given Team object
+    Looks up the ranks of all players of the given Team with add_ranks
     :param team: Team, a Team object with a set list of players
     :return: Team, the same object with added ranks for the players and average and max rank for the team
     """
 
     logger.debug("Beginning rank stalking for the team " + team.name)
-    player_list = team.player_list
+    add_ranks([team])
+    return team
+
+
+def add_ranks(teams, on_team_done=None):
+    """
+    Looks up the ranks of all players of the given teams and calculates the rank statistics of every team as soon as
+    it is done, once all teams are done calc_league_stats adds the percentiles.
+    Summoner names are normalized like for the rank cache and every name is looked up only once, even if the player
+    is part of several teams. The names are looked up in parallel in batches for lookup_elos.
+    :param teams: List[Team], Team objects with set lists of players
+    :param on_team_done: function(None), called with every Team as soon as the ranks of all its players are known
+    :return: List[Team], the same objects with added ranks, players whose lookup failed keep their old rank
+    """
+
+    region = config.get_region()
+    # maps every normalized name to the teams the player is part of
+    key_to_teams = {}
+    sum_names = []
+    pending_keys = {}
+    appearances = 0
+    for team in teams:
+        pending_keys[id(team)] = set()
+        for player in team.player_list:
+            appearances += 1
+            key = rank_cache_key(region, player.summoner_name)
+            if key not in key_to_teams:
+                key_to_teams[key] = []
+                sum_names.append(player.summoner_name)
+            if key not in pending_keys[id(team)]:
+                pending_keys[id(team)].add(key)
+                key_to_teams[key].append(team)
+    logger.info(f"Looking up {len(sum_names)} unique players for {appearances} players in {len(teams)} teams, "
+                f"{appearances - len(sum_names)} lookups saved")
+
+    # players of the same team end up in the same batch as long as they are not part of an earlier team
+    batch_size = config.get_multi_search_size()
+    single_tasks = [task_queue.SingleTask(lookup_elos, sum_names[start:start + batch_size])
+                    for start in range(0, len(sum_names), batch_size)]
+    task_group = task_queue.TaskGroup(single_tasks, "add ranks to teams")
+
+    elos = {}
+    finished = set()
+    for index, batch_elos in task_queue.iter_task_group(task_group):
+        for sum_name, elo in batch_elos.items():
+            key = rank_cache_key(region, sum_name)
+            elos[key] = elo
+            for team in key_to_teams[key]:
+                pending_keys[id(team)].discard(key)
+                if len(pending_keys[id(team)]) == 0 and id(team) not in finished:
+                    finished.add(id(team))
+                    _set_team_ranks(team, elos, region, on_team_done)
+
+    # teams whose lookups failed or were cancelled are finished with the ranks that are known
+    for team in teams:
+        if id(team) not in finished:
+            finished.add(id(team))
+            _set_team_ranks(team, elos, region, on_team_done)
+    calc_league_stats(teams)
+    return teams
+
+
+def _set_team_ranks(team, elos, region, on_team_done):
     updated_list = []
-    for player in player_list:
-        updated_list.append(add_player_rank(player))
+    for player in team.player_list:
+        elo = elos.get(rank_cache_key(region, player.summoner_name))
+        updated_list.append(Player(player.summoner_name, build_rank(elo)) if elo is not None else player)
     team.player_list = updated_list
-    team = calc_average_max_rank(team)
-    return team
+    # the percentile needs the whole league, it is set by calc_league_stats once all teams are done
+    _set_team_stats(team, rank_stats.calc_team_stats(_team_ratings(team)))
+    if on_team_done is not None:
+        on_team_done(team)
 
 
 def add_player_rank(player: Player):
@@ -103,93 +493,193 @@ def add_player_rank(player: Player):
     """
 
     sum_name = player.summoner_name
-    elo = stalk_player_opgg(sum_name).lower()
-    if elo in rank_lookup:
-        rating = rank_lookup.get(elo)
-    else:
-        rating = 0
-    rank = Rank(rating_lookup.get(rating), rating)
-    return Player(player.summoner_name, rank)
+    key = rank_cache_key(config.get_region(), sum_name)
+    elo = get_cached_elo(key)
+    if elo is None:
+        elo = lookup_elo(sum_name)
+        if elo is None:
+            # the sources that could have shown a rank failed, that is not certain enough to be cached
+            return Player(player.summoner_name, build_rank(rank_parser.UNRANKED))
+        cache_elo(key, elo)
+    return Player(player.summoner_name, build_rank(elo))
+
+
+@functools.lru_cache(maxsize=4096)
+def build_rank(elo):
+    """
+    Turns an elo into a Rank, ranks are never modified so players with the same elo share one Rank
+    :param elo: int, the elo of a player as parsed by rank_parser
+    :return: Rank, with the rating and the league points of the elo
+    """
+    rating, lp = rank_parser.split_elo(elo)
+    return Rank(rating, lp)
+
+
+def lookup_elos(sum_names):
+    """
+    Looks up the ranks of many players at once. Cached ranks are used first, the others are scraped in batches from
+    the op.gg multi search page and only players missing on that page are looked up one by one with lookup_elo.
+    :param sum_names: List[String], summoner names of the same region
+    :return: Dict[String, int], maps the summoner names to their elo as parsed by rank_parser, names whose lookup
+    failed on every source are left out
+    """
+
+    region = config.get_region()
+    elos = {}
+    misses = []
+    for sum_name in sum_names:
+        elo = get_cached_elo(rank_cache_key(region, sum_name))
+        if elo is None:
+            misses.append(sum_name)
+        else:
+            elos[sum_name] = elo
+
+    batch_size = config.get_multi_search_size()
+    for start in range(0, len(misses), batch_size):
+        batch = misses[start:start + batch_size]
+        try:
+            found = stalk_players_opgg_multi(batch)
+        except task_queue.CommandCancelledError:
+            raise
+        except Exception as exc:
+            logger.warning(f"op.gg multi search for {len(batch)} players failed, looking them up one by one: {exc}")
+            found = {}
+        for sum_name in batch:
+            elo = found.get(rank_cache_key(region, sum_name))
+            if elo is None:
+                try:
+                    elo = lookup_elo(sum_name)
+                except task_queue.CommandCancelledError:
+                    raise
+                except Exception as exc:
+                    # only this player failed, the rest of the batch is kept
+                    logger.warning(f"Looking up {sum_name} failed on every rank source: {exc}")
+                    continue
+            if elo is None:
+                # the sources that could have shown a rank failed, that is not certain enough to be cached
+                elos[sum_name] = rank_parser.UNRANKED
+                continue
+            elos[sum_name] = elo
+            cache_elo(rank_cache_key(region, sum_name), elo)
+    return elos
 
 
 def test_stalk_player(sum_name):
-    print("mobalytics: " + stalk_player_mobalytics(sum_name))
-    print("leagueofgraphs: " + stalk_player_leagueofgraphs(sum_name))
-    print("lolprofile: " + stalk_player_lolprofile(sum_name))
-    print("opgg: " + stalk_player_opgg(sum_name))
+    for source in RANK_PAGES:
+        elo = stalk_player(source, sum_name)
+        print(source + ": " + (rank_parser.elo_name(elo) if elo is not None else "no rank shown"))
 
 
-def stalk_player_lolprofile(sum_name):
+def stalk_player(source, sum_name):
     """
-    Use lolprofile web page to find the the current soloQ ranking for the given summoner name
+    Use the profile page on the given website to find the current soloQ ranking for the given summoner name
+    :param source: String, a key of RANK_PAGES, for example "opgg"
     :param sum_name: Str, the summoner name of a league game account
-    :return: Str, string version of the ranking
+    :return: int, the elo of the player as parsed by rank_parser, None if the page shows no rank
     """
 
-    region = config.get_region()
-    base_url = f"https://lolprofile.net/summoner/{region}/"
-    url = base_url + sum_name.replace(" ", "%20")
-    page = requests.get(url)
-    soup = bs4.BeautifulSoup(page.text, features="html.parser")
-    elo = soup.find('span', class_="tier")
+    page = http_client.get(rank_page_url(source, sum_name))
+    return parse_rank_page(source, page.text)
+
+
+def rank_page_url(source, sum_name):
+    """
+    Builds the url of the profile page of a summoner on the given website
+    :param source: String, a key of RANK_PAGES
+    :param sum_name: Str, the summoner name of a league game account
+    :return: String, the url of the profile page for the region in the config
+    """
+
+    url_template, space, tag, css_class = RANK_PAGES[source]
+    return url_template.format(region=config.get_region(), name=sum_name.replace(" ", space))
+
+
+def parse_rank_page(source, html):
+    """
+    Extracts the soloQ ranking from a profile page of the given website
+    :param source: String, a key of RANK_PAGES
+    :param html: String, the text of a profile page
+    :return: int, the elo of the player as parsed by rank_parser, None if the page shows no rank
+    """
+
+    url_template, space, tag, css_class = RANK_PAGES[source]
+    soup = page_parser.parse(html, tag, class_=css_class)
+    elo = soup.find(tag, class_=css_class)
     if elo is not None:
-        return elo.text
+        return rank_parser.parse_rank(elo.text)
     else:
-        return "Unranked"
+        return None
+
+
+def stalk_player_lolprofile(sum_name):
+    """
+    Use lolprofile web page to find the the current soloQ ranking for the given summoner name
+    :param sum_name: Str, the summoner name of a league game account
+    :return: int, the elo of the player as parsed by rank_parser, None if the page shows no rank
+    """
+
+    return stalk_player("lolprofile", sum_name)
 
 
 def stalk_player_opgg(sum_name):
     """
     Use op.gg web page to find the the current soloQ ranking for the given summoner name
     :param sum_name: Str, the summoner name of a league game account
-    :return: Str, string version of the ranking
+    :return: int, the elo of the player as parsed by rank_parser, None if the page shows no rank
+    """
+
+    return stalk_player("opgg", sum_name)
+
+
+def stalk_players_opgg_multi(sum_names):
+    """
+    Use the op.gg multi search page to find the current soloQ rankings of several summoners with one request
+    :param sum_names: List[String], summoner names, at most as many as the multi search shows
+    :return: Dict[String, int], maps the rank_cache_key of every summoner found on the page to its elo
     """
 
     region = config.get_region()
-    base_url = f"https://{region}.op.gg/summoner/userName="
-    url = base_url + sum_name.replace(" ", "+")
-    page = requests.get(url)
-    soup = bs4.BeautifulSoup(page.text, features="html.parser")
-    elo = soup.find('div', class_="TierRank")
-    if elo is not None:
-        return elo.text
-    else:
-        return "Unranked"
+    base_url = f"https://{region}.op.gg/multi/query="
+    url = base_url + "%2C".join(sum_name.replace(" ", "") for sum_name in sum_names)
+    page = http_client.get(url)
+    return parse_opgg_multi(page.text, region)
+
+
+def parse_opgg_multi(html, region):
+    """
+    Extracts the soloQ ranking of every summoner on an op.gg multi search page
+    :param html: String, the text of a multi search page
+    :param region: String, the region of the page, used for the keys
+    :return: Dict[String, int], maps the rank_cache_key of every summoner on the page to its elo
+    """
+
+    soup = page_parser.parse(html, 'div', class_="MultiSearchResultRow")
+    elos = {}
+    for row in soup.find_all('div', class_="MultiSearchResultRow"):
+        name = row.find(class_="SummonerName")
+        if name is None:
+            continue
+        elo = row.find('div', class_="TierRank")
+        elos[rank_cache_key(region, name.text.strip())] = (rank_parser.parse_rank(elo.text) if elo is not None
+                                                           else rank_parser.UNRANKED)
+    return elos
 
 
 def stalk_player_mobalytics(sum_name):
     """
     Use mobalytics web page to find the the current soloQ ranking for the given summoner name
     :param sum_name: Str, the summoner name of a league game account
-    :return: Str, string version of the ranking
+    :return: int, the elo of the player as parsed by rank_parser, None if the page shows no rank
     """
 
-    region = config.get_region()
-    base_url = f"https://lol.mobalytics.gg/summoner/{region}/"
-    url = base_url + sum_name.replace(" ", "%20")
-    page = requests.get(url)
-    soup = bs4.BeautifulSoup(page.text, features="html.parser")
-    elo = soup.find('p', class_="profilestyles__TierInfoLabel-y97g0w-19 jCyjuF")
-    if elo is not None:
-        return elo.text
-    else:
-        return "Unranked"
+    return stalk_player("mobalytics", sum_name)
 
 
 def stalk_player_leagueofgraphs(sum_name):
     """
     Use leagueofgraphs web page to find the the current soloQ ranking for the given summoner name
     :param sum_name: Str, the summoner name of a league game account
-    :return: Str, string version of the ranking
+    :return: int, the elo of the player as parsed by rank_parser, None if the page shows no rank
     """
 
-    region = config.get_region()
-    base_url = f"https://www.leagueofgraphs.com/summoner/{region}/"
-    url = base_url + sum_name.replace(" ", "+")
-    page = requests.get(url)
-    soup = bs4.BeautifulSoup(page.text, features="html.parser")
-    elo = soup.find('span', class_="leagueTier")
-    if elo is not None:
-        return elo.text
-    else:
-        return "Unranked"
+    return stalk_player("leagueofgraphs", sum_name)
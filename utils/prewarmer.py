@@ -0,0 +1,121 @@
+"""
+Looks up player ranks in the background, so an extended stalk that follows a basic stalk is served from the rank cache.
+After a basic stalk the summoner names are queued with prewarm, a single background thread looks them up batch by
+batch whenever no user command is running, so it never competes with users for the limits of the hosts.
+Tournaments on the watch list are stalked again once per day during the off-peak hours set in the config.
+Everything in this module is disabled unless PREWARM/ENABLED is set.
+:author: Jonathan Decker
+"""
+
+import datetime
+import logging
+import queue
+import threading
+import time
+
+import pytz
+
+from utils import player_lookup
+from utils import scrap_config as config
+from utils import task_queue
+
+logger = logging.getLogger('scrap_logger')
+
+# owner of all commands started by this module, used to tell them apart from user commands
+OWNER = "prewarmer"
+
+_names = queue.Queue()
+_threads = {}
+_threads_lock = threading.Lock()
+
+
+def prewarm(sum_names):
+    """
+    Queues the given summoner names for a background rank lookup, does nothing if prewarming is disabled
+    :param sum_names: List[String], summoner names of the region set in the config
+    :return: None
+    """
+    if not config.get_prewarm_enabled() or len(sum_names) == 0:
+        return
+    batch_size = config.get_multi_search_size()
+    for start in range(0, len(sum_names), batch_size):
+        _names.put(sum_names[start:start + batch_size])
+    logger.debug(f"Queued {len(sum_names)} players for prewarming")
+    _start_thread("prewarmer", _prewarm_loop)
+
+
+def start_watch_list(stalk):
+    """
+    Starts refreshing the tournaments on the watch list once per day during the off-peak hours, calling it again does
+    nothing
+    :param stalk: function, takes a url and stalks it, the names found by it should be passed to prewarm
+    :return: None
+    """
+    if not config.get_prewarm_enabled() or len(config.get_watch_list()) == 0:
+        return
+    _start_thread("watch list", _watch_list_loop, stalk)
+
+
+def user_commands_running():
+    """
+    Checks if any command that was not started by this module is running
+    :return: Boolean, True if a user is waiting for a command
+    """
+    return any(command.owner != OWNER for command in task_queue.active_commands())
+
+
+def is_off_peak(now=None):
+    """
+    Checks if the given time is within the off-peak hours in the time zone of the config
+    :param now: datetime(None), an aware datetime, the current time if not given
+    :return: Boolean, True during the off-peak hours
+    """
+    timezone = pytz.timezone(config.get_timezone())
+    now = (now or datetime.datetime.now(pytz.utc)).astimezone(timezone)
+    start, end = config.get_off_peak_hours()
+    if start <= end:
+        return start <= now.hour < end
+    # the window wraps around midnight
+    return now.hour >= start or now.hour < end
+
+
+def _start_thread(name, target, *args):
+    with _threads_lock:
+        thread = _threads.get(name)
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+            _threads[name] = thread
+            thread.start()
+
+
+def _wait_for_users():
+    # prewarming has the lowest priority, it pauses while any user command is running
+    while user_commands_running():
+        time.sleep(1)
+
+
+def _prewarm_loop():
+    while True:
+        sum_names = _names.get()
+        _wait_for_users()
+        with task_queue.command_scope(f"prewarm {len(sum_names)} players", owner=OWNER):
+            try:
+                player_lookup.lookup_elos(sum_names)
+            except Exception as exc:
+                logger.warning(f"Prewarming {len(sum_names)} players failed: {exc}")
+
+
+def _watch_list_loop(stalk):
+    last_refresh = None
+    while True:
+        today = datetime.datetime.now(pytz.timezone(config.get_timezone())).date()
+        if is_off_peak() and last_refresh != today:
+            last_refresh = today
+            for url in config.get_watch_list():
+                _wait_for_users()
+                logger.info(f"Refreshing {url} from the watch list")
+                try:
+                    stalk(url)
+                except Exception as exc:
+                    logger.warning(f"Refreshing {url} from the watch list failed: {exc}")
+        time.sleep(60)
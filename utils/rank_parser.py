@@ -0,0 +1,107 @@
+"""
+Turns scraped rank texts into numbers and numbers back into texts for the output.
+A rank is kept as a single int, the elo, which packs the rating and the league points:
+
+elo = rating * LP_FACTOR + lp
+
+The rating counts divisions from 1 for Iron 4 up to Challenger, 0 is unranked. Ranks are parsed once when a page is
+scraped, everything after that works with the numbers and rank_name only builds the text when the output is rendered.
+:author: Jonathan Decker
+"""
+
+import re
+
+from utils.lookup_tables import tiers
+
+LP_FACTOR = 10000
+UNRANKED = 0
+
+_DIVISIONS = {"iv": 4, "iii": 3, "ii": 2, "i": 1, "4": 4, "3": 3, "2": 2, "1": 1}
+
+# the first rating of every tier and the display name of every rating
+_tier_start = {}
+_rank_names = ["Unranked"]
+for _tier, _division_count in tiers:
+    _tier_start[_tier] = (len(_rank_names), _division_count)
+    if _division_count == 1:
+        _rank_names.append(_tier.capitalize())
+    else:
+        _rank_names.extend(f"{_tier.capitalize()} {division}" for division in range(_division_count, 0, -1))
+MAX_RATING = len(_rank_names) - 1
+
+# most sources show the plain rank, so those texts skip the pattern
+_plain_ranks = {"unranked": UNRANKED}
+for _tier, (_rating, _division_count) in _tier_start.items():
+    _plain_ranks[_tier] = _rating * LP_FACTOR
+    for _division, _number in _DIVISIONS.items():
+        if _division_count == 1 or _number <= _division_count:
+            _plain_ranks[f"{_tier} {_division}"] = (_rating + max(_division_count - _number, 0)) * LP_FACTOR
+
+# matched against the lower case text with single spaces, longer tier names first so grandmaster is not read as master
+_RANK_PATTERN = re.compile(r"\b(?P<tier>" + "|".join(sorted(_tier_start, key=len, reverse=True)) + r")"
+                           r"(?: ?(?P<division>iv|iii|ii|i|[1-4])\b(?![,.]?\d))?"
+                           r"(?:\D*?(?P<lp>\d[\d,.]*) ?lp\b)?")
+
+
+def parse_rank(text):
+    """
+    Parses the rank text of any rank source, case, whitespace and anything around the rank is ignored
+    :param text: String, scraped text like "Gold 2", "gold ii" or "Emerald 4 45 LP"
+    :return: int, the elo, UNRANKED if the text contains no rank
+    """
+    normalized = " ".join(text.lower().split())
+    elo = _plain_ranks.get(normalized)
+    if elo is not None:
+        return elo
+    match = _RANK_PATTERN.search(normalized)
+    if match is None:
+        return UNRANKED
+
+    tier, division, lp = match.groups()
+    elo = _plain_ranks[tier if division is None else f"{tier} {division}"]
+    if lp is not None:
+        elo += min(int(lp.replace(",", "").replace(".", "")), LP_FACTOR - 1)
+    return elo
+
+
+def parse_stored_elo(value):
+    """
+    Decodes an elo loaded from the rank store, only for stored values since scraped numbers are not elos
+    :param value: int or String, an elo stored as text or a rank text stored by older versions
+    :return: int, the elo
+    """
+    if isinstance(value, int):
+        return value
+    if value.strip().isdigit():
+        return int(value)
+    return parse_rank(value)
+
+
+def split_elo(elo):
+    """
+    Unpacks an elo
+    :param elo: int, an elo as returned by parse_rank
+    :return: (int, int), the rating and the league points
+    """
+    return divmod(elo, LP_FACTOR)
+
+
+def rank_name(rating):
+    """
+    Returns the text of a rating for the output
+    :param rating: int, a rating between 0 and MAX_RATING
+    :return: String, for example "Gold 2", "Master" or "Unranked"
+    """
+    return _rank_names[max(0, min(rating, MAX_RATING))]
+
+
+def elo_name(elo):
+    """
+    Returns the text of an elo for the output
+    :param elo: int, an elo as returned by parse_rank
+    :return: String, the rank name with the league points if there are any, for example "Master 234 LP"
+    """
+    rating, lp = split_elo(elo)
+    if lp > 0:
+        return f"{rank_name(rating)} {lp} LP"
+    return rank_name(rating)
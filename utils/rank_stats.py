@@ -0,0 +1,97 @@
+"""
+Calculates rank statistics for all teams of a league at once.
+The player ratings of all teams are kept in one array with a row per team, so mean, median, max, top 3 average,
+standard deviation and the league percentile of every team are calculated in one pass over the array.
+NumPy is used if it is installed, otherwise the same statistics are calculated team by team in python.
+:author: Jonathan Decker
+"""
+
+import bisect
+import collections
+import itertools
+import math
+import statistics
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# ratings are divisions as in rank_parser, percentile is None for teams without ranked players
+TeamStats = collections.namedtuple("TeamStats", ["mean", "median", "max", "top3", "deviation", "percentile"])
+
+
+def calc_stats(rating_rows):
+    """
+    Calculates the rank statistics of many teams, ratings of 0 or less are unranked players and are left out
+    :param rating_rows: List[List[int]], the player ratings of every team
+    :return: List[TeamStats], the statistics in the order of the given teams, the percentile is the share of teams
+    with ranked players whose mean is not higher than the mean of the team
+    """
+    if len(rating_rows) == 0:
+        return []
+    if numpy is None:
+        return _calc_stats_python(rating_rows)
+    return _calc_stats_numpy(rating_rows)
+
+
+def calc_team_stats(ratings):
+    """
+    Calculates the rank statistics of a single team in python, a team is too small to be worth the NumPy arrays
+    :param ratings: List[int], the player ratings of the team
+    :return: TeamStats, the percentile is None since it needs the whole league
+    """
+    return _calc_stats_python([ratings])[0]._replace(percentile=None)
+
+
+def _calc_stats_numpy(rating_rows):
+    counts = numpy.fromiter(map(len, rating_rows), dtype=numpy.int64, count=len(rating_rows))
+    total = int(counts.sum())
+    width = max(int(counts.max()), 1)
+
+    # scatter all ratings into a zero padded matrix with a row per team
+    flat = numpy.fromiter(itertools.chain.from_iterable(rating_rows), dtype=numpy.float64, count=total)
+    rows = numpy.repeat(numpy.arange(len(rating_rows)), counts)
+    columns = numpy.arange(total) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    ratings = numpy.zeros((len(rating_rows), width))
+    ratings[rows, columns] = numpy.maximum(flat, 0)
+
+    ranked = ratings > 0
+    count = ranked.sum(axis=1)
+    divisor = numpy.maximum(count, 1)
+    # ranked players come first in every row
+    ordered = -numpy.sort(-ratings, axis=1)
+
+    mean = ratings.sum(axis=1) / divisor
+    maximum = ordered[:, 0]
+    top3 = ordered[:, :3].sum(axis=1) / numpy.minimum(divisor, 3)
+    lower = numpy.maximum((count - 1) // 2, 0)[:, None]
+    upper = numpy.minimum(count // 2, width - 1)[:, None]
+    median = (numpy.take_along_axis(ordered, lower, axis=1) + numpy.take_along_axis(ordered, upper, axis=1))[:, 0] / 2
+    deviation = numpy.sqrt(numpy.where(ranked, (ratings - mean[:, None]) ** 2, 0).sum(axis=1) / divisor)
+
+    ranked_teams = count > 0
+    league = numpy.sort(mean[ranked_teams])
+    percentile = numpy.searchsorted(league, mean, side="right") * 100 / max(len(league), 1)
+
+    columns = zip(mean.tolist(), median.tolist(), maximum.tolist(), top3.tolist(), deviation.tolist(),
+                  percentile.tolist())
+    return [TeamStats(*values) if has_ranks else TeamStats(*values[:5], None)
+            for values, has_ranks in zip(columns, ranked_teams.tolist())]
+
+
+def _calc_stats_python(rating_rows):
+    team_stats = []
+    for row in rating_rows:
+        ratings = sorted((rating for rating in row if rating > 0), reverse=True)
+        if len(ratings) == 0:
+            team_stats.append(TeamStats(0.0, 0.0, 0.0, 0.0, 0.0, None))
+            continue
+        mean = sum(ratings) / len(ratings)
+        deviation = math.sqrt(sum((rating - mean) ** 2 for rating in ratings) / len(ratings))
+        team_stats.append(TeamStats(mean, float(statistics.median(ratings)), float(ratings[0]),
+                                    sum(ratings[:3]) / len(ratings[:3]), deviation, None))
+
+    league = sorted(stats.mean for stats in team_stats if stats.max > 0)
+    return [stats._replace(percentile=bisect.bisect_right(league, stats.mean) * 100 / len(league))
+            if stats.max > 0 else stats for stats in team_stats]
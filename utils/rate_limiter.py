@@ -0,0 +1,189 @@
+"""
+Limits outbound requests per host, shared by all running commands.
+Each host gets a HostLimiter that caps the number of requests in flight and spaces requests with a token bucket.
+Worker threads and the coroutines of the async_engine take their slots from the same limiter, so both together never
+have more requests in flight than the host allows.
+The limits are read from the RATELIMIT section of the config, use limit(url) around every request to a web page:
+
+with rate_limiter.limit(url):
+    page = requests.get(url)
+
+:author: Jonathan Decker
+"""
+
+import contextlib
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+from utils import scrap_config as config
+from utils import task_queue
+
+logger = logging.getLogger('scrap_logger')
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class HostLimiter:
+    """
+    Caps parallel requests and requests per second for one host and counts the time callers spent waiting
+    """
+
+    def __init__(self, name, max_in_flight, requests_per_second):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.requests_per_second = requests_per_second
+        self._lock = threading.Lock()
+        self._slot_freed = threading.Condition(self._lock)
+        # futures of coroutines waiting for a slot, with the loop they are waiting on
+        self._async_waiters = []
+        # the bucket may hold up to one second worth of requests
+        self._capacity = max(1.0, requests_per_second)
+        self._tokens = self._capacity
+        self._last_refill = time.monotonic()
+        self.requests = 0
+        self.in_flight = 0
+        self.wait_time = 0.0
+
+    def __str__(self):
+        return (f"{self.name}: {self.requests} requests, {self.in_flight} in flight, "
+                f"{self.wait_time:.2f} secs waited on the limiter")
+
+    def take_token(self):
+        """
+        Takes one token from the bucket
+        :return: float, 0 if a token was taken or the time to wait before trying again
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._last_refill) * self.requests_per_second)
+            self._last_refill = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.requests_per_second
+
+    def acquire(self):
+        """
+        Blocks until a request to the host is allowed
+        :return: float, the time spent waiting in secs
+        """
+        start_time = time.perf_counter()
+        with self._slot_freed:
+            while self.in_flight >= self.max_in_flight:
+                self._slot_freed.wait()
+            self.in_flight += 1
+        if self.requests_per_second > 0:
+            delay = self.take_token()
+            while delay > 0:
+                time.sleep(delay)
+                delay = self.take_token()
+        waited = time.perf_counter() - start_time
+        self.record_wait(waited)
+        return waited
+
+    def take_slot(self, loop):
+        """
+        Takes a request slot without blocking, used by coroutines that can not wait on a lock
+        :param loop: asyncio.AbstractEventLoop, the loop of the calling coroutine
+        :return: asyncio.Future, None if a slot was taken, otherwise a future that is done once a slot was released,
+        then try again
+        """
+        with self._lock:
+            if self.in_flight < self.max_in_flight:
+                self.in_flight += 1
+                return None
+            waiter = loop.create_future()
+            self._async_waiters.append((loop, waiter))
+            return waiter
+
+    def record_wait(self, waited):
+        """
+        Counts a request that was let through after waiting for the given time
+        :param waited: float, the time spent waiting in secs
+        :return: None
+        """
+        with self._lock:
+            self.requests += 1
+            self.wait_time += waited
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._slot_freed.notify()
+            # waiting coroutines all try again, the ones that do not get the slot wait for the next release
+            async_waiters = self._async_waiters
+            self._async_waiters = []
+        for loop, waiter in async_waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def match_rule(host, rules):
+    """
+    Finds the config rule for a host, "op.gg" and "*.op.gg" both match any subdomain of op.gg
+    :param host: String, the hostname of a url
+    :param rules: Iterable[String], the hosts that have limits configured
+    :return: String, the longest matching rule or None
+    """
+    best = None
+    for rule in rules:
+        domain = rule[2:] if rule.startswith("*.") else rule
+        if host == domain or host.endswith("." + domain):
+            if best is None or len(rule) > len(best):
+                best = rule
+    return best
+
+
+def get_limiter(url):
+    """
+    Returns the HostLimiter responsible for the given url, limiters are created on first use
+    :param url: String, any valid url
+    :return: HostLimiter, shared by all requests to the same configured host
+    """
+    host = (urlsplit(url).hostname or "").lower()
+    rules = config.get_rate_limits()
+    rule = match_rule(host, rules)
+    key = rule if rule is not None else host
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            max_in_flight, requests_per_second = rules.get(rule, config.get_default_rate_limit())
+            limiter = HostLimiter(key, max_in_flight, requests_per_second)
+            _limiters[key] = limiter
+            logger.debug(f"Created rate limiter for {key} with {max_in_flight} parallel requests "
+                         f"and {requests_per_second} requests per second")
+    return limiter
+
+
+@contextlib.contextmanager
+def limit(url):
+    """
+    Context manager that holds a request slot for the host of the given url
+    :param url: String, the url that is about to be requested
+    :return: HostLimiter, the limiter of the host
+    """
+    limiter = get_limiter(url)
+    waited = limiter.acquire()
+    command = task_queue.current_command()
+    if command is not None:
+        command.add_limiter_wait(waited)
+    try:
+        yield limiter
+    finally:
+        limiter.release()
+
+
+def get_stats():
+    """
+    Returns a summary of all host limiters
+    :return: List[String], one line per host
+    """
+    with _limiters_lock:
+        return [str(limiter) for limiter in _limiters.values()]
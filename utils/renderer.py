@@ -0,0 +1,84 @@
+"""
+Renders stalk results piece by piece instead of as one big string.
+The models yield their output one team at a time with render_pieces, iter_chunks packs those pieces into messages
+that fit into discord and write_pieces streams them into a file, so the output of a big league is never built and
+split again as a whole.
+:author: Jonathan Decker
+"""
+
+from models import Team
+
+# discord rejects messages with more characters
+MESSAGE_SIZE = 2000
+
+
+def render_pieces(results, extended=False, discord_format=True):
+    """
+    Yields the output for a stalk result piece by piece
+    :param results: TeamListList, TeamList, Team or String, the result of a stalker or a message
+    :param extended: Boolean(False), if True the player ranks are included
+    :param discord_format: Boolean(True), if True the output is formatted for discord chat
+    :return: Iterator[String], joined they are the output of the matching string method of the result
+    """
+    if isinstance(results, str):
+        yield results
+    elif isinstance(results, Team):
+        yield results.render(extended, discord_format)
+    else:
+        yield from results.render_pieces(extended, discord_format)
+
+
+def iter_chunks(pieces, chunk_size=MESSAGE_SIZE):
+    """
+    Packs the lines of the given pieces into chunks of at most chunk_size characters. Chunks end at line breaks,
+    only a line longer than chunk_size is cut. Every line is only copied once, so this takes linear time.
+    :param pieces: Iterable[String], the pieces of a text, for example from render_pieces
+    :param chunk_size: int(MESSAGE_SIZE), the maximum length of a chunk
+    :return: Iterator[String], the chunks without the line breaks between them, chunks with only whitespace are
+    skipped as discord does not send them
+    """
+    chunk = []
+    # length of the chunk with the line breaks between its lines
+    length = -1
+    for line in _iter_lines(pieces):
+        if length + 1 + len(line) > chunk_size:
+            if chunk:
+                yield from _non_empty("\n".join(chunk))
+            while len(line) > chunk_size:
+                yield from _non_empty(line[:chunk_size])
+                line = line[chunk_size:]
+            chunk = []
+            length = -1
+        chunk.append(line)
+        length += 1 + len(line)
+    yield from _non_empty("\n".join(chunk))
+
+
+def write_pieces(pieces, file):
+    """
+    Writes the given pieces into a file one after another
+    :param pieces: Iterable[String], the pieces of a text, for example from render_pieces
+    :param file: a text file or io.StringIO
+    :return: String, the first line of the text, for example to name the file
+    """
+    title = None
+    for piece in pieces:
+        if title is None:
+            title = piece.split("\n", 1)[0]
+        file.write(piece)
+    return title or ""
+
+
+def _iter_lines(pieces):
+    rest = ""
+    for piece in pieces:
+        lines = piece.split("\n")
+        lines[0] = rest + lines[0]
+        rest = lines.pop()
+        yield from lines
+    yield rest
+
+
+def _non_empty(chunk):
+    if chunk.strip():
+        yield chunk
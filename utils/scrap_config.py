@@ -10,6 +10,7 @@ import logging
 import shutil
 import functools
 import pytz
+import os
 from os import environ
 
 
@@ -66,6 +67,25 @@ def load_config(file='config.ini', delete_config=False):
 config = load_config()
 
 
+def get_snapshot():
+    """
+    Returns the live config as dict, used to hand the config to worker processes
+    :return: Dict[String, Dict[String, String]], the options of each section
+    """
+
+    return {section: dict(config.items(section, raw=True)) for section in config.sections()}
+
+
+def apply_snapshot(snapshot):
+    """
+    Updates the live config with a snapshot from get_snapshot without writing the config file
+    :param snapshot: Dict[String, Dict[String, String]], the options of each section
+    :return: None, but config is updated
+    """
+
+    config.read_dict(snapshot)
+
+
 def update_config(func):
     """
     Wrapper that updates the config file with the live config
@@ -155,6 +175,312 @@ def get_timezone():
     return config["GENERAL"]["TIMEZONE"]
 
 
+@try_config()
+def get_max_workers():
+    """
+    Returns the size of the worker pool shared by all TaskGroups
+    :return: int, the maximum number of worker threads, 20 if not set in the config
+    """
+
+    return config.getint("TASKQUEUE", "MAX_WORKERS", fallback=20)
+
+
+def parse_rate_limit(value):
+    """
+    Parses a rate limit option
+    :param value: String, formatted as "parallel requests, requests per second"
+    :return: (int, float), the maximum requests in flight and the requests per second
+    """
+
+    max_in_flight, requests_per_second = value.split(",")
+    return int(max_in_flight), float(requests_per_second)
+
+
+@try_config()
+def get_default_rate_limit():
+    """
+    Returns the rate limit for hosts without their own entry
+    :return: (int, float), the maximum requests in flight and the requests per second, (10, 10.0) if not set
+    """
+
+    return parse_rate_limit(config.get("RATELIMIT", "DEFAULT", fallback="10, 10"))
+
+
+@try_config()
+def get_rate_limits():
+    """
+    Returns the rate limits for all hosts with their own entry
+    :return: Dict[String, (int, float)], maps the host to its maximum requests in flight and requests per second
+    """
+
+    if not config.has_section("RATELIMIT"):
+        return {}
+    return {host: parse_rate_limit(value) for host, value in config.items("RATELIMIT") if host != "default"}
+
+
+@try_config()
+def get_command_timeout():
+    """
+    Returns the time a single user command may run before it is cancelled
+    :return: float, secs until a command is cancelled, 0 for no limit, 900.0 if not set
+    """
+
+    return config.getfloat("TASKQUEUE", "COMMAND_TIMEOUT", fallback=900)
+
+
+@try_config()
+def get_cancel_grace():
+    """
+    Returns the time running tasks get to finish after their command was cancelled
+    :return: float, secs to wait for running tasks, 5.0 if not set
+    """
+
+    return config.getfloat("TASKQUEUE", "CANCEL_GRACE", fallback=5)
+
+
+@try_config()
+def get_engine():
+    """
+    Returns the engine used to fetch many pages at once
+    :return: String, "threads" or "async", "threads" if not set
+    """
+
+    return config.get("TASKQUEUE", "ENGINE", fallback="threads").lower()
+
+
+@try_config()
+def get_parse_processes():
+    """
+    Returns the number of processes used to parse pages, 1 parses pages on the worker threads without a process pool
+    :return: int, "auto" is one process per cpu core, so a single core parses on the threads, 1 if not set
+    """
+
+    value = config.get("TASKQUEUE", "PARSE_PROCESSES", fallback="1").strip().lower()
+    if value == "auto":
+        return os.cpu_count() or 1
+    return int(value)
+
+
+@try_config()
+def get_parser_backend():
+    """
+    Returns the parser BeautifulSoup uses for scraped pages
+    :return: String, "lxml" or "html.parser", "lxml" if not set
+    """
+
+    return config.get("PARSER", "BACKEND", fallback="lxml").lower()
+
+
+@try_config()
+def get_async_max_connections():
+    """
+    Returns the maximum number of open connections of the async engine
+    :return: int, 100 if not set
+    """
+
+    return config.getint("TASKQUEUE", "ASYNC_MAX_CONNECTIONS", fallback=100)
+
+
+@try_config()
+def get_http_timeouts():
+    """
+    Returns the connect and read timeout used for http requests
+    :return: (float, float), the connect and the read timeout in secs, (5.0, 30.0) if not set
+    """
+
+    connect_timeout = config.getfloat("HTTP", "CONNECT_TIMEOUT", fallback=5)
+    read_timeout = config.getfloat("HTTP", "READ_TIMEOUT", fallback=30)
+    return connect_timeout, read_timeout
+
+
+@try_config()
+def get_http_retry_settings():
+    """
+    Returns the retry settings for failed http requests
+    :return: (int, float, float), the maximum attempts per request and the base and maximum delay between attempts in
+    secs, (3, 0.5, 30.0) if not set
+    """
+
+    max_attempts = config.getint("HTTP", "MAX_ATTEMPTS", fallback=3)
+    base_delay = config.getfloat("HTTP", "BACKOFF_BASE", fallback=0.5)
+    max_delay = config.getfloat("HTTP", "BACKOFF_MAX", fallback=30)
+    return max_attempts, base_delay, max_delay
+
+
+@try_config()
+def get_circuit_breaker_settings():
+    """
+    Returns the settings of the circuit breaker for each host
+    :return: (int, float), the failures in a row that open the breaker and the secs until a trial request is let
+    through, (5, 30.0) if not set
+    """
+
+    failure_threshold = config.getint("HTTP", "BREAKER_THRESHOLD", fallback=5)
+    reset_timeout = config.getfloat("HTTP", "BREAKER_RESET", fallback=30)
+    return failure_threshold, reset_timeout
+
+
+@try_config()
+def get_pooled_hosts():
+    """
+    Returns the number of hosts that keep a pool of open connections
+    :return: int, 10 if not set
+    """
+
+    return config.getint("HTTP", "POOLED_HOSTS", fallback=10)
+
+
+@try_config()
+def get_rank_cache_settings():
+    """
+    Returns the settings of the player rank cache
+    :return: (int, float, String), the maximum number of cached players, the time in secs until a cached rank expires
+    and the SQLite file to keep ranks across restarts or an empty string to only cache in memory
+    """
+
+    max_size = config.getint("RANKCACHE", "MAX_SIZE", fallback=10000)
+    ttl = config.getfloat("RANKCACHE", "TTL", fallback=3600)
+    db_file = config.get("RANKCACHE", "DB_FILE", fallback="")
+    return max_size, ttl, db_file
+
+
+@try_config()
+def get_negative_cache_settings():
+    """
+    Returns the settings of the cache for unranked and unknown players
+    :return: (float, int, float), the time in secs until an unranked player is looked up again, the number of players
+    kept per half of that time and the accepted chance that a ranked player is taken for an unranked one
+    """
+
+    ttl = config.getfloat("RANKCACHE", "NEGATIVE_TTL", fallback=1800)
+    capacity = config.getint("RANKCACHE", "NEGATIVE_CAPACITY", fallback=1000000)
+    error_rate = config.getfloat("RANKCACHE", "NEGATIVE_ERROR_RATE", fallback=0.001)
+    return ttl, capacity, error_rate
+
+
+@try_config()
+def get_result_cache_settings():
+    """
+    Returns the settings of the cache for whole stalk results
+    :return: (int, float), the maximum number of cached results and the time in secs until a result expires
+    """
+
+    max_size = config.getint("RESULTCACHE", "MAX_SIZE", fallback=50)
+    ttl = config.getfloat("RESULTCACHE", "TTL", fallback=600)
+    return max_size, ttl
+
+
+@try_config()
+def get_multi_search_size():
+    """
+    Returns how many players are looked up at once on the op.gg multi search page
+    :return: int, the number of summoner names per multi search, 5 if not set
+    """
+
+    return config.getint("PLAYERLOOKUP", "MULTI_SEARCH_SIZE", fallback=5)
+
+
+@try_config()
+def get_rank_sources():
+    """
+    Returns the websites player ranks are looked up on
+    :return: List[String], the sources in order of priority, only op.gg if not set
+    """
+
+    value = config.get("PLAYERLOOKUP", "SOURCES", fallback="opgg")
+    return [source.strip().lower() for source in value.split(",") if source.strip()]
+
+
+@try_config()
+def get_hedge_settings():
+    """
+    Returns when a slow rank lookup is sent to the next source as well
+    :return: (float, float), the latency percentile of a source after which the next source is asked and the delay
+    used while a source has too few samples, 90 and 1.5 secs if not set
+    """
+
+    percentile = config.getfloat("PLAYERLOOKUP", "HEDGE_PERCENTILE", fallback=90)
+    default_delay = config.getfloat("PLAYERLOOKUP", "HEDGE_DELAY", fallback=1.5)
+    return percentile, default_delay
+
+
+@try_config()
+def get_webdriver_pool_settings():
+    """
+    Returns the settings of the pool of Firefox drivers used by the stalkers that need a browser
+    :return: (int, int, int), the maximum number of drivers, the number of stalks after which a driver is replaced and
+    the number of drivers launched in advance, 2, 20 and 1 if not set
+    """
+
+    size = config.getint("WEBDRIVER", "POOL_SIZE", fallback=2)
+    max_uses = config.getint("WEBDRIVER", "MAX_USES", fallback=20)
+    prelaunch = config.getint("WEBDRIVER", "PRELAUNCH", fallback=1)
+    return max(1, size), max(1, max_uses), min(prelaunch, size)
+
+
+@try_config()
+def get_webdriver_wait_timeout():
+    """
+    Returns how long stalkers wait for the elements they need on a page loaded by a web driver
+    :return: float, secs, 20 if not set
+    """
+
+    return config.getfloat("WEBDRIVER", "WAIT_TIMEOUT", fallback=20)
+
+
+@try_config()
+def get_webdriver_blocked_resources():
+    """
+    Returns the resources headless web drivers do not load
+    :return: List[String], some of images, fonts, stylesheets and trackers, all of them if not set
+    """
+
+    value = config.get("WEBDRIVER", "BLOCK", fallback="images, fonts, stylesheets, trackers")
+    return [resource.strip().lower() for resource in value.split(",") if resource.strip()]
+
+
+@try_config()
+def get_prewarm_enabled():
+    """
+    Returns if player ranks are looked up in the background after basic stalks and for the watch list
+    :return: Boolean, False if not set
+    """
+
+    return config.getboolean("PREWARM", "ENABLED", fallback=False)
+
+
+@try_config()
+def get_watch_list():
+    """
+    Returns the tournaments that are stalked again once per day during the off-peak hours
+    :return: List[String], urls of tournaments, empty if not set
+    """
+
+    value = config.get("PREWARM", "WATCH_LIST", fallback="")
+    return [url.strip() for url in value.split(",") if url.strip()]
+
+
+@try_config()
+def get_off_peak_hours():
+    """
+    Returns the hours in the time zone of the config during which the watch list is refreshed
+    :return: (int, int), the first hour and the hour after the last one, 3 to 6 if not set
+    """
+
+    start, end = config.get("PREWARM", "OFF_PEAK_HOURS", fallback="3-6").split("-")
+    return int(start), int(end)
+
+
+@try_config()
+def get_progressive_output():
+    """
+    Returns if the discord bot posts teams while a stalk is still running
+    :return: Boolean, True if not set
+    """
+
+    return config.getboolean("DISCORD", "PROGRESSIVE_OUTPUT", fallback=True)
+
+
 @update_config
 @try_config(is_getter=False)
 def blank_setter(section, option, value):
@@ -2,24 +2,55 @@
 Offers multi threading functionality, simply import SingleTask, TaskGroup and submit_task_group,
 create a list of SingleTasks with the function as the first arg and the args for that function as the other args.
 Now create a TaskGroup from that list and use it as a parameter for submit_task_group.
-This will run each SingleTask as an individual Thread and submit_task_group will return a list with the results for each
-SingleTask.
+This will run each SingleTask on a worker of the process wide thread pool and submit_task_group will return a list with
+the results for each SingleTask. iter_task_group instead yields each result together with the index of its task as soon
+as it is ready.
+
+All TaskGroups share one pool whose size is set in the config. A thread waiting on its TaskGroup does not just block,
+it runs the tasks of its group that no worker has picked up yet, so nested TaskGroups can not deadlock the pool.
+Work can be accounted per command by wrapping it in command_scope, tasks can hand partial results to the listener of
+their command with report_progress.
 :author: Jonathan Decker
 """
 import concurrent.futures
+import contextlib
+import contextvars
+import inspect
+import multiprocessing
+import queue
+import random
+import threading
+import time
 from typing import List
 import logging
 import traceback
 
+from utils import scrap_config as config
+
 logger = logging.getLogger('scrap_logger')
 
+_executor = None
+_executor_lock = threading.Lock()
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+_current_command = contextvars.ContextVar("task_queue_command", default=None)
+# nesting depth of the TaskGroup a task belongs to, used to give inner groups less time to wind down on cancellation
+_group_depth = contextvars.ContextVar("task_queue_group_depth", default=0)
+_active_commands = []
+_active_commands_lock = threading.Lock()
+
 
 class SingleTask:
 
-    def __init__(self, func, *args):
+    def __init__(self, func, *args, retry=None):
         self.func_pos0 = []
         self.args = args
         self.func_pos0.append(func)
+        self.retry = retry
+        self.future = concurrent.futures.Future()
+        self._claim_lock = threading.Lock()
+        self._claimed = False
 
     def __str__(self):
         return str(self.args)
@@ -27,9 +58,47 @@ class SingleTask:
     def execute(self):
         func = self.func_pos0[0]
         arguments = self.args
-        result = func(*arguments)
+        if self.retry is not None:
+            result = self.retry.call(func, *arguments)
+        else:
+            result = func(*arguments)
+        # coroutine functions are run on the async engine, imported here since the engine builds on task_queue
+        if inspect.isawaitable(result):
+            from utils import async_engine
+            result = async_engine.run(result)
         return result
 
+    def claim(self):
+        """
+        Marks the task as taken, only the first caller gets True so every task is executed exactly once
+        :return: Boolean, True if the caller is now responsible for running the task
+        """
+        with self._claim_lock:
+            if self._claimed:
+                return False
+            self._claimed = True
+            return True
+
+    def run(self, inline=False):
+        """
+        Executes the task and stores the result or the exception in the tasks future
+        :param inline: Boolean(False), True if the task is run by the thread waiting on its TaskGroup
+        :return: None, but the future of the task is resolved
+        """
+        command = _current_command.get()
+        start_time = time.perf_counter()
+        try:
+            check_cancelled()
+            result = self.execute()
+        except BaseException as exc:
+            self.future.set_exception(exc)
+            if command is not None:
+                command.record(time.perf_counter() - start_time, inline, failed=True)
+        else:
+            self.future.set_result(result)
+            if command is not None:
+                command.record(time.perf_counter() - start_time, inline)
+
 
 class TaskGroup:
 
@@ -39,34 +108,485 @@ class TaskGroup:
         self.name = name
 
 
-def submit_task_group(tg: TaskGroup, max_workers=20):
+class RetryPolicy:
+    """
+    Retries a function on the given exceptions with exponential backoff and full jitter. An exception with a
+    retry_after attribute, for example from a Retry-After header, sets the minimum delay before the next attempt.
+    """
+
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=30.0, retry_on=(Exception, )):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Returns the time to wait after the given failed attempt
+        :param attempt: int, the number of the failed attempt starting at 1
+        :param retry_after: float(None), the delay requested by the server in secs
+        :return: float, the delay in secs or None if the requested delay is longer than max_delay
+        """
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            if retry_after > self.max_delay:
+                return None
+            backoff = max(backoff, retry_after)
+        return backoff
+
+    def call(self, func, *args):
+        """
+        Calls func with args until it succeeds, raises an exception not covered by retry_on or runs out of attempts
+        :param func: function, the function to call
+        :param args: the arguments for func
+        :return: the result of func
+        """
+        attempt = 1
+        while True:
+            try:
+                return func(*args)
+            except CommandCancelledError:
+                raise
+            except self.retry_on as exc:
+                delay = self.delay(attempt, getattr(exc, "retry_after", None))
+                command = _current_command.get()
+                remaining = command.remaining() if command is not None else None
+                # a retry that can not happen before the deadline is not worth waiting for
+                if attempt >= self.max_attempts or delay is None or (remaining is not None and delay >= remaining):
+                    raise
+                logger.debug(f"Attempt {attempt} of {func.__name__}{args} failed with {exc!r}, "
+                             f"retrying in {delay:.2f} secs")
+                if command is not None:
+                    command.add_retry()
+                time.sleep(delay)
+                attempt += 1
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised when a call is rejected because the circuit breaker is open
+    """
+    pass
+
+
+class CircuitBreaker:
+    """
+    Fails fast after failure_threshold consecutive failures. Once reset_timeout secs have passed a single trial call is
+    let through, if it succeeds the breaker closes again, otherwise it stays open for another reset_timeout.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        state = "closed" if self.opened_at is None else "open"
+        return f"{self.name}: {state}, {self.failures} failures in a row, {self.rejected} calls rejected"
+
+    def before_call(self):
+        """
+        Checks if a call may be made, must be followed by record_success, record_failure or record_abort
+        :return: None, raises CircuitOpenError if the call is rejected
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if not self.trial_running and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.trial_running = True
+                logger.info(f"Circuit breaker {self.name} lets a trial call through")
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f"{self.name} is failing, calls are rejected for up to {self.reset_timeout} secs")
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"Circuit breaker {self.name} has closed")
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_running or (self.opened_at is None and self.failures >= self.failure_threshold):
+                if self.opened_at is None:
+                    logger.warning(f"Circuit breaker {self.name} has opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+                self.trial_running = False
+
+    def record_abort(self):
+        # the call ended without an answer from the host, for example it was cancelled, so the next call is the trial
+        with self._lock:
+            self.trial_running = False
+
+
+class CommandCancelledError(Exception):
+    """
+    Raised when work is started for a command that was cancelled or ran out of time
+    """
+    pass
+
+
+class Command:
+    """
+    Collects statistics for all tasks that were run on behalf of one user command, also carries its deadline and
+    cancellation. Once a command is cancelled no new tasks are started and waiting TaskGroups return what they have.
+    """
+
+    def __init__(self, name, listener=None, owner=None, timeout=None):
+        self.name = name
+        self.listener = listener
+        self.owner = owner
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.incomplete = False
+        self._cancelled_at = None
+        self.start_time = time.perf_counter()
+        self.submitted = 0
+        self.finished = 0
+        self.failed = 0
+        self.inline = 0
+        self.busy_time = 0.0
+        self.limiter_wait = 0.0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        run_time = time.perf_counter() - self.start_time
+        return (f"{self.name}: {self.finished}/{self.submitted} tasks finished, {self.failed} failed, "
+                f"{self.inline} run by waiting threads, {self.busy_time:.2f} secs busy in {run_time:.2f} secs, "
+                f"{self.limiter_wait:.2f} secs waited on rate limits, {self.retries} retries")
+
+    def cancel(self):
+        """
+        Cancels the command, tasks that have not started yet are skipped
+        :return: None
+        """
+        with self._lock:
+            if self._cancelled_at is None:
+                self._cancelled_at = time.monotonic()
+        logger.info(f"{self.name} has been cancelled")
+
+    def cancelled_at(self):
+        """
+        Returns when the command was cancelled, running past the deadline counts as being cancelled
+        :return: float, a time.monotonic timestamp or None if the command was not cancelled
+        """
+        if self._cancelled_at is not None:
+            return self._cancelled_at
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return self.deadline
+        return None
+
+    @property
+    def cancelled(self):
+        return self.cancelled_at() is not None
+
+    @property
+    def cancelled_early(self):
+        # cancelled before its deadline, for example by its owner
+        return self._cancelled_at is not None and (self.deadline is None or self._cancelled_at < self.deadline)
+
+    def remaining(self):
+        """
+        Returns the time left until the deadline
+        :return: float, secs until the deadline, 0 if cancelled and None if there is no deadline
+        """
+        if self.cancelled:
+            return 0.0
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def add_submitted(self, count):
+        with self._lock:
+            self.submitted += count
+
+    def add_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def add_limiter_wait(self, wait_time):
+        with self._lock:
+            self.limiter_wait += wait_time
+
+    def record(self, run_time, inline, failed=False):
+        with self._lock:
+            self.finished += 1
+            self.busy_time += run_time
+            if inline:
+                self.inline += 1
+            if failed:
+                self.failed += 1
+
+
+@contextlib.contextmanager
+def command_scope(name, listener=None, owner=None, timeout=None):
+    """
+    Context manager that accounts all TaskGroups submitted inside of it, including nested ones, to one Command
+    :param name: String, name of the command used in the logs
+    :param listener: function(None), called with every partial result passed to report_progress inside of the scope
+    :param owner: any(None), identifies who may cancel the command, for example a discord user id
+    :param timeout: float(None), secs until the command is cancelled, None for no deadline
+    :return: Command, the statistics object of the command
+    """
+    command = Command(name, listener, owner, timeout)
+    token = _current_command.set(command)
+    with _active_commands_lock:
+        _active_commands.append(command)
+    try:
+        yield command
+    finally:
+        _current_command.reset(token)
+        with _active_commands_lock:
+            _active_commands.remove(command)
+        logger.info(str(command))
+
+
+def current_command():
+    """
+    Returns the Command the calling thread is working for
+    :return: Command, or None if called outside of a command_scope
     """
-    Submits all tasks in the given TaskGroup to a ThreadPoolExecutor and returns the merged results
+    return _current_command.get()
+
+
+def check_cancelled():
+    """
+    Raises CommandCancelledError if the current command was cancelled or ran out of time, long running work should
+    call this between steps
+    :return: None
+    """
+    command = _current_command.get()
+    if command is not None and command.cancelled:
+        raise CommandCancelledError(f"{command.name} was cancelled")
+
+
+def wait_timeout(command, poll_interval=0.5):
+    """
+    Returns how long a TaskGroup of the current nesting depth may block before it has to check on its command again
+    :param command: Command, the current command or None
+    :param poll_interval: float(0.5), secs between checks for a cancellation
+    :return: float, secs to block, None to block until the next result and 0 if the group has to stop waiting
+    """
+    if command is None:
+        return None
+    cancelled_at = command.cancelled_at()
+    if cancelled_at is None:
+        return poll_interval
+    # after a cancellation running tasks get a grace period to finish, inner groups get less so the outer groups
+    # still receive their partial results
+    grace = config.get_cancel_grace() / (_group_depth.get() + 1)
+    return max(0.0, cancelled_at + grace - time.monotonic())
+
+
+def report_progress(item):
+    """
+    Hands a partial result, like a finished Team or TeamList, to the listener of the current command
+    :param item: any object, the partial result
+    :return: None
+    """
+    command = _current_command.get()
+    if command is not None and command.listener is not None:
+        try:
+            command.listener(item)
+        except Exception as exc:
+            logger.error(f"Progress listener of {command.name} generated an exception: {exc}")
+
+
+@contextlib.contextmanager
+def progress_paused():
+    """
+    Context manager that drops all partial results reported inside of it, for example while an extended stalk is
+    still collecting teams without ranks
+    :return: None
+    """
+    command = _current_command.get()
+    listener = command.listener if command is not None else None
+    if listener is not None:
+        command.listener = None
+    try:
+        yield
+    finally:
+        if listener is not None:
+            command.listener = listener
+
+
+def active_commands():
+    """
+    Returns all commands which are currently running
+    :return: List[Command], a copy of the list of running commands
+    """
+    with _active_commands_lock:
+        return list(_active_commands)
+
+
+def get_executor():
+    """
+    Returns the process wide ThreadPoolExecutor and creates it on first use
+    :return: ThreadPoolExecutor, shared by all TaskGroups
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            max_workers = config.get_max_workers()
+            _executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                              thread_name_prefix="task_queue")
+            logger.debug(f"Started shared worker pool with {max_workers} workers")
+        return _executor
+
+
+def configure_executor(max_workers):
+    """
+    Replaces the shared worker pool with one of the given size, running tasks are finished by the old pool
+    :param max_workers: int, the new limit for parallel workers
+    :return: None, but the shared pool has been replaced
+    """
+    global _executor
+    with _executor_lock:
+        old_executor = _executor
+        _executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="task_queue")
+    if old_executor is not None:
+        old_executor.shutdown(wait=False)
+    logger.info(f"Shared worker pool has been resized to {max_workers} workers")
+
+
+def get_process_pool():
+    """
+    Returns the process pool for cpu bound work like parsing pages and creates it on first use.
+    The workers are spawned, so the main module of the program has to be guarded by if __name__ == "__main__".
+    :return: ProcessPoolExecutor, shared by all commands or None if TASKQUEUE/PARSE_PROCESSES is below 2
+    """
+    global _process_pool
+    processes = config.get_parse_processes()
+    if processes < 2:
+        return None
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = concurrent.futures.ProcessPoolExecutor(max_workers=processes,
+                                                                   mp_context=multiprocessing.get_context("spawn"))
+            logger.debug(f"Started process pool with {processes} processes")
+        return _process_pool
+
+
+def submit_to_process(func, *args):
+    """
+    Runs func with args on the process pool, the worker uses the live config of this process
+    :param func: function, a module level function, its args and result must be picklable
+    :param args: the arguments for func
+    :return: Future, resolves to the result of func
+    """
+    return get_process_pool().submit(_call_with_config, config.get_snapshot(), func, args)
+
+
+def _call_with_config(snapshot, func, args):
+    # settings like the region may have changed since the worker was spawned
+    config.apply_snapshot(snapshot)
+    return func(*args)
+
+
+def _run_if_unclaimed(task: SingleTask):
+    if task.claim():
+        task.run()
+
+
+def _task_context():
+    # tasks run in a copy of the callers context so nested groups are accounted to the same command
+    context = contextvars.copy_context()
+    context.run(_group_depth.set, _group_depth.get() + 1)
+    return context
+
+
+def submit_task_group(tg: TaskGroup, max_workers=None, ordered=False, report=False):
+    """
+    Submits all tasks in the given TaskGroup to the shared worker pool and returns the merged results
     :param tg: Taskgroup, a valid Taskgroup
-    :param max_workers: int, set the limit for parallel workers, standard is 20
+    :param max_workers: int, no longer used since all TaskGroups share one pool, see scrap_config.get_max_workers
+    :param ordered: Boolean(False), if True the results keep the order of the tasks instead of the order of completion
+    :param report: Boolean(False), if True every result except None is passed to report_progress once it is ready
     :return: TournamentList, merged from the TournamentList objects returned by the tasks in the TaskGroup
     """
-    results = []
-    # setup ThreadPoolExecutor with worker pool and execute_task, also update the presence of the bot
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_task = {executor.submit(task.execute): task for task in tg.tasks}
-        t_count = tg.task_count
-        if len(tg.name) > 0:
-            logger.info(f"{str(t_count)} tasks have been submitted for {tg.name}")
-        else:
-            logger.debug(str(t_count) + " tasks have been submitted.")
-        for future in concurrent.futures.as_completed(future_to_task):
-            t_count += -1
-            logger.debug(str(t_count) + " tasks remaining")
-            st = future_to_task[future]
-            try:
-                results.append(future.result())
-            except Exception as exc:
-                traceback_string = traceback.format_exc()
-                logger.error('%r generated an exception: %s' % (st, exc))
-                logger.debug(traceback_string)
-        if len(tg.name) > 0:
-            logger.info(f"Taskgroup {tg.name} has finished")
+    indexed_results = []
+    for index, result in iter_task_group(tg):
+        if report and result is not None:
+            report_progress(result)
+        indexed_results.append((index, result))
+    if ordered:
+        indexed_results.sort(key=lambda indexed_result: indexed_result[0])
+    results = [result for index, result in indexed_results]
 
     # return results
     return results
+
+
+def iter_task_group(tg: TaskGroup):
+    """
+    Submits all tasks in the given TaskGroup to the shared worker pool and yields the results as soon as each task
+    has finished. Tasks that raised an exception are logged and skipped. If the command is cancelled the remaining
+    tasks are skipped and the command is marked as incomplete.
+    :param tg: Taskgroup, a valid Taskgroup
+    :return: Generator[(int, any)], the index of the task in the TaskGroup and its result in order of completion
+    """
+    executor = get_executor()
+    command = _current_command.get()
+    if command is not None:
+        command.add_submitted(tg.task_count)
+
+    # finished futures are collected in a queue so the results can be handed out in order of completion
+    completed = queue.SimpleQueue()
+    future_to_index = {}
+    for index, task in enumerate(tg.tasks):
+        future_to_index[task.future] = index
+        task.future.add_done_callback(completed.put)
+
+    for task in tg.tasks:
+        executor.submit(_task_context().run, _run_if_unclaimed, task)
+    t_count = tg.task_count
+    if len(tg.name) > 0:
+        logger.info(f"{str(t_count)} tasks have been submitted for {tg.name}")
+    else:
+        logger.debug(str(t_count) + " tasks have been submitted.")
+
+    unclaimed = iter(tg.tasks)
+    while t_count > 0:
+        try:
+            future = completed.get_nowait()
+        except queue.Empty:
+            # instead of blocking, help out with a task no worker has started yet
+            task = next((task for task in unclaimed if task.claim()), None)
+            if task is not None:
+                _task_context().run(task.run, True)
+                continue
+            try:
+                future = completed.get(timeout=wait_timeout(command))
+            except queue.Empty:
+                if command.cancelled and wait_timeout(command) == 0:
+                    logger.warning(f"Stopped waiting for {t_count} tasks of {tg.name or 'a task group'} "
+                                   f"since {command.name} was cancelled")
+                    command.incomplete = True
+                    break
+                continue
+
+        t_count += -1
+        logger.debug(str(t_count) + " tasks remaining")
+        index = future_to_index[future]
+        try:
+            result = future.result()
+        except CommandCancelledError:
+            if command is not None:
+                command.incomplete = True
+            continue
+        except Exception as exc:
+            traceback_string = traceback.format_exc()
+            logger.error('%r generated an exception: %s' % (tg.tasks[index], exc))
+            logger.debug(traceback_string)
+            continue
+        yield index, result
+    if len(tg.name) > 0:
+        logger.info(f"Taskgroup {tg.name} has finished")
@@ -1,25 +1,286 @@
+"""
+Opens selenium web sessions in Firefox and keeps a pool of running ones.
+Starting Firefox takes several seconds, so stalkers borrow a driver from the pool with driver_session. A returned
+driver gets its cookies and storage cleared for the next command, drivers that crashed or were used WEBDRIVER/MAX_USES
+times are quit and replaced. The pool never runs more than WEBDRIVER/POOL_SIZE drivers, further commands wait.
+Headless drivers do not load the resources listed in WEBDRIVER/BLOCK, stalkers wait for the elements they need with
+wait_until instead of sleeping for a fixed time.
+:author: Jonathan Decker
+"""
+
+import atexit
+import collections
+import contextlib
+import logging
+import threading
+import time
+
 from selenium import webdriver
+from selenium.common.exceptions import StaleElementReferenceException, WebDriverException
 from selenium.webdriver.firefox.options import Options
+from selenium.webdriver.support.ui import WebDriverWait
+
+from utils import scrap_config as config
+from utils import task_queue
+
+logger = logging.getLogger('scrap_logger')
+
+_driver_pool = None
+_driver_pool_lock = threading.Lock()
+
+# firefox preferences that keep a headless driver from loading the resources in WEBDRIVER/BLOCK
+BLOCKING_PREFERENCES = {"images": {"permissions.default.image": 2},
+                        "fonts": {"browser.display.use_document_fonts": 0, "gfx.downloadable_fonts.enabled": False},
+                        "stylesheets": {"permissions.default.stylesheet": 2},
+                        "trackers": {"privacy.trackingprotection.enabled": True,
+                                     "privacy.trackingprotection.socialtracking.enabled": True,
+                                     "privacy.trackingprotection.cryptomining.enabled": True,
+                                     "privacy.trackingprotection.fingerprinting.enabled": True}}
 
-options = Options()
-options.add_argument("--headless")
+# storage access fails on some pages, those have nothing to clear
+_CLEAR_STORAGE = "try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}"
 
 
 def open_session(headless=True):
     """
     Open a selenium web session in Firefox
-    :return: webdriver, with an open session
+    :return: webdriver, with an open session, elements are not waited for implicitly, see wait_until
     """
 
     # opens a web session and returns the webdriver
     if headless:
-        driver = webdriver.Firefox(options=options)
+        driver = webdriver.Firefox(options=create_headless_options())
     else:
         driver = webdriver.Firefox()
-    driver.implicitly_wait(30)
 
     return driver
 
 
 def quit_session(driver: webdriver):
     driver.quit()
+
+
+def create_headless_options():
+    """
+    Creates the options for a headless driver that does not load the resources in WEBDRIVER/BLOCK
+    :return: Options, firefox options
+    """
+    options = Options()
+    options.add_argument("--headless")
+    for resource in config.get_webdriver_blocked_resources():
+        if resource not in BLOCKING_PREFERENCES:
+            logger.warning(f"Unknown resource {resource} in WEBDRIVER/BLOCK")
+            continue
+        for name, value in BLOCKING_PREFERENCES[resource].items():
+            options.set_preference(name, value)
+    return options
+
+
+def wait_until(driver, condition, timeout=None):
+    """
+    Polls the page of the driver until the condition is met, waiting stops when the current command is cancelled
+    :param driver: webdriver, a driver with an open session
+    :param condition: function, takes the driver and returns a true value once it is met, for example one of
+    selenium's expected_conditions
+    :param timeout: float(None), secs until a TimeoutException is raised, WEBDRIVER/WAIT_TIMEOUT if not given
+    :return: the first true value returned by condition
+    """
+    if timeout is None:
+        timeout = config.get_webdriver_wait_timeout()
+
+    def cancellable_condition(polled_driver):
+        task_queue.check_cancelled()
+        return condition(polled_driver)
+
+    # elements may be replaced by the scripts of the page while they are checked
+    wait = WebDriverWait(driver, timeout, poll_frequency=0.1, ignored_exceptions=(StaleElementReferenceException, ))
+    return wait.until(cancellable_condition)
+
+
+class DriverPool:
+    """
+    Bounded pool of headless Firefox drivers, each driver is lent to one stalk at a time
+    """
+
+    def __init__(self, size, max_uses, launch=open_session):
+        self.size = size
+        self.max_uses = max_uses
+        self._launch = launch
+        self._idle = []
+        self._uses = {}
+        # drivers that are running, idle or lent out, and drivers that are being launched
+        self._open = 0
+        self._condition = threading.Condition()
+        self.checkouts = 0
+        self.launches = 0
+        self.recycles = 0
+        self.wait_times = collections.deque(maxlen=100)
+
+    def __str__(self):
+        with self._condition:
+            wait_times = list(self.wait_times)
+            average_wait = sum(wait_times) / len(wait_times) if wait_times else 0.0
+            return (f"driver pool: {self._open}/{self.size} drivers, {len(self._idle)} idle, {self.checkouts} "
+                    f"checkouts, {self.launches} launches, {self.recycles} recycled, checkout wait "
+                    f"{average_wait:.2f} secs on average and {max(wait_times, default=0.0):.2f} secs at most")
+
+    def checkout(self):
+        """
+        Lends out an idle driver, launches a new one if none is idle and the pool is not full or waits for a driver
+        to be returned. Waiting stops when the current command is cancelled.
+        :return: webdriver, a driver with an open session on an empty page
+        """
+        start_time = time.perf_counter()
+        with self._condition:
+            while not self._idle and self._open >= self.size:
+                self._condition.wait(0.5)
+                task_queue.check_cancelled()
+            if self._idle:
+                driver = self._idle.pop()
+            else:
+                driver = None
+                self._open += 1
+
+        if driver is None:
+            driver = self._launch_driver()
+        waited = time.perf_counter() - start_time
+        with self._condition:
+            self.checkouts += 1
+            self.wait_times.append(waited)
+        return driver
+
+    def checkin(self, driver, healthy=True):
+        """
+        Takes back a lent driver, it is reset for the next stalk or quit if it is broken or was used too often
+        :param driver: webdriver, a driver returned by checkout
+        :param healthy: Boolean(True), False if the driver failed while it was lent out
+        :return: None
+        """
+        with self._condition:
+            uses = self._uses.get(driver, 0) + 1
+            self._uses[driver] = uses
+        if healthy and uses < self.max_uses and self._reset(driver):
+            with self._condition:
+                self._idle.append(driver)
+                self._condition.notify()
+        else:
+            self._retire(driver)
+
+    def prelaunch(self, count):
+        """
+        Launches drivers until count drivers are idle or the pool is full
+        :param count: int, the number of idle drivers to have
+        :return: None
+        """
+        while True:
+            with self._condition:
+                if len(self._idle) >= count or self._open >= self.size:
+                    return
+                self._open += 1
+            driver = self._launch_driver()
+            with self._condition:
+                self._idle.append(driver)
+                self._condition.notify()
+
+    def close(self):
+        """
+        Quits all idle drivers, lent drivers are quit once they are returned
+        :return: None
+        """
+        with self._condition:
+            idle = self._idle
+            self._idle = []
+            self.max_uses = 0
+        for driver in idle:
+            self._retire(driver, recycled=False)
+
+    def _launch_driver(self):
+        try:
+            driver = self._launch()
+        except BaseException:
+            with self._condition:
+                self._open -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self.launches += 1
+        return driver
+
+    def _retire(self, driver, recycled=True):
+        with self._condition:
+            self._uses.pop(driver, None)
+            self._open -= 1
+            if recycled:
+                self.recycles += 1
+            self._condition.notify()
+        try:
+            quit_session(driver)
+        except Exception as exc:
+            logger.debug(f"Quitting a web driver failed: {exc}")
+
+    @staticmethod
+    def _reset(driver):
+        # clears what the last stalk left behind, a driver that does not answer has crashed
+        try:
+            for handle in driver.window_handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(driver.window_handles[0])
+            driver.delete_all_cookies()
+            driver.execute_script(_CLEAR_STORAGE)
+            driver.get("about:blank")
+            return True
+        except Exception as exc:
+            logger.warning(f"Resetting a web driver failed, it is replaced: {exc}")
+            return False
+
+
+def get_driver_pool():
+    """
+    Returns the shared driver pool and creates it from the config on first use
+    :return: DriverPool, its drivers are quit when the program exits
+    """
+    global _driver_pool
+    with _driver_pool_lock:
+        if _driver_pool is None:
+            size, max_uses, prelaunch = config.get_webdriver_pool_settings()
+            _driver_pool = DriverPool(size, max_uses)
+            atexit.register(_driver_pool.close)
+        return _driver_pool
+
+
+def prelaunch_drivers():
+    """
+    Launches WEBDRIVER/PRELAUNCH drivers in the background, so the first stalks that need a browser do not wait for it
+    :return: None
+    """
+    size, max_uses, prelaunch = config.get_webdriver_pool_settings()
+    if prelaunch > 0:
+        threading.Thread(target=_prelaunch, args=(prelaunch, ), name="driver prelaunch", daemon=True).start()
+
+
+def _prelaunch(count):
+    try:
+        get_driver_pool().prelaunch(count)
+    except Exception as exc:
+        logger.warning(f"Launching web drivers in advance failed: {exc}")
+
+
+@contextlib.contextmanager
+def driver_session():
+    """
+    Context manager that lends a driver from the pool for the block, the driver is replaced if the block raised a
+    WebDriverException
+    :return: webdriver, a headless driver with an open session
+    """
+    pool = get_driver_pool()
+    driver = pool.checkout()
+    healthy = True
+    try:
+        yield driver
+    except WebDriverException:
+        healthy = False
+        raise
+    finally:
+        pool.checkin(driver, healthy)
+        logger.debug(str(pool))